@@ -1,3 +1,26 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DailyPlan, Task
+
+
+# Los listados cargan el usuario de cada fila en la misma consulta
+# (`list_select_related`): __str__ usa user.username.
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'eisenhower_category', 'is_todo', 'completed', 'created_at')
+    list_filter = ('eisenhower_category', 'category_source', 'is_todo', 'completed')
+    list_select_related = ('user',)
+    search_fields = ('description', 'user__username')
+    # Un campo de id en lugar de un desplegable con todos los usuarios
+    raw_id_fields = ('user',)
+    ordering = ('-created_at', '-id')
+
+
+@admin.register(DailyPlan)
+class DailyPlanAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'day', 'version', 'created_at', 'prompt_tokens', 'response_tokens')
+    list_select_related = ('user',)
+    search_fields = ('plan_text', 'user__username')
+    raw_id_fields = ('user',)
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,708 @@
+"""
+Lógica de los análisis de productividad, compartida por las vistas y por el
+worker de la cola de trabajos.
+
+Contiene las plantillas de los prompts, la llamada al modelo (a través de la
+caché de respuestas y la pasarela) y el guardado de los resultados.
+"""
+import asyncio
+import json
+import re
+from dataclasses import dataclass, replace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from pydantic import ValidationError
+
+from . import metrics
+from .analytics import arecord_tasks, record_tasks
+from .cache import get_response_cache, make_key
+from .classifier import classify_locally
+from .coalesce import get_coalescer
+from .llm import get_gateway, estimate_tokens, LLMError, LLMResult
+from .models import CategorySource, DailyPlan, EisenhowerCategory, Task
+from .plans import asave_version, compare_plan, save_version
+from .prompts import compact_plan, compact_plan_changes, compact_tasks, task_lines
+from .schemas import (
+    DAY_PLAN_RESPONSE_SCHEMA, EISENHOWER_RESPONSE_SCHEMA, DayPlanAnalysis, EisenhowerAnalysis, PartialDayPlan,
+    parse_category,
+)
+
+# Plantillas de los prompts. La caché de respuestas usa un hash del texto de
+# cada plantilla como versión: al editarlas se invalidan sus entradas.
+EISENHOWER_PROMPT = """
+Eres un experto en productividad que aplica la Matriz de Eisenhower.
+Analiza la siguiente tarea y clasifícala en una de estas cuatro categorías:
+1. Urgente e Importante
+2. Urgente y No Importante
+3. No Urgente e Importante
+4. No Urgente y No Importante
+
+Tarea: "{task}"
+
+Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
+- Tarea: [La tarea elegida]
+- Categoría: [La categoría elegida]
+- Justificación: [Una breve explicación]
+"""
+
+LABORIT_PROMPT = """
+Eres un coach de productividad que aplica la Ley de Laborit (hacer lo más difícil primero) y la Ley de Pareto (80/20).
+Analiza la siguiente lista de tareas, incluyendo su tiempo estimado, y determina cuál es la "tarea más difícil" o de mayor impacto.
+Sugiere cuál debería ser la primera tarea del día para maximizar la productividad.
+Justifica tu respuesta basándote en la Ley de Laborit.
+
+Lista de tareas:
+{tasks}
+
+Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
+- Tarea sugerida: [La tarea elegida]
+- Justificación (Ley de Laborit y Pareto): [Una breve explicación]
+"""
+
+YERKES_DODSON_PROMPT = """
+Eres un experto en el manejo de la energía y el rendimiento, basándote en la Ley de Yerkes-Dodson y la Ley de Illich.
+Analiza el siguiente plan de trabajo diario e identifica si es óptimo o si podría llevar al agotamiento.
+Sugiere un ajuste para el plan, justificándolo con ambas leyes.
+
+Plan de trabajo:
+{plan}
+
+Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
+- Análisis: [Una evaluación del plan]
+- Justificación (Yerkes-Dodson e Illich: [Una breve explicación]
+- Sugerencia (Yerkes-Dodson e Illich): [El plan ajustado con la lista de tareas]
+"""
+
+# Análisis incremental de un plan que ya se analizó (ver core/plans.py): solo
+# los cambios, un resumen del resto y el análisis anterior
+YERKES_DODSON_UPDATE_PROMPT = """
+Eres un experto en el manejo de la energía y el rendimiento, basándote en la Ley de Yerkes-Dodson y la Ley de Illich.
+Ya analizaste una versión anterior de este plan de trabajo diario y el usuario lo ha modificado.
+Actualiza tu análisis teniendo en cuenta los cambios.
+
+Tu análisis anterior:
+{previous}
+
+Cambios en el plan:
+{changes}
+
+Resto del plan (sin cambios):
+{unchanged}
+
+Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
+- Análisis: [Una evaluación del plan]
+- Justificación (Yerkes-Dodson e Illich: [Una breve explicación]
+- Sugerencia (Yerkes-Dodson e Illich): [El plan ajustado con la lista de tareas]
+"""
+
+EISENHOWER_BATCH_PROMPT = """
+Eres un experto en productividad que aplica la Matriz de Eisenhower.
+Clasifica cada una de las siguientes tareas en una de estas cuatro categorías:
+1. Urgente e Importante
+2. Urgente y No Importante
+3. No Urgente e Importante
+4. No Urgente y No Importante
+
+Tareas:
+{tasks}
+
+Responde con una línea por tarea, en el mismo orden y sin explicaciones adicionales, con el formato:
+[número de la tarea] Categoría
+"""
+
+# Plan del día: las tres leyes en una sola llamada con salida estructurada
+# (DAY_PLAN_RESPONSE_SCHEMA, core/schemas.py)
+DAY_PLAN_PROMPT = """
+Eres un experto en productividad. Planifica el día del usuario a partir de su lista de tareas aplicando:
+1. La Matriz de Eisenhower: clasifica cada tarea en una de estas cuatro categorías:
+   Urgente e Importante / Urgente y No Importante / No Urgente e Importante / No Urgente y No Importante
+2. La Ley de Laborit (hacer lo más difícil primero) y la Ley de Pareto (80/20): elige la tarea con la que empezar el día.
+3. La Ley de Yerkes-Dodson y la Ley de Illich: propón un plan del día que mantenga un nivel de activación óptimo sin llevar al agotamiento.
+
+Tareas:
+{tasks}
+
+Responde solo con un objeto JSON con los campos:
+- "tasks": una entrada por tarea con "index" (su número) y "category" (la categoría, escrita exactamente como en la lista)
+- "first_task" (el número de la tarea con la que empezar) y "first_task_justification" (una breve explicación)
+- "analysis" (una evaluación de la carga del día), "justification" (una breve explicación) y "schedule" (el plan ajustado, una línea por bloque)
+"""
+
+# Variante de salida estructurada: Gemini responde JSON con el esquema
+# EISENHOWER_RESPONSE_SCHEMA (core/schemas.py)
+EISENHOWER_JSON_PROMPT = """
+Eres un experto en productividad que aplica la Matriz de Eisenhower.
+Analiza la siguiente tarea y clasifícala en una de estas cuatro categorías:
+1. Urgente e Importante
+2. Urgente y No Importante
+3. No Urgente e Importante
+4. No Urgente y No Importante
+
+Tarea: "{task}"
+
+Responde solo con un objeto JSON con los campos "task" (la tarea), "category" (la categoría elegida, escrita exactamente como en la lista) y "justification" (una breve explicación).
+"""
+
+# Se usa una sola vez cuando la respuesta estructurada no pasa la validación
+STRUCTURED_REPAIR_PROMPT = """
+Tu respuesta anterior no cumple el esquema JSON pedido.
+
+Errores de validación:
+{errors}
+
+Respuesta anterior:
+{response}
+
+Esquema JSON:
+{schema}
+
+Devuelve únicamente el objeto JSON corregido, sin explicaciones adicionales.
+"""
+
+
+async def _call_model(gateway, endpoint, prompt, **kwargs):
+    """Llama al modelo y registra los tokens del prompt (estimados antes de enviarlo) y los consumidos."""
+    metrics.LLM_PROMPT_SIZE.observe(estimate_tokens(prompt), endpoint=endpoint)
+    response = await gateway.generate(prompt, **kwargs)
+    metrics.observe_endpoint_usage(endpoint, response)
+    return response
+
+
+def token_usage(response):
+    """Campos de tokens para guardar junto al resultado (0 si no hubo llamada al modelo)."""
+    if response is None or response.cached:
+        return {'prompt_tokens': 0, 'response_tokens': 0}
+    return {'prompt_tokens': response.prompt_tokens, 'response_tokens': response.response_tokens}
+
+
+def add_usage(*usages):
+    """Suma de varios campos de tokens (los de `token_usage`)."""
+    return {
+        'prompt_tokens': sum(usage['prompt_tokens'] for usage in usages),
+        'response_tokens': sum(usage['response_tokens'] for usage in usages),
+    }
+
+
+def split_usage(response, count):
+    """
+    Tokens de `response` repartidos entre los `count` resultados de una
+    llamada por lotes; el resto de la división va a los primeros, así que la
+    suma coincide con el total.
+    """
+    usage = token_usage(response)
+    return [
+        {field: total // count + (i < total % count) for field, total in usage.items()}
+        for i in range(count)
+    ]
+
+
+def coalesced(key, generate):
+    """`generate()` compartida con las peticiones idénticas en vuelo (core/coalesce.py), si está activo."""
+    coalescer = get_coalescer()
+    if coalescer is None:
+        return generate()
+    return coalescer.run(key, generate)
+
+
+async def generate_analysis(endpoint, template, **values):
+    """
+    Rellena la plantilla con `values` y llama al modelo.
+    Si la caché de respuestas está activa, una entrada equivalente ya
+    analizada se responde sin llamar al modelo; si hay una idéntica en vuelo,
+    se espera su respuesta.
+    """
+    gateway = get_gateway()
+    prompt = template.format(**values)
+    key = make_key(endpoint, gateway.model_name, template, values)
+    cache = get_response_cache()
+    if cache is None:
+        return await coalesced(key, lambda: _call_model(gateway, endpoint, prompt))
+    return await cache.get_or_generate(key, lambda: coalesced(key, lambda: _call_model(gateway, endpoint, prompt)))
+
+
+async def generate_structured(endpoint, template, schema, model_class, **values):
+    """
+    Pide al modelo una respuesta JSON que cumpla `schema` y la valida con el
+    modelo de pydantic `model_class`. Si no pasa la validación, reintenta una
+    sola vez con un prompt de reparación; si tampoco, lanza ValidationError
+    con la respuesta reparada (y los tokens de las dos llamadas) en su
+    atributo `response`, para aprovechar las partes válidas.
+    Solo se guardan en la caché las respuestas válidas.
+    Devuelve (objeto validado, LLMResult); tras una reparación, los tokens
+    son la suma de las dos llamadas.
+    """
+    gateway = get_gateway()
+    cache = get_response_cache()
+    key = make_key(endpoint, gateway.model_name, template, values)
+    if cache:
+        cached = await cache.aget(key)
+        if cached is not None:
+            try:
+                return model_class.model_validate_json(cached.text), cached
+            except ValidationError:
+                pass
+
+    async def generate_valid():
+        response = await _call_model(gateway, endpoint, template.format(**values), response_schema=schema)
+        try:
+            model_class.model_validate_json(response.text)
+        except ValidationError as e:
+            repair_prompt = STRUCTURED_REPAIR_PROMPT.format(
+                errors='\n'.join(f"- {error['msg']}" for error in e.errors()),
+                response=response.text,
+                schema=json.dumps(schema, ensure_ascii=False),
+            )
+            first = response
+            response = await _call_model(gateway, endpoint, repair_prompt, response_schema=schema)
+            response = replace(
+                response,
+                prompt_tokens=first.prompt_tokens + response.prompt_tokens,
+                response_tokens=first.response_tokens + response.response_tokens,
+            )
+            try:
+                model_class.model_validate_json(response.text)
+            except ValidationError as error:
+                error.response = response
+                raise
+        return response
+
+    # Las peticiones idénticas en vuelo comparten la respuesta ya validada
+    response = await coalesced(key, generate_valid)
+    parsed = model_class.model_validate_json(response.text)
+    if cache:
+        await cache.aset(key, response)
+    return parsed, response
+
+
+def extract_category(result_text):
+    """Extrae la categoría de la respuesta en texto del análisis de Eisenhower."""
+    for line in result_text.splitlines():
+        match = re.match(r'^[\s\-*]*Categor[íi]a\**\s*:\s*(.+)$', line, re.IGNORECASE)
+        if match:
+            return parse_category(match.group(1)) or EisenhowerCategory.UNSPECIFIED
+    return EisenhowerCategory.UNSPECIFIED
+
+
+def chunk_tasks(tasks, token_budget, max_items):
+    """Agrupa las tareas en lotes que caben en el presupuesto de tokens del prompt."""
+    chunks, current, used = [], [], 0
+    for task in tasks:
+        cost = estimate_tokens(task) + 3  # El prefijo "[n] " y el salto de línea
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            chunks.append(current)
+            current, used = [], 0
+        current.append(task)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def classify_chunk(chunk):
+    """
+    Clasifica un lote de tareas con una sola llamada al modelo. Devuelve la
+    categoría de cada tarea y su parte de los tokens de la llamada.
+    """
+    listing = '\n'.join(f'[{i}] {task}' for i, task in enumerate(chunk, start=1))
+    response = await generate_analysis('eisenhower-batch', EISENHOWER_BATCH_PROMPT, tasks=listing)
+    categories = {}
+    for line in response.text.splitlines():
+        match = re.match(r'^\s*[-*]?\s*\[?(\d+)[\].):]\s*(.+)$', line)
+        if match:
+            categories[int(match.group(1))] = parse_category(match.group(2)) or EisenhowerCategory.UNSPECIFIED
+    return (
+        [categories.get(i, EisenhowerCategory.UNSPECIFIED) for i in range(1, len(chunk) + 1)],
+        split_usage(response, len(chunk)),
+    )
+
+
+@dataclass
+class ChunkResult:
+    """Clasificación de un lote: categorías y tokens de cada tarea, o el error si la llamada falló."""
+    categories: list
+    usages: list
+    error: LLMError = None
+
+
+async def classify_chunks(chunks):
+    """
+    Clasifica los lotes a la vez. El fallo de la llamada de un lote no
+    afecta a los demás: sus tareas quedan sin categoría y con el error
+    (ChunkResult.error). Si fallan todos, se lanza el error del primero.
+    """
+    async def classify(chunk):
+        try:
+            return ChunkResult(*await classify_chunk(chunk))
+        except LLMError as e:
+            return ChunkResult([EisenhowerCategory.UNSPECIFIED] * len(chunk), split_usage(None, len(chunk)), e)
+
+    results = await asyncio.gather(*(classify(chunk) for chunk in chunks))
+    if results and all(result.error for result in results):
+        raise results[0].error
+    return results
+
+
+async def find_similar_task(user, task_description):
+    """Tarea anterior del usuario casi igual a esta (core/embeddings.py), o None."""
+    if not settings.SIMILAR_TASKS_ENABLED:
+        return None
+    # Importación diferida: NumPy solo se carga al clasificar la primera tarea
+    from .embeddings import find_similar
+    return await find_similar(user, task_description)
+
+
+async def remember_tasks(tasks):
+    """Guarda el embedding de las tareas clasificadas para reconocer después las casi iguales."""
+    if not settings.SIMILAR_TASKS_ENABLED:
+        return
+    from .embeddings import index_tasks
+    await index_tasks(tasks)
+
+
+async def embed_new_tasks(descriptions):
+    """
+    Embeddings de tareas clasificadas que aún no se han guardado, para
+    guardarlos en la misma transacción que ellas; None si no se usan o fallan.
+    """
+    if not settings.SIMILAR_TASKS_ENABLED or not descriptions:
+        return None
+    from .embeddings import embed_descriptions
+    return await embed_descriptions(descriptions)
+
+
+async def save_eisenhower_task(user, task_description, category, response=None, source=CategorySource.LLM):
+    """Crea y guarda la tarea con la categoría que asignó `source` (el modelo) y los tokens de `response`."""
+    task = await Task.objects.acreate(
+        user=user,
+        description=task_description,
+        eisenhower_category=category,
+        category_source=source,
+        **token_usage(response)
+    )
+    await arecord_tasks([task])
+    await remember_tasks([task])
+    return task
+
+
+async def save_daily_plan(user, daily_plan, response=None, incremental=False):
+    """
+    Guarda el plan diario como plan de hoy (una nueva versión si ya había
+    uno, ver core/plans.py) con su análisis y los tokens de `response`.
+    """
+    return await asave_version(
+        user,
+        daily_plan,
+        analysis=response.text if response is not None else '',
+        incremental=incremental,
+        **token_usage(response)
+    )
+
+
+async def run_local_eisenhower(user, task):
+    """
+    Intenta clasificar la tarea sin llamar al modelo: primero reutiliza la
+    categoría de una tarea anterior casi igual y, si no la hay, prueba el
+    clasificador local (core/classifier.py).
+    Si lo consigue guarda la tarea y devuelve la respuesta; si no, devuelve
+    None y hay que llamar al modelo.
+    """
+    match = await find_similar_task(user, task)
+    if match is not None:
+        await save_eisenhower_task(user, task, match.category, source=CategorySource.REUSED)
+        text = (
+            f"- Tarea: {task}\n"
+            f"- Categoría: {match.category.label}\n"
+            f"- Justificación: Es casi igual que la tarea «{match.description}» "
+            f"(similitud del {match.similarity:.0%}), así que se reutiliza su categoría."
+        )
+        return LLMResult(text=text, model='similar-task')
+
+    prediction = await classify_locally(user, task)
+    if prediction is None:
+        return None
+    await save_eisenhower_task(user, task, prediction.category, source=CategorySource.LOCAL)
+    text = (
+        f"- Tarea: {task}\n"
+        f"- Categoría: {prediction.category.label}\n"
+        f"- Justificación: Clasificada localmente ({prediction.source}) "
+        f"con una confianza del {prediction.confidence:.0%}."
+    )
+    return LLMResult(text=text, model='local-classifier')
+
+
+async def run_eisenhower(user, task):
+    """
+    Clasifica la tarea en la Matriz de Eisenhower y la guarda.
+    Las tareas evidentes las resuelve el clasificador local sin llamar al
+    modelo. Con `settings.LLM_STRUCTURED_OUTPUT` pide JSON validado; si ni
+    siquiera la reparación produce JSON válido, la tarea se guarda sin categoría.
+    """
+    local = await run_local_eisenhower(user, task)
+    if local is not None:
+        return local
+    if not settings.LLM_STRUCTURED_OUTPUT:
+        response = await generate_analysis('eisenhower', EISENHOWER_PROMPT, task=task)
+        await save_eisenhower_task(user, task, extract_category(response.text), response)
+        return response
+    try:
+        analysis, response = await generate_structured(
+            'eisenhower', EISENHOWER_JSON_PROMPT, EISENHOWER_RESPONSE_SCHEMA, EisenhowerAnalysis, task=task
+        )
+    except ValidationError:
+        await save_eisenhower_task(user, task, EisenhowerCategory.UNSPECIFIED)
+        raise
+    await save_eisenhower_task(user, task, analysis.category, response)
+    return replace(response, text=analysis.as_text())
+
+
+async def run_laborit(user, tasks):
+    """Sugiere la primera tarea del día según la Ley de Laborit."""
+    return await generate_analysis('laborit', LABORIT_PROMPT, tasks=compact_tasks(tasks))
+
+
+@dataclass
+class PlanAnalysis:
+    """
+    Análisis que necesita un plan diario: el endpoint y la plantilla con sus
+    valores o, si el plan no cambió, el resultado guardado (`result`).
+    """
+    endpoint: str = 'yerkes-dodson'
+    template: str = YERKES_DODSON_PROMPT
+    values: dict = None
+    incremental: bool = False
+    result: LLMResult = None
+
+
+async def plan_analysis(user, plan):
+    """
+    Decide cómo analizar el plan diario frente a la versión de hoy
+    (core/plans.py): sin llamar al modelo si no cambió, de forma incremental
+    si el cambio es pequeño o completo (con el plan compactado).
+    """
+    draft = await compare_plan(user, plan)
+    if draft.unchanged and draft.current.analysis:
+        metrics.DAILY_PLAN_ANALYSES.inc(mode='unchanged')
+        return PlanAnalysis(result=LLMResult(text=draft.current.analysis, model='daily-plan', cached=True))
+    if draft.incremental:
+        metrics.DAILY_PLAN_ANALYSES.inc(mode='incremental')
+        changes, unchanged = compact_plan_changes(draft.diff, draft.kept)
+        return PlanAnalysis(
+            endpoint='yerkes-dodson-update',
+            template=YERKES_DODSON_UPDATE_PROMPT,
+            values={'previous': draft.current.analysis, 'changes': changes, 'unchanged': unchanged},
+            incremental=True,
+        )
+    metrics.DAILY_PLAN_ANALYSES.inc(mode='full')
+    return PlanAnalysis(values={'plan': compact_plan(plan)})
+
+
+async def run_yerkes_dodson(user, plan):
+    """
+    Analiza el plan diario con la Ley de Yerkes-Dodson y lo guarda.
+    Al modelo se le envía el plan compactado (o solo sus cambios, ver
+    `plan_analysis`); se guarda el original.
+    """
+    request = await plan_analysis(user, plan)
+    if request.result is not None:
+        return request.result
+    response = await generate_analysis(request.endpoint, request.template, **request.values)
+    await save_daily_plan(user, plan, response, request.incremental)
+    return response
+
+
+@dataclass
+class DayPlanResult:
+    """Resultado del plan del día: las tareas guardadas, el plan diario y los textos de cada ley."""
+    tasks: list
+    daily_plan: DailyPlan
+    first_task: str
+    laborit: str
+    yerkes_dodson: str
+    # 'single' (una llamada estructurada) o 'parallel' (una llamada por ley a la vez)
+    mode: str
+    llm_calls: int
+    # Tokens de todas las llamadas al modelo (como `token_usage`)
+    usage: dict
+
+    @property
+    def text(self):
+        """Los tres análisis en un texto, como el que muestra la interfaz."""
+        priorities = '\n'.join(
+            f"- {task.description}: {EisenhowerCategory(task.eisenhower_category).label}" for task in self.tasks
+        )
+        return (
+            f"Prioridades (Matriz de Eisenhower):\n{priorities}\n\n"
+            f"Primera tarea (Ley de Laborit):\n{self.laborit}\n\n"
+            f"Plan del día (Ley de Yerkes-Dodson):\n{self.yerkes_dodson}"
+        )
+
+
+def normalize_day_tasks(tasks):
+    """Tareas del plan del día (una lista o un texto con una por línea) sin viñetas ni repetidas."""
+    if not isinstance(tasks, str):
+        tasks = '\n'.join(' '.join(str(task).split()) for task in tasks)
+    return task_lines(tasks)
+
+
+def _save_day_plan(user, tasks, categories, plan_text, analysis, incremental, usage, task_usages, vectors):
+    # Las tareas, el plan diario, sus estadísticas y sus embeddings se guardan
+    # juntos o no se guarda nada
+    with transaction.atomic():
+        created = Task.objects.bulk_create([
+            Task(
+                user=user, description=task, eisenhower_category=category,
+                category_source=CategorySource.LLM, **task_usage
+            )
+            for task, category, task_usage in zip(tasks, categories, task_usages)
+        ])
+        daily_plan = save_version(user, plan_text, analysis=analysis, incremental=incremental, **usage)
+        record_tasks(created)
+        if vectors is not None:
+            from .embeddings import classified, store_embeddings
+            store_embeddings(classified(created), vectors)
+    return created, daily_plan
+
+
+save_day_plan = sync_to_async(_save_day_plan)
+
+
+# Tokens de una tarea cuya categoría salió de la llamada del plan (cuentan en el plan)
+NO_USAGE = {'prompt_tokens': 0, 'response_tokens': 0}
+
+
+async def _plan_day_single(user, tasks, plan_text, plan_request):
+    """
+    Plan del día con una sola llamada estructurada. Si ni la reparación da
+    JSON válido, se aprovechan sus partes válidas y solo lo que falta se pide
+    con las llamadas de cada ley. Devuelve (modo, resultado).
+    """
+    listing = '\n'.join(f'[{i}] {task}' for i, task in enumerate(tasks, start=1))
+    try:
+        analysis, response = await generate_structured(
+            'plan-day', DAY_PLAN_PROMPT, DAY_PLAN_RESPONSE_SCHEMA, DayPlanAnalysis, tasks=listing
+        )
+    except ValidationError as e:
+        failed = getattr(e, 'response', None)
+        partial = PartialDayPlan.from_text(failed.text, len(tasks)) if failed is not None else None
+        categories, first_task, laborit, yerkes, incremental, usage, task_usages, calls = await _plan_day_parallel(
+            user, tasks, plan_text, plan_request, partial
+        )
+        # La llamada estructurada y su reparación también cuentan
+        usage = add_usage(token_usage(failed), usage)
+        return 'parallel', (categories, first_task, laborit, yerkes, incremental, usage, task_usages, calls + 2)
+    laborit = analysis.laborit_text(tasks)
+    first_task = tasks[analysis.first_task - 1] if 1 <= analysis.first_task <= len(tasks) else None
+    return 'single', (
+        analysis.categories(len(tasks)), first_task, laborit, analysis.yerkes_dodson_text(), False,
+        token_usage(response), [NO_USAGE] * len(tasks), 1,
+    )
+
+
+async def _plan_day_parallel(user, tasks, plan_text, plan_request, partial=None):
+    """
+    Plan del día con las llamadas de cada ley a la vez (clasificación por
+    lotes, Laborit y Yerkes-Dodson), solo para lo que no esté ya en
+    `partial` (las partes válidas de una respuesta estructurada). Cada tarea
+    lleva su parte de los tokens de su lote y el plan diario los de Laborit
+    y Yerkes-Dodson.
+    """
+    partial = partial or PartialDayPlan()
+    categories = partial.categories(len(tasks))
+    pending = [i for i, category in enumerate(categories) if category == EisenhowerCategory.UNSPECIFIED]
+    chunks = chunk_tasks([tasks[i] for i in pending], settings.LLM_BATCH_TOKEN_BUDGET, settings.LLM_BATCH_MAX_ITEMS)
+
+    async def laborit():
+        if partial.has_laborit:
+            return None
+        return await run_laborit(user, plan_text)
+
+    async def yerkes_dodson():
+        if partial.has_yerkes_dodson:
+            return None
+        if plan_request.result is not None:
+            return plan_request.result
+        return await generate_analysis(plan_request.endpoint, plan_request.template, **plan_request.values)
+
+    results, laborit_response, yerkes = await asyncio.gather(
+        asyncio.gather(*(classify_chunk(chunk) for chunk in chunks)),
+        laborit(),
+        yerkes_dodson(),
+    )
+    task_usages = [NO_USAGE] * len(tasks)
+    chunk_results = zip(
+        [category for chunk_categories, _ in results for category in chunk_categories],
+        [usage for _, chunk_usages in results for usage in chunk_usages],
+    )
+    for i, (category, usage) in zip(pending, chunk_results):
+        categories[i], task_usages[i] = category, usage
+
+    if laborit_response is None:
+        laborit_text, first_task = partial.laborit_text(tasks), tasks[partial.first_task - 1]
+    else:
+        laborit_text = laborit_response.text
+        match = re.search(r'^[\s\-*]*Tarea sugerida\**\s*:\s*(.+)$', laborit_text, re.IGNORECASE | re.MULTILINE)
+        first_task = match.group(1).strip() if match else None
+    if yerkes is None:
+        yerkes_text, incremental = partial.yerkes_dodson_text(), False
+    else:
+        yerkes_text, incremental = yerkes.text, plan_request.incremental
+    calls = len(chunks) + (laborit_response is not None) + (yerkes is not None and plan_request.result is None)
+    return (
+        categories, first_task, laborit_text, yerkes_text,
+        incremental, add_usage(token_usage(laborit_response), token_usage(yerkes)), task_usages, calls,
+    )
+
+
+async def run_plan_day(user, tasks):
+    """
+    Planifica el día a partir de la lista de tareas: categoría de Eisenhower
+    de cada una, primera tarea según Laborit y plan ajustado según
+    Yerkes-Dodson. Si la lista cabe en `settings.DAY_PLAN_MAX_TASKS` tareas
+    se resuelve con una sola llamada estructurada; si no (o sin salida
+    estructurada), con las llamadas de cada ley a la vez. Si el JSON no es
+    válido ni tras la reparación, solo se piden aparte las partes inválidas.
+    Guarda en una transacción las tareas (con sus estadísticas y embeddings)
+    y el plan diario.
+
+    El plan diario es el mismo plan del día del usuario que guarda
+    /api/yerkes-dodson/ (core/plans.py): planificar el día con otras tareas
+    añade una versión a ese plan y su análisis de Yerkes-Dodson parte del
+    guardado, igual que reenviar el plan desde ese endpoint. Si las tareas
+    son las mismas que las del plan de hoy, se reutiliza su análisis y solo
+    se piden las categorías y la primera tarea.
+    """
+    tasks = normalize_day_tasks(tasks)
+    plan_text = '\n'.join(f'- {task}' for task in tasks)
+
+    plan_request = await plan_analysis(user, plan_text)
+    if settings.LLM_STRUCTURED_OUTPUT and len(tasks) <= settings.DAY_PLAN_MAX_TASKS and plan_request.result is None:
+        mode, result = await _plan_day_single(user, tasks, plan_text, plan_request)
+    else:
+        mode, result = 'parallel', await _plan_day_parallel(user, tasks, plan_text, plan_request)
+    categories, first_task, laborit, yerkes_dodson, incremental, usage, task_usages, llm_calls = result
+
+    vectors = await embed_new_tasks([
+        task for task, category in zip(tasks, categories) if category != EisenhowerCategory.UNSPECIFIED
+    ])
+    created, daily_plan = await save_day_plan(
+        user, tasks, categories, plan_text, yerkes_dodson, incremental, usage, task_usages, vectors
+    )
+    total = add_usage(usage, *task_usages)
+    return DayPlanResult(created, daily_plan, first_task, laborit, yerkes_dodson, mode, llm_calls, total)
+
+
+# Cada tipo de análisis con su función y el campo de la petición que recibe
+ANALYSES = {
+    'eisenhower': (run_eisenhower, 'task'),
+    'laborit': (run_laborit, 'tasks'),
+    'yerkes-dodson': (run_yerkes_dodson, 'plan'),
+    'plan-day': (run_plan_day, 'tasks'),
+}
+
+
+async def run_analysis(kind, user, payload):
+    """Ejecuta el análisis `kind` con los datos de `payload` y devuelve la respuesta."""
+    runner, field = ANALYSES[kind]
+    return await runner(user, payload[field])
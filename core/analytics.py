@@ -0,0 +1,109 @@
+"""
+Estadísticas de la Matriz de Eisenhower precalculadas por usuario y día.
+
+Cada vez que se guardan tareas analizadas se suma una unidad a la fila
+(usuario, día, categoría) de `TaskDailyStats`. El endpoint de estadísticas
+agrega esas filas por día, semana o mes, así que su coste depende del rango
+de fechas pedido y no de cuántas tareas tenga el historial. Si las filas se
+desincronizan (tareas creadas o borradas por otro camino), el comando
+`rebuild_task_stats` las recalcula desde `Task`.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import EisenhowerCategory, Task, TaskDailyStats
+
+# Agrupaciones disponibles y días que cubren por defecto
+PERIODS = {'day': 30, 'week': 12 * 7, 'month': 365}
+
+
+def record_tasks(tasks):
+    """
+    Suma las tareas analizadas recién guardadas a sus filas de estadísticas.
+    Se puede llamar dentro de la transacción que guarda las tareas.
+    """
+    counts = Counter(
+        (task.user_id, timezone.localdate(task.created_at), task.eisenhower_category)
+        for task in tasks if not task.is_todo
+    )
+    for (user_id, day, category), count in counts.items():
+        rows = TaskDailyStats.objects.filter(user_id=user_id, day=day, category=category)
+        if rows.update(count=F('count') + count):
+            continue
+        try:
+            # En un punto de guardado: el conflicto no invalida la transacción de fuera
+            with transaction.atomic():
+                TaskDailyStats.objects.create(user_id=user_id, day=day, category=category, count=count)
+        except IntegrityError:
+            # Otra petición creó la fila a la vez: sumamos sobre la suya
+            rows.update(count=F('count') + count)
+
+
+arecord_tasks = sync_to_async(record_tasks)
+
+
+def rebuild(users=None):
+    """Recalcula desde cero las estadísticas de `users` (todos si es None) y devuelve las filas creadas."""
+    tasks = Task.objects.filter(is_todo=False)
+    stats = TaskDailyStats.objects.all()
+    if users is not None:
+        tasks = tasks.filter(user__in=users)
+        stats = stats.filter(user__in=users)
+    rows = (
+        tasks.annotate(day=TruncDate('created_at'))
+        .values('user_id', 'day', 'eisenhower_category')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        stats.delete()
+        created = TaskDailyStats.objects.bulk_create((
+            TaskDailyStats(user_id=row['user_id'], day=row['day'], category=row['eisenhower_category'], count=row['count'])
+            for row in rows.iterator()
+        ), batch_size=1000)
+    return len(created)
+
+
+def summarize(user, period='day', since=None, until=None):
+    """
+    Tareas analizadas por categoría entre `since` y `until` (fechas, ambas
+    incluidas), en total y por `period` ('day', 'week' o 'month').
+    Lanza ValueError si el periodo o el rango no son válidos.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"El parámetro period debe ser uno de: {', '.join(PERIODS)}.")
+    until = until or timezone.localdate()
+    since = since or until - timedelta(days=PERIODS[period] - 1)
+    if since > until:
+        raise ValueError("El parámetro since no puede ser posterior a until.")
+    if (until - since).days >= settings.ANALYTICS_MAX_DAYS:
+        raise ValueError(f"El rango no puede superar {settings.ANALYTICS_MAX_DAYS} días.")
+
+    rows = TaskDailyStats.objects.filter(user=user, day__gte=since, day__lte=until)
+    start = F('day') if period == 'day' else Trunc('day', period, output_field=DateField())
+    rows = rows.annotate(start=start).values('start', 'category').annotate(count=Sum('count')).order_by('start')
+
+    empty = {category.label: 0 for category in EisenhowerCategory}
+    totals, series = dict(empty), {}
+    for row in rows:
+        label = EisenhowerCategory(row['category']).label
+        totals[label] += row['count']
+        series.setdefault(row['start'], dict(empty))[label] += row['count']
+    return {
+        'period': period,
+        'since': since,
+        'until': until,
+        'total': sum(totals.values()),
+        'totals': totals,
+        'series': [
+            {'start': start, 'total': sum(counts.values()), 'counts': counts}
+            for start, counts in series.items()
+        ],
+    }
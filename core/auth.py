@@ -0,0 +1,130 @@
+"""
+Usuario de la sesión sin consultar `auth_user` en cada petición.
+
+`CachedModelBackend` es el `ModelBackend` de Django con una caché de los
+usuarios ya cargados, durante `AUTH_USER_CACHE_TTL` segundos. Con
+`AUTH_USER_CACHE_ALIAS` (por defecto la caché 'shared' si se configuró
+SHARED_CACHE) los usuarios se guardan en esa caché compartida: al guardar o
+borrar un usuario (cambio de contraseña, desactivación) su entrada se borra
+para todos los procesos. Sin caché compartida se guardan en la memoria de
+cada proceso (cada petición recibe su propia copia) y solo se invalidan en
+el proceso que guarda el usuario; los demás lo ven como mucho tras el TTL.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+# Usuarios como máximo en la caché del proceso (se descartan los usados hace más tiempo)
+USER_CACHE_SIZE = 10000
+
+# user_id -> (instante de caducidad, usuario)
+_users = OrderedDict()
+_users_lock = threading.Lock()
+
+
+def shared_cache():
+    """Caché compartida de los usuarios (`AUTH_USER_CACHE_ALIAS`), o None para usar la del proceso."""
+    alias = settings.AUTH_USER_CACHE_ALIAS
+    if not alias:
+        return None
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(
+            f"AUTH_USER_CACHE_ALIAS necesita la caché compartida {alias!r}: configura SHARED_CACHE "
+            "o deja AUTH_USER_CACHE_ALIAS vacío para usar la memoria del proceso."
+        )
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f"La caché {alias!r} no se comparte entre procesos: no sirve para los usuarios de las sesiones."
+        )
+    return cache
+
+
+def _cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _cached(user_id):
+    with _users_lock:
+        entry = _users.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _users[user_id]
+            return None
+        _users.move_to_end(user_id)
+    return copy.copy(entry[1])
+
+
+def _remember(user_id, user):
+    if user is None or settings.AUTH_USER_CACHE_TTL <= 0:
+        return user
+    with _users_lock:
+        _users[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, copy.copy(user))
+        _users.move_to_end(user_id)
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+    return user
+
+
+def forget_user(user_id):
+    with _users_lock:
+        _users.pop(user_id, None)
+    cache = shared_cache()
+    if cache is not None:
+        cache.delete(_cache_key(user_id))
+
+
+@receiver([post_save, post_delete], sender=get_user_model(), dispatch_uid='core.auth.forget_user')
+def _user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    # Otra petición puede haber vuelto a guardar la versión anterior antes de
+    # confirmarse la transacción: se borra otra vez al confirmarla
+    transaction.on_commit(lambda: forget_user(instance.pk))
+
+
+class CachedModelBackend(ModelBackend):
+    """`ModelBackend` que guarda en caché los usuarios de las sesiones."""
+
+    def get_user(self, user_id):
+        # La sesión guarda el id como texto: se normaliza para la clave de la caché
+        user_id = get_user_model()._meta.pk.to_python(user_id)
+        cache = shared_cache()
+        if cache is None:
+            user = _cached(user_id)
+            if user is None:
+                user = _remember(user_id, super().get_user(user_id))
+            return user
+        user = cache.get(_cache_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None and settings.AUTH_USER_CACHE_TTL > 0:
+                cache.set(_cache_key(user_id), user, settings.AUTH_USER_CACHE_TTL)
+        return user
+
+    async def aget_user(self, user_id):
+        user_id = get_user_model()._meta.pk.to_python(user_id)
+        cache = shared_cache()
+        if cache is None:
+            user = _cached(user_id)
+            if user is None:
+                user = _remember(user_id, await super().aget_user(user_id))
+            return user
+        user = await cache.aget(_cache_key(user_id))
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None and settings.AUTH_USER_CACHE_TTL > 0:
+                await cache.aset(_cache_key(user_id), user, settings.AUTH_USER_CACHE_TTL)
+        return user
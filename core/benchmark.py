@@ -0,0 +1,241 @@
+"""
+Utilidades del banco de pruebas de rendimiento (comandos `mock_gemini`,
+`seed_benchmark_data` y `run_benchmark`).
+
+- MockGeminiServer: imita el endpoint REST `generateContent` de Gemini con una
+  latencia log-normal y una tasa de errores configurables, para medir la
+  aplicación completa (SDK incluido) sin red ni cuota.
+- start_server: arranca el proyecto bajo WSGI o ASGI en un proceso aparte.
+- run_scenario: lanza peticiones a un endpoint con concurrencia fija y
+  devuelve rendimiento y percentiles de latencia.
+"""
+import json
+import math
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .llm import FakeBackend
+
+
+class MockGeminiServer:
+    """
+    Servidor HTTP que responde como `POST /v1beta/models/<modelo>:generateContent`.
+    La latencia sigue una log-normal de mediana `latency` y dispersión
+    `sigma`; una fracción `error_rate` de las peticiones falla con
+    `error_status`. Las respuestas usan el mismo texto que FakeBackend.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, sigma=0.0, error_rate=0.0,
+                 error_status=503, seed=None):
+        self.latency = latency
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.fake = FakeBackend(latency=0)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _draw(self):
+        with self._random_lock:
+            failed = self.random.random() < self.error_rate
+            delay = self.latency * math.exp(self.random.gauss(0, self.sigma)) if self.sigma else self.latency
+        return delay, failed
+
+    def _respond(self, body):
+        """Devuelve (estado, cuerpo JSON) para el cuerpo de una petición generateContent."""
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            return self.error_status, {'error': {'code': self.error_status, 'message': "Error simulado.", 'status': 'UNAVAILABLE'}}
+        prompt = ''.join(
+            part.get('text', '') for content in body.get('contents', []) for part in content.get('parts', [])
+        )
+        config = body.get('generationConfig') or body.get('generation_config') or {}
+        schema = config.get('responseSchema') or config.get('response_schema')
+        text = self.fake._text(prompt, schema)
+        return 200, {
+            'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+            'usageMetadata': {
+                'promptTokenCount': len(prompt.split()),
+                'candidatesTokenCount': len(text.split()),
+                'totalTokenCount': len(prompt.split()) + len(text.split()),
+            },
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not re.search(r':generateContent\b', self.path):
+                    self._send(404, {'error': {'code': 404, 'message': "Solo se simula generateContent."}})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send(400, {'error': {'code': 400, 'message': "JSON no válido."}})
+                    return
+                self._send(*server._respond(body))
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# Servidor WSGI multihilo de la biblioteca estándar, para no depender de
+# ningún paquete extra en el escenario WSGI
+WSGI_SERVER_SCRIPT = """
+import sys
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+class Server(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+from nexus_flow.wsgi import application
+make_server(sys.argv[1], int(sys.argv[2]), application, Server, QuietHandler).serve_forever()
+"""
+
+SERVER_COMMANDS = {
+    'wsgi': lambda host, port: [sys.executable, '-c', WSGI_SERVER_SCRIPT, host, str(port)],
+    'asgi': lambda host, port: [
+        sys.executable, '-m', 'uvicorn', 'nexus_flow.asgi:application',
+        '--host', host, '--port', str(port), '--log-level', 'warning',
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, cwd, env, host='127.0.0.1', port=None, ready_timeout=30):
+    """Arranca el proyecto bajo `kind` ('wsgi' o 'asgi') y espera a que responda."""
+    port = port or free_port()
+    process = subprocess.Popen(SERVER_COMMANDS[kind](host, port), cwd=cwd, env=env)
+    base_url = f'http://{host}:{port}'
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor {kind} terminó al arrancar (código {process.returncode}).")
+        try:
+            requests.get(f'{base_url}/login/', timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"El servidor {kind} no respondió en {ready_timeout} segundos.")
+
+
+def percentile(values, q):
+    """Percentil `q` (0 a 100) por el método del rango más cercano."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(base_url, make_request, sessions, total, concurrency, cookie_name='sessionid'):
+    """
+    Ejecuta `total` peticiones con `concurrency` en vuelo.
+    `make_request(i)` devuelve (método, ruta, cuerpo JSON o None) y cada
+    petición usa la sesión `sessions[i % len(sessions)]` (cookie `cookie_name`).
+    """
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'http'):
+            local.http = requests.Session()
+        method, path, body = make_request(i)
+        start = time.perf_counter()
+        try:
+            response = local.http.request(
+                method, base_url + path, json=body, timeout=120,
+                cookies={cookie_name: sessions[i % len(sessions)]},
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = 'connection-error'
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, status in results if status == 200]
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'ok': len(latencies),
+        'errors': total - len(latencies),
+        'statuses': statuses,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+# Escenarios: nombre -> función que construye la petición número i. Los textos
+# llevan el número para que la caché de respuestas no los resuelva.
+SCENARIOS = {
+    'eisenhower': lambda i: ('POST', '/api/eisenhower/', {'task': f"Preparar el informe trimestral número {i}"}),
+    'laborit': lambda i: ('POST', '/api/laborit/', {'tasks': f"- Informe {i} (2h)\n- Correos (30 min)\n- Reunión (1h)"}),
+    'yerkes-dodson': lambda i: ('POST', '/api/yerkes-dodson/', {'plan': f"Plan {i}: 8h de reuniones seguidas y 2h de informes"}),
+    'tasks-history': lambda i: ('GET', '/api/tasks/history/?limit=50', None),
+    'daily-plans-history': lambda i: ('GET', '/api/daily-plans/history/?limit=50', None),
+}
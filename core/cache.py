@@ -0,0 +1,218 @@
+"""
+Caché de respuestas del modelo direccionada por contenido.
+
+La clave de cada entrada es un hash de (endpoint, modelo, versión de la
+plantilla del prompt, entrada normalizada). La versión de la plantilla se
+calcula a partir de su texto, así que editar un prompt en `core/analysis.py`
+invalida automáticamente sus entradas anteriores.
+
+Hay tres backends intercambiables, elegidos con `settings.LLM_CACHE_BACKEND`:
+- 'memory': diccionario LRU en el propio proceso.
+- 'django': el framework de caché de Django (`settings.CACHES`).
+- 'db': una tabla en la base de datos (`LLMCacheEntry`).
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .llm import LLMResult
+from .metrics import LLM_CACHE
+from .models import LLMCacheEntry
+
+
+def normalize_input(value):
+    """Normaliza la entrada del usuario para que variantes triviales compartan clave."""
+    if isinstance(value, dict):
+        value = json.dumps({k: normalize_input(v) for k, v in value.items()}, sort_keys=True, ensure_ascii=False)
+    elif isinstance(value, (list, tuple)):
+        value = json.dumps([normalize_input(v) for v in value], ensure_ascii=False)
+    elif not isinstance(value, str):
+        value = str(value)
+    return re.sub(r'\s+', ' ', value).strip().casefold()
+
+
+def template_version(template):
+    """Versión de una plantilla de prompt: cambia en cuanto cambia su texto."""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:12]
+
+
+def make_key(endpoint, model_name, template, value):
+    """Clave de caché para una llamada al modelo."""
+    raw = '\x1f'.join([endpoint, model_name, template_version(template), normalize_input(value)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """Caché LRU con TTL dentro del proceso."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def aget(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    async def aset(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DjangoCacheBackend:
+    """Usa una caché de `settings.CACHES`; el desalojo lo gestiona esa caché."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    async def aget(self, key):
+        return await self.cache.aget(f'llm:{key}')
+
+    async def aset(self, key, value, ttl):
+        await self.cache.aset(f'llm:{key}', value, ttl)
+
+
+class DatabaseBackend:
+    """
+    Guarda las respuestas en la tabla `LLMCacheEntry`.
+    Cada `prune_every` escrituras borra las entradas caducadas y las menos
+    usadas recientemente por encima de `max_entries`. Un acierto solo
+    actualiza `accessed_at` si han pasado `touch_every` desde la última vez,
+    para que las lecturas no escriban en la tabla.
+    """
+
+    def __init__(self, max_entries=10000, prune_every=100, touch_every=timedelta(minutes=5)):
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self.touch_every = touch_every
+        self._writes = 0
+
+    async def aget(self, key):
+        now = timezone.now()
+        entry = await LLMCacheEntry.objects.filter(key=key, expires_at__gt=now).afirst()
+        if entry is None:
+            return None
+        if entry.accessed_at <= now - self.touch_every:
+            await LLMCacheEntry.objects.filter(key=key).aupdate(accessed_at=now)
+        return entry.value
+
+    async def aset(self, key, value, ttl):
+        now = timezone.now()
+        await LLMCacheEntry.objects.aupdate_or_create(
+            key=key,
+            defaults={
+                'value': value,
+                'expires_at': now + timedelta(seconds=ttl),
+                'accessed_at': now,
+            },
+        )
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            await self.aprune()
+
+    async def aprune(self):
+        await LLMCacheEntry.objects.filter(expires_at__lte=timezone.now()).adelete()
+        cutoff = await (
+            LLMCacheEntry.objects.order_by('-accessed_at')
+            .values_list('accessed_at', flat=True)[self.max_entries:self.max_entries + 1]
+            .afirst()
+        )
+        if cutoff is not None:
+            await LLMCacheEntry.objects.filter(accessed_at__lte=cutoff).adelete()
+
+
+class ResponseCache:
+    """Caché de respuestas con contadores de aciertos y fallos."""
+
+    def __init__(self, backend, ttl=86400):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    async def aget(self, key):
+        value = await self.backend.aget(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        LLM_CACHE.inc(result='miss' if value is None else 'hit')
+        if value is None:
+            return None
+        return LLMResult(cached=True, **value)
+
+    async def aset(self, key, result):
+        await self.backend.aset(key, {
+            'text': result.text,
+            'model': result.model,
+            'prompt_tokens': result.prompt_tokens,
+            'response_tokens': result.response_tokens,
+        }, self.ttl)
+
+    async def get_or_generate(self, key, generate):
+        """Devuelve la respuesta guardada o llama a `generate()` y la guarda."""
+        result = await self.aget(key)
+        if result is None:
+            result = await generate()
+            await self.aset(key, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+def build_cache_backend(name=None):
+    """Construye el backend indicado (o el de `settings.LLM_CACHE_BACKEND`)."""
+    name = name or settings.LLM_CACHE_BACKEND
+    if name == 'memory':
+        return MemoryBackend(max_entries=settings.LLM_CACHE_MAX_ENTRIES)
+    if name == 'django':
+        return DjangoCacheBackend(alias=settings.LLM_CACHE_ALIAS)
+    if name == 'db':
+        return DatabaseBackend(max_entries=settings.LLM_CACHE_MAX_ENTRIES)
+    raise ValueError(f"Backend de caché desconocido: {name}")
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    """Devuelve la caché del proceso, o None si está desactivada."""
+    global _response_cache
+    if settings.LLM_CACHE_BACKEND == 'none':
+        return None
+    if _response_cache is None:
+        _response_cache = ResponseCache(build_cache_backend(), ttl=settings.LLM_CACHE_TTL)
+    return _response_cache
@@ -0,0 +1,236 @@
+"""
+Clasificador local de la Matriz de Eisenhower.
+
+Muchas tareas son triviales de clasificar ("pagar la renta hoy", "ver una
+serie"). Antes de llamar a Gemini combinamos dos señales locales:
+- Reglas de palabras clave y plazos (urgencia, importancia, ocio).
+- Un Naive Bayes multinomial entrenado con las tareas ya clasificadas del
+  propio usuario (comando `train_local_classifier`), guardado como JSON en
+  `LocalClassifierModel`. Solo aprende de las categorías que asignó el
+  modelo o el usuario (`TRAINING_SOURCES`), no de las que asignó él mismo.
+
+Si la confianza combinada supera `settings.LOCAL_CLASSIFIER_THRESHOLD`, la
+tarea se clasifica al instante sin llamar al modelo. Las reglas solas nunca
+bastan (no entienden el contexto): hace falta que el Naive Bayes del usuario
+esté de acuerdo o lo bastante seguro por su cuenta. Las palabras que siguen
+a una negación ("no", "sin", "ni") en la misma frase no cuentan.
+"""
+import math
+import re
+import time
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .models import CategorySource, EisenhowerCategory, LocalClassifierModel, Task
+
+URGENT_WORDS = {
+    'hoy', 'ahora', 'urgente', 'inmediato', 'inmediatamente', 'asap', 'manana',
+    'vence', 'vencimiento', 'plazo', 'deadline', 'today', 'now', 'urgent', 'tonight',
+    'tomorrow', 'due', 'emergencia', 'emergency',
+}
+IMPORTANT_WORDS = {
+    'pagar', 'pago', 'renta', 'alquiler', 'factura', 'impuestos', 'jefe', 'cliente',
+    'entrega', 'examen', 'medico', 'salud', 'banco', 'contrato', 'informe', 'reunion',
+    'pay', 'rent', 'bill', 'taxes', 'boss', 'client', 'doctor', 'exam', 'report',
+    'meeting', 'proyecto', 'project', 'estudiar', 'study',
+}
+TRIVIAL_WORDS = {
+    'serie', 'series', 'netflix', 'pelicula', 'videojuego', 'videojuegos', 'jugar',
+    'redes', 'instagram', 'tiktok', 'youtube', 'scroll', 'watch', 'movie', 'game',
+    'games', 'chismear', 'siesta',
+}
+# Plazos explícitos: "antes del viernes", "para el 15", fechas como 15/03
+DEADLINE_RE = re.compile(r'\b(antes de|para el|before|by)\b|\b\d{1,2}[/-]\d{1,2}\b')
+# Una negación anula las señales que la siguen hasta el final de la frase
+# ("no hace falta llamar hoy al cliente", "sin prisa")
+NEGATION_RE = re.compile(r'\b(no|sin|ni|nunca|not|without|never)\b')
+CLAUSE_RE = re.compile(r'[,;:.!?\n]+')
+# Origen de las predicciones que solo salen de las reglas
+RULES_SOURCE = 'reglas'
+
+
+def normalize_text(text):
+    """Texto en minúsculas y sin acentos."""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Palabras en minúsculas y sin acentos."""
+    return re.findall(r'[a-z0-9]{2,}', normalize_text(text))
+
+
+def affirmed_text(text):
+    """Texto normalizado sin lo que sigue a una negación dentro de cada frase."""
+    return ' , '.join(NEGATION_RE.split(clause, maxsplit=1)[0] for clause in CLAUSE_RE.split(normalize_text(text)))
+
+
+@dataclass
+class Prediction:
+    """Categoría propuesta por el clasificador local y su confianza (0 a 1)."""
+    category: EisenhowerCategory
+    confidence: float
+    source: str
+
+
+def rule_signals(text):
+    """Señales de las reglas en `text`: (urgente, importante, ocio)."""
+    text = affirmed_text(text)
+    tokens = set(tokenize(text))
+    urgent = bool(tokens & URGENT_WORDS) or bool(DEADLINE_RE.search(text))
+    return urgent, bool(tokens & IMPORTANT_WORDS), bool(tokens & TRIVIAL_WORDS)
+
+
+def heuristic_predict(text):
+    """Clasificación por reglas, o None si no hay señales suficientes."""
+    urgent, important, trivial = rule_signals(text)
+    if trivial and important:
+        # Señales contrarias ("pagar netflix"): que decida el historial o el modelo
+        return None
+    if trivial:
+        return Prediction(EisenhowerCategory.NOT_URGENT_NOT_IMPORTANT, 0.9 if not urgent else 0.7, RULES_SOURCE)
+    if urgent and important:
+        return Prediction(EisenhowerCategory.URGENT_IMPORTANT, 0.9, RULES_SOURCE)
+    if important:
+        return Prediction(EisenhowerCategory.NOT_URGENT_IMPORTANT, 0.6, RULES_SOURCE)
+    if urgent:
+        return Prediction(EisenhowerCategory.URGENT_NOT_IMPORTANT, 0.5, RULES_SOURCE)
+    return None
+
+
+class NaiveBayes:
+    """Naive Bayes multinomial con suavizado de Laplace, serializable a JSON."""
+
+    def __init__(self, class_counts=None, token_counts=None):
+        self.class_counts = Counter(class_counts or {})
+        self.token_counts = {int(k): Counter(v) for k, v in (token_counts or {}).items()}
+        self._refresh()
+
+    def _refresh(self):
+        self.totals = {category: sum(counts.values()) for category, counts in self.token_counts.items()}
+        self.vocabulary = len({token for counts in self.token_counts.values() for token in counts})
+        self.samples = sum(self.class_counts.values())
+
+    @classmethod
+    def train(cls, examples):
+        """Entrena con pares (texto, categoría)."""
+        model = cls()
+        for text, category in examples:
+            category = int(category)
+            model.class_counts[category] += 1
+            model.token_counts.setdefault(category, Counter()).update(tokenize(text))
+        model._refresh()
+        return model
+
+    def predict(self, text):
+        """Devuelve Prediction con la probabilidad a posteriori de la mejor categoría."""
+        if not self.samples:
+            return None
+        tokens = tokenize(text)
+        scores = {}
+        for category, count in self.class_counts.items():
+            counts = self.token_counts.get(category, Counter())
+            denominator = self.totals.get(category, 0) + self.vocabulary + 1
+            score = math.log(count / self.samples)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            scores[category] = score
+        best = max(scores, key=scores.get)
+        # Normalizamos en espacio logarítmico para obtener probabilidades
+        top = scores[best]
+        total = sum(math.exp(score - top) for score in scores.values())
+        return Prediction(EisenhowerCategory(best), 1 / total, 'historial')
+
+    def to_json(self):
+        return {
+            'class_counts': {str(k): v for k, v in self.class_counts.items()},
+            'token_counts': {str(k): dict(v) for k, v in self.token_counts.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({int(k): v for k, v in data['class_counts'].items()}, data['token_counts'])
+
+
+def combine(heuristic, learned):
+    """Une las dos predicciones: si coinciden la confianza sube, si no, baja."""
+    if heuristic is None or learned is None:
+        return heuristic or learned
+    if heuristic.category == learned.category:
+        confidence = 1 - (1 - heuristic.confidence) * (1 - learned.confidence)
+        return Prediction(heuristic.category, confidence, 'reglas+historial')
+    winner, loser = sorted([heuristic, learned], key=lambda p: p.confidence, reverse=True)
+    return Prediction(winner.category, winner.confidence * (1 - loser.confidence), winner.source)
+
+
+def predict(text, model=None):
+    """Predicción local combinada para `text` con el modelo del usuario (opcional)."""
+    learned = model.predict(text) if model is not None else None
+    return combine(heuristic_predict(text), learned)
+
+
+# Orígenes de las categorías con las que se entrena y se evalúa
+TRAINING_SOURCES = (CategorySource.LLM, CategorySource.MANUAL)
+
+
+def training_examples(user):
+    """
+    Pares (descripción, categoría) de las tareas del usuario que clasificó el
+    modelo o el propio usuario, de la más antigua a la más reciente.
+    """
+    return list(
+        Task.objects.filter(user=user, category_source__in=TRAINING_SOURCES)
+        .exclude(eisenhower_category=EisenhowerCategory.UNSPECIFIED)
+        .order_by('created_at', 'id')
+        .values_list('description', 'eisenhower_category')
+    )
+
+
+# Modelos por usuario ya cargados: user_id -> (instante de carga, modelo o None).
+# Como máximo _MODEL_CACHE_SIZE (se descartan los usados hace más tiempo).
+_models = OrderedDict()
+_models_lock = threading.Lock()
+_MODEL_TTL = 300
+_MODEL_CACHE_SIZE = 1000
+
+
+async def load_user_model(user):
+    """Modelo entrenado del usuario (cacheado unos minutos), o None si no tiene."""
+    with _models_lock:
+        cached = _models.get(user.pk)
+        if cached is not None and time.monotonic() - cached[0] < _MODEL_TTL:
+            _models.move_to_end(user.pk)
+            return cached[1]
+    stored = await LocalClassifierModel.objects.filter(user=user).afirst()
+    model = None
+    if stored is not None and stored.samples >= settings.LOCAL_CLASSIFIER_MIN_SAMPLES:
+        model = NaiveBayes.from_json(stored.data)
+    with _models_lock:
+        _models[user.pk] = (time.monotonic(), model)
+        _models.move_to_end(user.pk)
+        while len(_models) > _MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    return model
+
+
+def is_confident(prediction, threshold):
+    """La predicción basta para no llamar al modelo: supera el umbral y no sale solo de las reglas."""
+    return prediction is not None and prediction.source != RULES_SOURCE and prediction.confidence >= threshold
+
+
+async def classify_locally(user, text):
+    """
+    Devuelve la Prediction local si supera el umbral de confianza, o None
+    si hay que preguntar al modelo. Una predicción solo de las reglas (sin
+    modelo del usuario, o en contra de él) siempre pregunta al modelo.
+    """
+    if not settings.LOCAL_CLASSIFIER_ENABLED:
+        return None
+    prediction = predict(text, await load_user_model(user))
+    if not is_confident(prediction, settings.LOCAL_CLASSIFIER_THRESHOLD):
+        return None
+    return prediction
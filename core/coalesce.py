@@ -0,0 +1,277 @@
+"""
+Agrupación de peticiones idénticas en vuelo (single-flight).
+
+Un doble clic o un reintento del navegador lanzan el mismo análisis varias
+veces a la vez. Con la clave de la caché de respuestas (endpoint, modelo,
+versión del prompt y entrada normalizada), la primera petición ("líder")
+llama al modelo y las demás ("seguidoras") esperan y reciben su resultado,
+incluidos los trozos del streaming a medida que llegan. Las seguidoras
+reciben el resultado marcado como `cached`: no cuentan tokens.
+
+Dentro del proceso se agrupan todas las peticiones (también las de bucles de
+eventos distintos, como ocurre con vistas asíncronas servidas por WSGI). Con
+`settings.COALESCE_BACKEND = 'django'`, además, la líder de cada proceso toma
+un cerrojo en la caché de Django (`COALESCE_CACHE_ALIAS`, por defecto la caché
+'shared': Redis, Memcached o base de datos; una caché en memoria se rechaza
+porque no se comparte entre procesos) y los demás procesos esperan su
+resultado consultándola; entre procesos el streaming llega de una vez al final.
+"""
+import asyncio
+import threading
+import time
+from dataclasses import replace
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+from .llm import LLMResult
+from .metrics import LLM_COALESCED
+
+
+class FlightAbandoned(Exception):
+    """
+    La petición líder se canceló (el cliente se desconectó) antes de terminar.
+    Las seguidoras que aún no recibieron nada lo reintentan por su cuenta.
+    """
+
+
+ABANDONED_MESSAGE = "La petición idéntica que estaba en curso se canceló. Vuelve a intentarlo."
+
+
+class Flight:
+    """Una llamada al modelo en curso y las peticiones que esperan su resultado."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def _notify(self, subscribers, item):
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # El bucle de esa petición ya se cerró
+                pass
+
+    def publish(self, chunk):
+        with self._lock:
+            self.chunks.append(chunk)
+            subscribers = list(self._subscribers)
+        self._notify(subscribers, chunk)
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.done, self.result, self.error = True, result, error
+            subscribers, self._subscribers = self._subscribers, []
+        self._notify(subscribers, None)
+
+    async def follow(self):
+        """Emite los trozos ya publicados y los siguientes; al final, el LLMResult compartido."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            backlog = list(self.chunks)
+            subscribed = not self.done
+            if subscribed:
+                self._subscribers.append(subscriber)
+        try:
+            for chunk in backlog:
+                yield chunk
+            while subscribed:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+        if self.error is not None:
+            raise self.error
+        yield replace(self.result, cached=True)
+
+
+class Coalescer:
+    """
+    Registro de llamadas en vuelo por clave. `cache` (opcional) es la caché de
+    Django usada como cerrojo y buzón de resultados entre procesos.
+    """
+
+    def __init__(self, cache=None, wait_timeout=60.0, poll_interval=0.05):
+        self.cache = cache
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Devuelve (flight, es_líder)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def _leave(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    async def _acquire(self, key):
+        """
+        Entre procesos: devuelve (True, None) si este proceso debe llamar al
+        modelo (con el cerrojo si lo consiguió) o (False, LLMResult) con el
+        resultado que calculó otro proceso.
+        """
+        if self.cache is None:
+            return True, None
+        lock_key, result_key = f'coalesce:lock:{key}', f'coalesce:result:{key}'
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            if await self.cache.aadd(lock_key, 1, self.wait_timeout):
+                return True, None
+            # Otro proceso está llamando al modelo: esperamos su resultado
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                value = await self.cache.aget(result_key)
+                if value is not None:
+                    LLM_COALESCED.inc(scope='cluster')
+                    return False, LLMResult(cached=True, **value)
+                if not await self.cache.ahas_key(lock_key):
+                    # El otro proceso falló sin resultado: lo intentamos nosotros
+                    break
+        # Se agotó la espera: llamamos al modelo sin cerrojo
+        return True, None
+
+    async def _release(self, key, result):
+        if self.cache is None:
+            return
+        if result is not None:
+            await self.cache.aset(f'coalesce:result:{key}', {
+                'text': result.text,
+                'model': result.model,
+                'prompt_tokens': result.prompt_tokens,
+                'response_tokens': result.response_tokens,
+            }, self.wait_timeout)
+        await self.cache.adelete(f'coalesce:lock:{key}')
+
+    async def run(self, key, generate):
+        """Devuelve el LLMResult de `generate()`, compartido con las peticiones idénticas en vuelo."""
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                break
+            LLM_COALESCED.inc(scope='process')
+            try:
+                async for item in flight.follow():
+                    if isinstance(item, LLMResult):
+                        return item
+            except FlightAbandoned:
+                continue
+
+        result = None
+        try:
+            should_call, result = await self._acquire(key)
+            if should_call:
+                try:
+                    result = await generate()
+                finally:
+                    await self._release(key, result)
+        except BaseException as e:
+            flight.finish(error=FlightAbandoned(ABANDONED_MESSAGE) if isinstance(e, asyncio.CancelledError) else e)
+            raise
+        finally:
+            self._leave(key, flight)
+        flight.finish(result=result)
+        return result
+
+    async def stream(self, key, produce):
+        """
+        Como `run`, pero en streaming. `produce()` es un generador asíncrono que
+        emite trozos de texto y, al final, el LLMResult completo; este método
+        emite lo mismo, compartido con las peticiones idénticas en vuelo.
+        """
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                break
+            LLM_COALESCED.inc(scope='process')
+            streamed = False
+            try:
+                async for item in flight.follow():
+                    if isinstance(item, LLMResult):
+                        if not streamed:
+                            # La líder no iba en streaming: el texto llega de una vez
+                            yield item.text
+                        yield item
+                        return
+                    streamed = True
+                    yield item
+            except FlightAbandoned:
+                if streamed:
+                    raise
+                continue
+
+        result = None
+        try:
+            should_call, result = await self._acquire(key)
+            if should_call:
+                try:
+                    async for item in produce():
+                        if isinstance(item, LLMResult):
+                            result = item
+                        else:
+                            flight.publish(item)
+                            yield item
+                finally:
+                    await self._release(key, result)
+            else:
+                yield result.text
+        except BaseException as e:
+            # GeneratorExit o CancelledError: el cliente de la líder se desconectó
+            abandoned = isinstance(e, (GeneratorExit, asyncio.CancelledError))
+            flight.finish(error=FlightAbandoned(ABANDONED_MESSAGE) if abandoned else e)
+            raise
+        finally:
+            self._leave(key, flight)
+        flight.finish(result=result)
+        yield result
+
+
+def shared_cache(alias):
+    """Caché `alias` para agrupar entre procesos; ImproperlyConfigured si no se comparte."""
+    if alias not in settings.CACHES:
+        raise ImproperlyConfigured(
+            f"COALESCE_BACKEND=django necesita la caché compartida {alias!r}: configura SHARED_CACHE "
+            "o COALESCE_CACHE_ALIAS, o usa COALESCE_BACKEND=memory."
+        )
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f"La caché {alias!r} no se comparte entre procesos: no sirve para agrupar peticiones."
+        )
+    return cache
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    """Coalescer según `settings.COALESCE_BACKEND`, o None si está desactivado."""
+    global _coalescer
+    if settings.COALESCE_BACKEND == 'none':
+        return None
+    with _coalescer_lock:
+        if _coalescer is None:
+            cache = shared_cache(settings.COALESCE_CACHE_ALIAS) if settings.COALESCE_BACKEND == 'django' else None
+            _coalescer = Coalescer(cache, settings.COALESCE_WAIT_TIMEOUT, settings.COALESCE_POLL_INTERVAL)
+        return _coalescer
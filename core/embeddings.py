@@ -0,0 +1,337 @@
+"""
+Reutilización de clasificaciones de tareas casi iguales.
+
+La caché de respuestas solo acierta con textos idénticos, pero los usuarios
+repiten la misma tarea con otras palabras ("llamar al banco", "llamar al
+banco mañana"). Cada tarea clasificada guarda su embedding (`TaskEmbedding`,
+calculado una sola vez) y cada usuario tiene un índice en memoria con una
+matriz NumPy de vectores normalizados: buscar la tarea más parecida es un
+producto matriz-vector, menos de un milisegundo con decenas de miles de
+tareas. Si la similitud del coseno supera `settings.SIMILAR_TASKS_THRESHOLD`
+y las dos tareas tienen las mismas señales de prioridad (negaciones, números
+y las palabras de urgencia, importancia y ocio de core/classifier.py), se
+reutiliza la categoría de esa tarea sin llamar al modelo. Solo se indexan las
+tareas que clasificó el modelo o el usuario: una categoría reutilizada o del
+clasificador local no se vuelve a reutilizar, así que un error no se
+propaga de tarea en tarea. Los índices
+cargados ocupan como mucho `settings.SIMILAR_TASKS_CACHE_VECTORS` vectores
+entre todos los usuarios; se descartan los usados hace más tiempo.
+
+Embeddings (`settings.EMBEDDING_BACKEND`):
+- 'gemini': API de embeddings de Gemini (`EMBEDDING_MODEL`); reconoce
+  paráfrasis a cambio de una llamada (barata) por tarea nueva.
+- 'hashing': local y sin red. Palabras y trigramas de caracteres proyectados
+  con hashing en `EMBEDDING_DIMENSIONS` dimensiones; reconoce variaciones de
+  redacción, no sinónimos. No entiende el significado ("llamar al banco" y
+  "no llamar al banco" tienen una similitud de 0,9): de eso se encarga la
+  comparación de señales.
+
+Los embeddings que faltan (tareas anteriores, o tras cambiar de backend) se
+calculan con el comando `build_task_embeddings`.
+"""
+import asyncio
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .classifier import NEGATION_RE, TRAINING_SOURCES, normalize_text, rule_signals, tokenize
+from .metrics import SIMILAR_TASK_LOOKUPS
+from .models import EisenhowerCategory, Task, TaskEmbedding
+
+# Palabras que no distinguen una tarea de otra
+STOPWORDS = {
+    'el', 'la', 'los', 'las', 'lo', 'un', 'una', 'unos', 'unas', 'de', 'del', 'al', 'en',
+    'con', 'por', 'para', 'que', 'mi', 'mis', 'su', 'sus', 'y', 'o', 'the', 'to', 'of',
+    'and', 'or', 'my', 'for', 'on', 'in', 'at',
+}
+
+
+class HashingEmbedder:
+    """Embeddings locales por hashing de palabras y trigramas de caracteres."""
+
+    def __init__(self, dimensions=128):
+        self.dimensions = dimensions
+        self.name = f'hashing-{dimensions}'
+
+    def _features(self, text):
+        words = [word for word in tokenize(text) if word not in STOPWORDS]
+        features = list(words)
+        for word in words:
+            padded = f'<{word}>'
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts):
+        """Matriz (len(texts), dimensions) de vectores normalizados."""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 es estable entre procesos (hash() no lo es)
+                digest = zlib.crc32(feature.encode('utf-8'))
+                vectors[row, digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        return normalize(vectors)
+
+    async def aembed(self, texts):
+        return self.embed(texts)
+
+
+class GeminiEmbedder:
+    """Embeddings de la API de Gemini, pedidos en un hilo (el SDK es síncrono)."""
+
+    def __init__(self, model_name, dimensions=128):
+        from .llm import configure_genai
+
+        self.genai = configure_genai()
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.name = f'{model_name.removeprefix("models/")}-{dimensions}'
+
+    def embed(self, texts):
+        result = self.genai.embed_content(
+            model=self.model_name,
+            content=list(texts),
+            task_type='semantic_similarity',
+            output_dimensionality=self.dimensions,
+        )
+        return normalize(np.asarray(result['embedding'], dtype=np.float32).reshape(len(texts), -1))
+
+    async def aembed(self, texts):
+        return await asyncio.to_thread(self.embed, texts)
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Embedder configurado en `settings.EMBEDDING_BACKEND` (uno por proceso)."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if settings.EMBEDDING_BACKEND == 'gemini':
+                _embedder = GeminiEmbedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS)
+            elif settings.EMBEDDING_BACKEND == 'hashing':
+                _embedder = HashingEmbedder(settings.EMBEDDING_DIMENSIONS)
+            else:
+                raise ValueError(f"EMBEDDING_BACKEND desconocido: {settings.EMBEDDING_BACKEND!r}")
+        return _embedder
+
+
+# Embeddings de los últimos textos, del usado hace más tiempo al más
+# reciente: la tarea que se acaba de buscar se guarda justo después sin
+# volver a calcularlo
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+_RECENT_SIZE = 256
+
+
+async def embed_text(text):
+    """Embedding (vector normalizado) de un texto."""
+    with _recent_lock:
+        vector = _recent.get(text)
+        if vector is not None:
+            _recent.move_to_end(text)
+            return vector
+    vector = (await get_embedder().aembed([text]))[0]
+    with _recent_lock:
+        _recent[text] = vector
+        while len(_recent) > _RECENT_SIZE:
+            _recent.popitem(last=False)
+    return vector
+
+
+def priority_signals(text):
+    """Lo que puede cambiar la prioridad de una tarea aunque el texto se parezca."""
+    return rule_signals(text), bool(NEGATION_RE.search(normalize_text(text))), set(re.findall(r'\d+', text))
+
+
+@dataclass
+class Match:
+    """Tarea anterior más parecida, su similitud del coseno y su descripción."""
+    task_id: int
+    category: EisenhowerCategory
+    similarity: float
+    description: str = ''
+
+
+class EmbeddingIndex:
+    """Vectores de las tareas de un usuario en una matriz que crece por duplicación."""
+
+    def __init__(self, dimensions, capacity=1024):
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.task_ids = np.zeros(capacity, dtype=np.int64)
+        self.categories = np.zeros(capacity, dtype=np.int8)
+        self.size = 0
+
+    @classmethod
+    def from_rows(cls, dimensions, rows):
+        """Construye el índice a partir de filas (task_id, categoría, vector en bytes)."""
+        index = cls(dimensions, capacity=max(1024, len(rows)))
+        if rows:
+            task_ids, categories, vectors = zip(*rows)
+            size = len(rows)
+            index.vectors[:size] = np.frombuffer(b''.join(vectors), dtype=np.float32).reshape(size, dimensions)
+            index.task_ids[:size] = task_ids
+            index.categories[:size] = categories
+            index.size = size
+        return index
+
+    def add(self, task_id, category, vector):
+        if self.size == len(self.vectors):
+            capacity = 2 * len(self.vectors)
+            self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+            self.task_ids = np.resize(self.task_ids, capacity)
+            self.categories = np.resize(self.categories, capacity)
+        self.vectors[self.size] = vector
+        self.task_ids[self.size] = task_id
+        self.categories[self.size] = category
+        self.size += 1
+
+    def search(self, vector):
+        """Match con la tarea más parecida a `vector`, o None si el índice está vacío."""
+        if not self.size:
+            return None
+        scores = self.vectors[:self.size] @ vector
+        best = int(np.argmax(scores))
+        return Match(int(self.task_ids[best]), EisenhowerCategory(int(self.categories[best])), float(scores[best]))
+
+
+# Índices por usuario ya cargados: user_id -> (instante de carga, índice), del
+# usado hace más tiempo al más reciente. Se recargan cada cierto tiempo para
+# ver las tareas guardadas por otros procesos.
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+_INDEX_TTL = 300
+
+
+def _cache_index(user_id, index):
+    with _indexes_lock:
+        _indexes[user_id] = (time.monotonic(), index)
+        _indexes.move_to_end(user_id)
+        # Se descartan los índices usados hace más tiempo hasta caber en el
+        # límite de vectores (el más reciente se conserva siempre)
+        total = sum(len(cached.vectors) for _, cached in _indexes.values())
+        while total > settings.SIMILAR_TASKS_CACHE_VECTORS and len(_indexes) > 1:
+            _, (_, evicted) = _indexes.popitem(last=False)
+            total -= len(evicted.vectors)
+
+
+async def load_index(user):
+    """Índice de las tareas clasificadas más recientes del usuario."""
+    with _indexes_lock:
+        cached = _indexes.get(user.pk)
+        if cached is not None and time.monotonic() - cached[0] < _INDEX_TTL:
+            _indexes.move_to_end(user.pk)
+            return cached[1]
+    embedder = get_embedder()
+    rows = [
+        row async for row in TaskEmbedding.objects
+        .filter(user=user, model=embedder.name, task__category_source__in=INDEXED_SOURCES)
+        .order_by('-task_id')
+        .values_list('task_id', 'task__eisenhower_category', 'vector')[:settings.SIMILAR_TASKS_MAX_INDEX]
+    ]
+    index = EmbeddingIndex.from_rows(embedder.dimensions, rows)
+    _cache_index(user.pk, index)
+    return index
+
+
+async def find_similar(user, text):
+    """
+    Tarea anterior del usuario lo bastante parecida a `text` (Match), o None.
+    Se descarta la más parecida si sus señales de prioridad no coinciden
+    ("no llamar al banco" frente a "llamar al banco").
+    Un fallo al calcular el embedding no impide clasificar: se pregunta al modelo.
+    """
+    if not settings.SIMILAR_TASKS_ENABLED:
+        return None
+    try:
+        match = (await load_index(user)).search(await embed_text(text))
+        if match is not None and match.similarity >= settings.SIMILAR_TASKS_THRESHOLD:
+            match.description = await (
+                Task.objects.filter(pk=match.task_id).values_list('description', flat=True).afirst()
+            )
+    except Exception:
+        SIMILAR_TASK_LOOKUPS.inc(result='error')
+        return None
+    if match is None or match.similarity < settings.SIMILAR_TASKS_THRESHOLD or match.description is None:
+        SIMILAR_TASK_LOOKUPS.inc(result='miss')
+        return None
+    if priority_signals(text) != priority_signals(match.description):
+        SIMILAR_TASK_LOOKUPS.inc(result='rejected')
+        return None
+    SIMILAR_TASK_LOOKUPS.inc(result='hit')
+    return match
+
+
+# Orígenes de las categorías que se indexan: las del modelo y las manuales
+INDEXED_SOURCES = TRAINING_SOURCES
+
+
+def classified(tasks):
+    """Las tareas que se indexan: las que tienen categoría del modelo o del usuario."""
+    return [
+        task for task in tasks
+        if task.eisenhower_category != EisenhowerCategory.UNSPECIFIED and task.category_source in INDEXED_SOURCES
+    ]
+
+
+async def embed_descriptions(descriptions):
+    """
+    Embeddings de las descripciones de las tareas que se van a indexar, o
+    None si no se pudieron calcular: la tarea se guarda igual y
+    build_task_embeddings calcula su embedding después.
+    """
+    try:
+        if len(descriptions) == 1:
+            return [await embed_text(descriptions[0])]
+        return await get_embedder().aembed(list(descriptions))
+    except Exception:
+        return None
+
+
+def store_embeddings(tasks, vectors):
+    """
+    Guarda los embeddings ya calculados de `tasks` y, al confirmarse la
+    transacción, los añade a los índices cargados. Se puede llamar dentro de
+    la transacción que guarda las tareas.
+    """
+    embedder = get_embedder()
+    TaskEmbedding.objects.bulk_create([
+        TaskEmbedding(task=task, user_id=task.user_id, model=embedder.name, vector=vector.tobytes())
+        for task, vector in zip(tasks, vectors)
+    ], ignore_conflicts=True)
+
+    def add_to_indexes():
+        with _indexes_lock:
+            for task, vector in zip(tasks, vectors):
+                cached = _indexes.get(task.user_id)
+                if cached is not None:
+                    cached[1].add(task.pk, task.eisenhower_category, vector)
+
+    transaction.on_commit(add_to_indexes)
+
+
+async def index_tasks(tasks):
+    """
+    Guarda el embedding de las tareas clasificadas por el modelo o el usuario
+    y las añade a los índices ya cargados.
+    """
+    tasks = classified(tasks)
+    if not settings.SIMILAR_TASKS_ENABLED or not tasks:
+        return
+    vectors = await embed_descriptions([task.description for task in tasks])
+    if vectors is not None:
+        await sync_to_async(store_embeddings)(tasks, vectors)
@@ -0,0 +1,378 @@
+"""
+Exportación e importación del historial de tareas y planes diarios.
+
+La exportación recorre la tabla con `.iterator(chunk_size=...)` (o
+`.aiterator()` bajo ASGI) y emite cada bloque de filas ya formateado en
+NDJSON (un objeto JSON por línea) o CSV, así que la memoria no crece con el
+tamaño del historial. La usan el endpoint `/api/export/<tipo>/` y el comando
+`export_history`.
+
+Los planes diarios se exportan con todos sus datos (día, versión, último
+análisis) y con sus versiones anteriores (`revisions`, en CSV como JSON),
+así que importar lo exportado no pierde nada. En CSV, las celdas que
+empiezan por `=`, `+`, `-` o `@` (que una hoja de cálculo ejecutaría como
+fórmula) llevan delante un apóstrofo, que la importación quita.
+
+La importación (comando `import_history`) lee el fichero línea a línea y
+guarda las filas dentro de una transacción: las tareas con `bulk_create` por
+lotes y cada plan con sus versiones. Las fechas de creación se conservan: se
+restauran con un UPDATE tras insertar, porque `auto_now_add` pone la actual.
+Un plan de un usuario y día que ya tiene plan (en la base de datos o antes
+en el mismo fichero) no crea otro: se guarda como una versión nueva de ese
+plan (`plans.save_version`), sin sus versiones anteriores.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import CategorySource, DailyPlan, DailyPlanRevision, EisenhowerCategory, Task
+from .plans import content_hash, save_version
+from .schemas import parse_category
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _task_row(row):
+    return {
+        'id': row['id'],
+        'user': row['user__username'],
+        'description': row['description'],
+        'category': EisenhowerCategory(row['eisenhower_category']).label,
+        'category_source': row['category_source'],
+        'created_at': row['created_at'].isoformat(),
+        'prompt_tokens': row['prompt_tokens'],
+        'response_tokens': row['response_tokens'],
+    }
+
+
+def _plan_row(row):
+    return {
+        'id': row['id'],
+        'user': row['user__username'],
+        'day': row['day'].isoformat(),
+        'version': row['version'],
+        'plan_text': row['plan_text'],
+        'analysis': row['analysis'],
+        'created_at': row['created_at'].isoformat(),
+        'updated_at': row['updated_at'].isoformat(),
+        'prompt_tokens': row['prompt_tokens'],
+        'response_tokens': row['response_tokens'],
+        'revisions': [
+            {
+                'version': revision['version'],
+                'diff': revision['diff'],
+                'incremental': revision['incremental'],
+                'created_at': revision['created_at'].isoformat(),
+                'prompt_tokens': revision['prompt_tokens'],
+                'response_tokens': revision['response_tokens'],
+            }
+            for revision in row['revisions']
+        ],
+    }
+
+
+def _attach_revisions(rows):
+    """Añade a cada plan del bloque sus versiones anteriores, con una consulta por bloque."""
+    revisions = {row['id']: [] for row in rows}
+    for revision in DailyPlanRevision.objects.filter(plan_id__in=revisions).order_by('plan_id', 'version').values(
+        'plan_id', 'version', 'diff', 'incremental', 'created_at', 'prompt_tokens', 'response_tokens',
+    ):
+        revisions[revision['plan_id']].append(revision)
+    for row in rows:
+        row['revisions'] = revisions[row['id']]
+    return rows
+
+
+# Cada tipo exportable: (queryset, columnas de `.values()`, conversión a fila,
+# columnas exportadas, datos relacionados que se añaden a cada bloque de filas)
+EXPORTS = {
+    'tasks': (
+        lambda: Task.objects.filter(is_todo=False),
+        (
+            'id', 'user__username', 'description', 'eisenhower_category', 'category_source', 'created_at',
+            'prompt_tokens', 'response_tokens',
+        ),
+        _task_row,
+        ('id', 'user', 'description', 'category', 'category_source', 'created_at', 'prompt_tokens', 'response_tokens'),
+        None,
+    ),
+    'daily-plans': (
+        lambda: DailyPlan.objects.all(),
+        (
+            'id', 'user__username', 'day', 'version', 'plan_text', 'analysis', 'created_at', 'updated_at',
+            'prompt_tokens', 'response_tokens',
+        ),
+        _plan_row,
+        (
+            'id', 'user', 'day', 'version', 'plan_text', 'analysis', 'created_at', 'updated_at',
+            'prompt_tokens', 'response_tokens', 'revisions',
+        ),
+        _attach_revisions,
+    ),
+}
+
+# Primeros caracteres con los que una hoja de cálculo interpreta la celda como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+# También se escapan las celdas que ya empiezan por apóstrofo: así al importar
+# solo se quita el que añadió la exportación ("'=x" sale como "''=x")
+ESCAPED_PREFIXES = FORMULA_PREFIXES + ("'",)
+
+
+def _csv_cell(value):
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    if isinstance(value, str) and value.startswith(ESCAPED_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _from_csv_cell(value):
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(ESCAPED_PREFIXES):
+        return value[1:]
+    return value
+
+
+def _queryset(kind, user=None):
+    make_queryset, values, _, _, _ = EXPORTS[kind]
+    queryset = make_queryset()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    return queryset.order_by('id').values(*values)
+
+
+class _Formatter:
+    """Convierte bloques de filas al texto de `fmt` ('ndjson' o 'csv')."""
+
+    def __init__(self, kind, fmt):
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato desconocido: {fmt}. Usa uno de: {', '.join(FORMATS)}.")
+        _, _, self.convert, self.columns, self.attach = EXPORTS[kind]
+        self.fmt = fmt
+        self.buffer = io.StringIO()
+        self.writer = csv.DictWriter(self.buffer, fieldnames=self.columns)
+
+    def header(self):
+        if self.fmt != 'csv':
+            return ''
+        self.writer.writeheader()
+        return self._drain()
+
+    def prepare(self, rows):
+        """Añade a las filas sus datos relacionados (consulta la base de datos)."""
+        return self.attach(rows) if self.attach else rows
+
+    def format(self, rows):
+        rows = [self.convert(row) for row in rows]
+        if self.fmt == 'ndjson':
+            return ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+        self.writer.writerows({column: _csv_cell(value) for column, value in row.items()} for row in rows)
+        return self._drain()
+
+    def _drain(self):
+        text = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return text
+
+
+def export(kind, fmt, user=None, chunk_size=None):
+    """Generador con el historial `kind` en formato `fmt`, en bloques de `chunk_size` filas."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    formatter = _Formatter(kind, fmt)
+    yield formatter.header()
+    rows = []
+    for row in _queryset(kind, user).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield formatter.format(formatter.prepare(rows))
+            rows = []
+    if rows:
+        yield formatter.format(formatter.prepare(rows))
+
+
+async def aexport(kind, fmt, user=None, chunk_size=None):
+    """Igual que `export`, como generador asíncrono (para servirlo bajo ASGI)."""
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    formatter = _Formatter(kind, fmt)
+    yield formatter.header()
+    rows = []
+    prepare = sync_to_async(formatter.prepare)
+    async for row in _queryset(kind, user).aiterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield formatter.format(await prepare(rows))
+            rows = []
+    if rows:
+        yield formatter.format(await prepare(rows))
+
+
+def read_rows(fmt, lines):
+    """Filas (diccionarios) de un fichero NDJSON o CSV, leídas de una en una, con su número de línea."""
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            if line.strip():
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    raise ValueError(f"Línea {number}: JSON no válido.")
+    elif fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            row = {column: _from_csv_cell(value) for column, value in row.items()}
+            if isinstance(row.get('revisions'), str):
+                try:
+                    row['revisions'] = json.loads(row['revisions'] or '[]')
+                except ValueError:
+                    raise ValueError(f"Línea {reader.line_num}: versiones del plan no válidas.")
+            yield reader.line_num, row
+    else:
+        raise ValueError(f"Formato desconocido: {fmt}. Usa uno de: {', '.join(FORMATS)}.")
+
+
+def _moment(value):
+    if not value:
+        return timezone.now()
+    moment = parse_datetime(str(value))
+    if moment is None:
+        raise ValueError(f"Fecha no válida: {value!r}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _tokens(row):
+    return {
+        'prompt_tokens': int(row.get('prompt_tokens') or 0),
+        'response_tokens': int(row.get('response_tokens') or 0),
+    }
+
+
+@dataclass
+class ImportedRow:
+    """
+    Fila importada sin guardar: el objeto, las fechas originales que hay que
+    restaurar tras insertarlo y, en los planes, sus versiones anteriores.
+    """
+    obj: object
+    dates: dict
+    revisions: list = field(default_factory=list)
+
+
+def build_object(kind, row, user_id):
+    """ImportedRow con la Task o el DailyPlan de una fila importada. Lanza ValueError si no es válida."""
+    if kind == 'tasks':
+        description = str(row.get('description') or '').strip()
+        if not description:
+            raise ValueError("Falta la descripción de la tarea.")
+        category = row.get('category')
+        unspecified = (None, '', '0', 0, EisenhowerCategory.UNSPECIFIED.label)
+        parsed = EisenhowerCategory.UNSPECIFIED if category in unspecified else parse_category(category)
+        if parsed is None:
+            raise ValueError(f"Categoría desconocida: {category!r}")
+        source = row.get('category_source') or CategorySource.UNKNOWN
+        if source not in CategorySource.values:
+            raise ValueError(f"Origen de la categoría desconocido: {source!r}")
+        task = Task(
+            user_id=user_id, description=description, eisenhower_category=parsed, category_source=source,
+            **_tokens(row),
+        )
+        return ImportedRow(task, {'created_at': _moment(row.get('created_at'))})
+
+    plan_text = str(row.get('plan_text') or '')
+    if not plan_text.strip():
+        raise ValueError("Falta el texto del plan.")
+    created_at = _moment(row.get('created_at'))
+    day = parse_date(str(row['day'])) if row.get('day') else timezone.localdate(created_at)
+    if day is None:
+        raise ValueError(f"Día no válido: {row['day']!r}")
+    revisions = []
+    for revision in row.get('revisions') or []:
+        try:
+            revisions.append((
+                DailyPlanRevision(
+                    version=int(revision['version']), diff=revision['diff'],
+                    incremental=bool(revision.get('incremental')), **_tokens(revision),
+                ),
+                _moment(revision.get('created_at')),
+            ))
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("Versión del plan no válida.")
+    plan = DailyPlan(
+        user_id=user_id, plan_text=plan_text, day=day, version=int(row.get('version') or 1),
+        content_hash=content_hash(plan_text), analysis=str(row.get('analysis') or ''), **_tokens(row),
+    )
+    dates = {'created_at': created_at, 'updated_at': _moment(row.get('updated_at') or created_at)}
+    return ImportedRow(plan, dates, revisions)
+
+
+def _restore_dates(model, rows):
+    # `auto_now_add`/`auto_now` pusieron la fecha actual al insertar
+    for row in rows:
+        for name, value in row.dates.items():
+            setattr(row.obj, name, value)
+    model.objects.bulk_update([row.obj for row in rows], list(rows[0].dates))
+
+
+def _save_version(row):
+    # Versión nueva del plan que ya existe, con la fecha en que se guardó el texto importado
+    plan = row.obj
+    previous = DailyPlan.objects.filter(user_id=plan.user_id, day=plan.day).order_by('-id').values_list(
+        'version', flat=True,
+    ).first()
+    saved = save_version(
+        plan.user, plan.plan_text, analysis=plan.analysis, day=plan.day,
+        prompt_tokens=plan.prompt_tokens, response_tokens=plan.response_tokens,
+    )
+    if saved.version != previous:
+        saved.revisions.filter(version=saved.version).update(created_at=row.dates['updated_at'])
+        DailyPlan.objects.filter(pk=saved.pk).update(updated_at=row.dates['updated_at'])
+
+
+def save_rows(kind, rows):
+    """
+    Guarda un lote de ImportedRow del mismo tipo con `bulk_create` y restaura
+    sus fechas. Los planes de un día que ya tiene plan se guardan como versiones.
+    """
+    if not rows:
+        return
+    versions = []
+    if kind == 'daily-plans':
+        days = {(row.obj.user_id, row.obj.day) for row in rows}
+        existing = set(
+            DailyPlan.objects.filter(
+                user_id__in={user_id for user_id, _ in days}, day__in={day for _, day in days},
+            ).values_list('user_id', 'day')
+        )
+        first = []
+        for row in rows:
+            key = (row.obj.user_id, row.obj.day)
+            (versions if key in existing else first).append(row)
+            existing.add(key)
+        rows = first
+
+    model = Task if kind == 'tasks' else DailyPlan
+    if rows:
+        model.objects.bulk_create([row.obj for row in rows])
+        _restore_dates(model, rows)
+    revisions = [
+        ImportedRow(revision, {'created_at': created_at})
+        for row in rows for revision, created_at in row.revisions
+    ]
+    for row in rows:
+        for revision, _ in row.revisions:
+            revision.plan = row.obj
+    if revisions:
+        DailyPlanRevision.objects.bulk_create([revision.obj for revision in revisions])
+        _restore_dates(DailyPlanRevision, revisions)
+    # En el orden del fichero, después de crear el primer plan de cada día
+    for row in versions:
+        _save_version(row)
@@ -0,0 +1,86 @@
+"""
+Cola de trabajos para los análisis del modelo, respaldada por la base de datos.
+
+Las vistas encolan un `AnalysisJob` y responden al instante con su id; el
+comando `run_analysis_jobs` reserva los trabajos pendientes y los ejecuta.
+No hace falta ningún broker externo: la reserva es un UPDATE condicional
+sobre el estado, así que varios workers pueden compartir la misma cola
+incluso con SQLite.
+"""
+from datetime import timedelta
+
+from django.db.models import F
+from django.utils import timezone
+from pydantic import ValidationError
+
+from .analysis import ANALYSES, DayPlanResult, run_analysis, token_usage
+from .models import AnalysisJob
+from .ratelimit import charge_tokens_to
+
+
+async def enqueue_job(user, kind, payload):
+    """Crea un trabajo pendiente para el análisis `kind`."""
+    if kind not in ANALYSES:
+        raise ValueError(f"Tipo de análisis desconocido: {kind}")
+    return await AnalysisJob.objects.acreate(user=user, kind=kind, payload=payload)
+
+
+async def claim_next_job():
+    """Reserva el trabajo pendiente más antiguo, o devuelve None si no hay ninguno."""
+    while True:
+        job_id = await (
+            AnalysisJob.objects.filter(status=AnalysisJob.PENDING)
+            .order_by('created_at')
+            .values_list('pk', flat=True)
+            .afirst()
+        )
+        if job_id is None:
+            return None
+        claimed = await AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.PENDING).aupdate(
+            status=AnalysisJob.RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return await AnalysisJob.objects.select_related('user').aget(pk=job_id)
+        # Otro worker lo reservó antes; probamos con el siguiente
+
+
+async def process_job(job, max_attempts=3):
+    """
+    Ejecuta el trabajo y guarda el resultado (los tokens consumidos se cargan
+    al presupuesto diario del usuario). Si falla, vuelve a la cola
+    hasta agotar `max_attempts` intentos y después queda como fallido. Una
+    respuesta que no cumple el esquema no se reintenta: el análisis ya la
+    reparó una vez y guardó la tarea sin categoría.
+    """
+    try:
+        with charge_tokens_to(job.user):
+            response = await run_analysis(job.kind, job.user, job.payload)
+    except Exception as e:
+        job.error = str(e)
+        if job.attempts < max_attempts and not isinstance(e, ValidationError):
+            job.status = AnalysisJob.PENDING
+        else:
+            job.status = AnalysisJob.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = AnalysisJob.DONE
+        job.result = response.text
+        job.error = ''
+        job.finished_at = timezone.now()
+        # El plan del día suma los tokens de todas sus llamadas
+        usage = response.usage if isinstance(response, DayPlanResult) else token_usage(response)
+        job.prompt_tokens, job.response_tokens = usage['prompt_tokens'], usage['response_tokens']
+    await job.asave(update_fields=[
+        'status', 'result', 'error', 'finished_at', 'prompt_tokens', 'response_tokens',
+    ])
+    return job
+
+
+async def requeue_stale_jobs(stale_after):
+    """Devuelve a la cola los trabajos en ejecución abandonados por un worker caído."""
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return await AnalysisJob.objects.filter(
+        status=AnalysisJob.RUNNING, started_at__lt=cutoff
+    ).aupdate(status=AnalysisJob.PENDING)
@@ -0,0 +1,621 @@
+"""
+Pasarela compartida para las llamadas al modelo de lenguaje (Gemini).
+
+Las vistas de análisis no hablan directamente con `google.generativeai`:
+piden la pasarela con `get_gateway()` y esperan `await gateway.generate(prompt)`.
+La pasarela usa la API asíncrona de generación, limita cuántas llamadas hay en
+vuelo en todo el proceso (`LLM_MAX_CONCURRENCY`, también bajo WSGI, donde
+cada petición tiene su propio bucle de eventos) y corta cualquier llamada que supere el tiempo máximo,
+de modo que un solo proceso ASGI puede mantener cientos de análisis abiertos
+sin bloquear hilos.
+
+El SDK de Google (y con él gRPC y protobuf) solo se importa al crear un
+GeminiBackend, es decir, en la primera llamada real al modelo. Cargar las
+URLs, migrar o ejecutar comandos de gestión no lo importa, y con
+`LLM_BACKEND='stub'` no hace falta ni la clave de API.
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .metrics import observe_llm_call
+
+
+class LLMError(Exception):
+    """Error genérico de la pasarela del modelo."""
+
+
+class LLMTimeoutError(LLMError):
+    """La llamada al modelo superó el tiempo máximo permitido."""
+
+
+class LLMUnavailableError(LLMError):
+    """Ningún modelo está disponible: fallaron los reintentos o el circuito está abierto."""
+
+
+class FakeUpstreamError(Exception):
+    """Error simulado del backend falso, equivalente a un 503 de Gemini."""
+    code = 503
+
+
+# Códigos HTTP de errores transitorios (las excepciones de google.api_core
+# exponen el código en `.code`)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error):
+    """Indica si merece la pena reintentar la llamada que lanzó `error`."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS_CODES
+
+
+@dataclass
+class LLMResult:
+    """Respuesta del modelo junto con los datos de uso que reporta."""
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    response_tokens: int = 0
+    cached: bool = False
+
+
+# Función asíncrona que recibe los tokens de cada llamada real al modelo (no
+# las respuestas cacheadas). core/ratelimit.py la fija durante cada petición
+# para cargarlos al presupuesto diario del usuario.
+usage_callback = contextvars.ContextVar('llm_usage_callback', default=None)
+
+
+async def report_usage(tokens):
+    """Comunica los tokens consumidos a `usage_callback`, si hay alguno."""
+    callback = usage_callback.get()
+    if callback is not None and tokens:
+        await callback(tokens)
+
+
+def estimate_tokens(text):
+    """Estimación rápida de tokens (unos 4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+def configure_genai(api_key=None):
+    """Importa y configura el SDK de Gemini (clave, endpoint y transporte) y lo devuelve."""
+    # Importación diferida: el SDK tarda en cargar y solo se necesita aquí
+    import google.generativeai as genai
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    # Asegúrate de que la clave de API está configurada
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY no está configurada en el archivo .env")
+    options = {}
+    if settings.GEMINI_API_ENDPOINT:
+        options['client_options'] = {'api_endpoint': settings.GEMINI_API_ENDPOINT}
+    if settings.GEMINI_TRANSPORT:
+        options['transport'] = settings.GEMINI_TRANSPORT
+    genai.configure(api_key=api_key, **options)
+    return genai
+
+
+class GeminiBackend:
+    """Backend real: llama a Gemini con la API asíncrona de `google.generativeai`."""
+
+    def __init__(self, model_name, api_key=None):
+        genai = configure_genai(api_key)
+        self.genai = genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        # El cliente gRPC asíncrono queda atado al primer bucle de eventos que
+        # lo usa (el del servidor ASGI). Si llega una llamada desde otro bucle,
+        # como ocurre con las vistas asíncronas servidas por WSGI, se usa la
+        # API síncrona en un hilo para no romper el canal.
+        self._loop = None
+        # El SDK no tiene API asíncrona con el transporte REST: siempre en un hilo
+        self._sync_only = settings.GEMINI_TRANSPORT == 'rest'
+
+    def _owns_loop(self):
+        if self._sync_only:
+            return False
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        return loop is self._loop
+
+    async def generate(self, prompt, response_schema=None):
+        generation_config = None
+        if response_schema is not None:
+            # Salida estructurada: Gemini devuelve JSON que cumple el esquema
+            generation_config = self.genai.GenerationConfig(
+                response_mime_type='application/json',
+                response_schema=response_schema,
+            )
+        if self._owns_loop():
+            response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+        else:
+            response = await asyncio.to_thread(
+                self.model.generate_content, prompt, generation_config=generation_config
+            )
+        usage = getattr(response, 'usage_metadata', None)
+        return LLMResult(
+            text=response.text,
+            model=self.model_name,
+            prompt_tokens=getattr(usage, 'prompt_token_count', 0) or 0,
+            response_tokens=getattr(usage, 'candidates_token_count', 0) or 0,
+        )
+
+    async def stream(self, prompt):
+        """Devuelve el texto de la respuesta a trozos, según los genera Gemini."""
+        if not self._owns_loop():
+            result = await self.generate(prompt)
+            yield result.text
+            return
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            # El último fragmento puede traer solo metadatos, sin texto
+            if chunk.parts:
+                yield chunk.text
+
+
+class FakeBackend:
+    """
+    Backend simulado para medir rendimiento sin conexión.
+    Espera `latency` segundos (más un `jitter` aleatorio) y devuelve una
+    respuesta con el mismo formato que pedimos a Gemini.
+    """
+    CATEGORIES = [
+        "Urgente e Importante",
+        "Urgente y No Importante",
+        "No Urgente e Importante",
+        "No Urgente y No Importante",
+    ]
+
+    def __init__(self, model_name='fake-gemini', latency=0.5, jitter=0.0, error_rate=0.0):
+        self.model_name = model_name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def _category(self, text):
+        digest = int(hashlib.sha256(text.encode('utf-8')).hexdigest(), 16)
+        return self.CATEGORIES[digest % len(self.CATEGORIES)]
+
+    def _delay(self):
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def _maybe_fail(self):
+        if self.error_rate and random.random() < self.error_rate:
+            raise FakeUpstreamError("Error simulado del backend falso.")
+
+    def _text(self, prompt, response_schema=None):
+        # Los prompts por lotes enumeran las tareas como "[n] tarea"
+        items = re.findall(r'^\[(\d+)\] (.*)$', prompt, re.MULTILINE)
+        if response_schema is not None and 'schedule' in response_schema['properties']:
+            # Plan del día (DAY_PLAN_RESPONSE_SCHEMA)
+            return json.dumps({
+                'tasks': [{'index': int(number), 'category': self._category(task)} for number, task in items],
+                'first_task': 1,
+                'first_task_justification': 'Respuesta generada por el backend simulado.',
+                'analysis': 'Respuesta simulada',
+                'justification': 'Respuesta generada por el backend simulado.',
+                'schedule': [task for _, task in items],
+            }, ensure_ascii=False)
+        if response_schema is not None:
+            return json.dumps({
+                'task': 'Respuesta simulada',
+                'category': self._category(prompt),
+                'justification': 'Respuesta generada por el backend simulado.',
+            }, ensure_ascii=False)
+        if items:
+            text = '\n'.join(f"[{number}] {self._category(task)}" for number, task in items)
+        else:
+            text = (
+                "- Tarea: Respuesta simulada\n"
+                f"- Categoría: {self._category(prompt)}\n"
+                "- Justificación: Respuesta generada por el backend simulado."
+            )
+        return text
+
+    async def generate(self, prompt, response_schema=None):
+        await asyncio.sleep(self._delay())
+        self._maybe_fail()
+        text = self._text(prompt, response_schema)
+        return LLMResult(
+            text=text,
+            model=self.model_name,
+            prompt_tokens=len(prompt.split()),
+            response_tokens=len(text.split()),
+        )
+
+    async def stream(self, prompt):
+        """Emite la respuesta palabra a palabra: el primer trozo llega al 10% de la latencia."""
+        delay = self._delay()
+        words = self._text(prompt).split(' ')
+        await asyncio.sleep(delay * 0.1)
+        self._maybe_fail()
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(delay * 0.9 / len(words))
+            yield word if i == len(words) - 1 else word + ' '
+
+
+class CircuitBreaker:
+    """
+    Circuito por modelo: tras `failure_threshold` fallos seguidos se abre y
+    rechaza las llamadas al instante. Pasados `reset_timeout` segundos deja
+    pasar una sola llamada de prueba; si sale bien, se cierra de nuevo.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # Semiabierto: rearmamos el temporizador para permitir una sola prueba
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Ventana de las últimas latencias de un modelo, para calcular percentiles."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def quantile(self, q):
+        """Percentil `q` (0 a 1), o None si aún no hay muestras suficientes."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientBackend:
+    """
+    Envuelve el backend principal y sus alternativos (en orden de preferencia)
+    para acotar la latencia cuando Gemini se degrada:
+    - Reintenta los errores transitorios con espera exponencial y jitter.
+    - Un circuito por modelo falla al instante mientras ese modelo está caído.
+    - Con `hedge`, si una llamada tarda más que el p95 reciente del modelo se
+      lanza una segunda idéntica y se usa la primera que responda.
+    - Si el modelo principal no responde, se pasa al siguiente alternativo.
+    Los errores no transitorios (por ejemplo, una petición inválida) se
+    propagan sin reintentos.
+    """
+
+    def __init__(self, backends, max_retries=2, retry_base_delay=0.2, attempt_timeout=None,
+                 breaker_threshold=5, breaker_reset=30.0,
+                 hedge=False, hedge_quantile=0.95, hedge_min_delay=1.0):
+        self.backends = backends
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers = {
+            backend.model_name: CircuitBreaker(breaker_threshold, breaker_reset) for backend in backends
+        }
+        self.latencies = {backend.model_name: LatencyTracker() for backend in backends}
+
+    @property
+    def model_name(self):
+        return self.backends[0].model_name
+
+    def _backoff(self, attempt):
+        return self.retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    async def _with_timeout(self, coroutine):
+        if self.attempt_timeout is None:
+            return await coroutine
+        return await asyncio.wait_for(coroutine, self.attempt_timeout)
+
+    async def _hedged(self, backend, call):
+        delay = self.latencies[backend.model_name].quantile(self.hedge_quantile)
+        delay = max(delay or 0, self.hedge_min_delay)
+        tasks = [asyncio.ensure_future(self._with_timeout(call()))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                # La llamada va lenta: lanzamos una copia y gana la primera
+                tasks.append(asyncio.ensure_future(self._with_timeout(call())))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            raise tasks[-1].exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _attempt(self, backend, prompt, response_schema):
+        start = time.monotonic()
+
+        def call():
+            return backend.generate(prompt, response_schema=response_schema)
+
+        if self.hedge:
+            result = await self._hedged(backend, call)
+        else:
+            result = await self._with_timeout(call())
+        self.latencies[backend.model_name].record(time.monotonic() - start)
+        return result
+
+    async def _generate_with_retries(self, backend, prompt, response_schema):
+        breaker = self.breakers[backend.model_name]
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = await self._attempt(backend, prompt, response_schema)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                breaker.record_failure()
+                if attempt == self.max_retries or not breaker.allow():
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+    async def generate(self, prompt, response_schema=None):
+        last_error = None
+        for backend in self.backends:
+            if not self.breakers[backend.model_name].allow():
+                continue
+            try:
+                return await self._generate_with_retries(backend, prompt, response_schema)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                last_error = e
+        raise LLMUnavailableError("El modelo no está disponible en este momento.") from last_error
+
+    async def stream(self, prompt):
+        """
+        Igual que `generate`, pero solo se reintenta (o se cambia de modelo)
+        si el fallo ocurre antes del primer trozo: lo ya enviado no se repite.
+        """
+        last_error = None
+        for backend in self.backends:
+            breaker = self.breakers[backend.model_name]
+            if not breaker.allow():
+                continue
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    async for chunk in backend.stream(prompt):
+                        started = True
+                        yield chunk
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    breaker.record_failure()
+                    if started:
+                        raise
+                    last_error = e
+                    if attempt == self.max_retries or not breaker.allow():
+                        break
+                    await asyncio.sleep(self._backoff(attempt))
+                else:
+                    breaker.record_success()
+                    return
+        raise LLMUnavailableError("El modelo no está disponible en este momento.") from last_error
+
+
+class LLMGateway:
+    """
+    Punto único de acceso al modelo.
+    `max_concurrency` limita las llamadas simultáneas de todo el proceso y
+    `timeout` corta cada llamada individual (en segundos).
+    """
+    # Segundos entre intentos de ocupar un hueco del proceso cuando están todos en uso
+    SLOT_POLL_INTERVAL = 0.01
+
+    def __init__(self, backend, max_concurrency=100, timeout=30.0):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # Los semáforos de asyncio pertenecen a un bucle de eventos concreto
+        self._semaphores = weakref.WeakKeyDictionary()
+        # Bajo WSGI cada `async_to_sync` crea su propio bucle: este semáforo
+        # limita las llamadas de todos los bucles (hilos) del proceso
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def _slot(self):
+        """
+        Hueco para una llamada al modelo. En un bucle las llamadas esperan su
+        turno en orden (semáforo de asyncio); entre bucles, el semáforo del
+        proceso se consulta sin bloquear el hilo, así que cancelar la espera
+        no deja huecos ocupados.
+        """
+        async with self._semaphore():
+            while not self._slots.acquire(blocking=False):
+                await asyncio.sleep(self.SLOT_POLL_INTERVAL)
+            try:
+                yield
+            finally:
+                self._slots.release()
+
+    async def generate(self, prompt, timeout=None, response_schema=None):
+        """
+        Genera la respuesta para `prompt` respetando concurrencia y tiempo máximo.
+        Con `response_schema` se pide al modelo una respuesta JSON que lo cumpla.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self._slot():
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    self.backend.generate(prompt, response_schema=response_schema), timeout
+                )
+            except asyncio.TimeoutError:
+                error = LLMTimeoutError(f"El modelo no respondió en {timeout} segundos.")
+                observe_llm_call(self.model_name, 'generate', time.perf_counter() - start, error=error)
+                raise error from None
+            except Exception as e:
+                observe_llm_call(self.model_name, 'generate', time.perf_counter() - start, error=e)
+                raise
+        observe_llm_call(
+            result.model, 'generate', time.perf_counter() - start,
+            prompt_tokens=result.prompt_tokens, response_tokens=result.response_tokens,
+        )
+        await report_usage(result.prompt_tokens + result.response_tokens)
+        return result
+
+    async def stream(self, prompt, timeout=None):
+        """
+        Genera la respuesta a trozos. El tiempo máximo se aplica a la
+        respuesta completa, no a cada trozo.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        streamed = []
+        async with self._slot():
+            start = time.perf_counter()
+            chunks = self.backend.stream(prompt)
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        raise LLMTimeoutError(
+                            f"El modelo no respondió en {timeout} segundos."
+                        ) from None
+                    streamed.append(chunk)
+                    yield chunk
+            except Exception as e:
+                observe_llm_call(self.model_name, 'stream', time.perf_counter() - start, error=e)
+                raise
+            finally:
+                await chunks.aclose()
+        # El stream no trae el recuento de tokens: lo estimamos
+        prompt_tokens, response_tokens = estimate_tokens(prompt), estimate_tokens(''.join(streamed))
+        observe_llm_call(
+            self.model_name, 'stream', time.perf_counter() - start,
+            prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+        )
+        await report_usage(prompt_tokens + response_tokens)
+
+    def generate_sync(self, prompt, timeout=None, response_schema=None):
+        """Versión síncrona para comandos de gestión y código no asíncrono."""
+        return async_to_sync(self.generate)(prompt, timeout=timeout, response_schema=response_schema)
+
+
+def build_backend(name=None):
+    """
+    Construye el backend indicado (o el de `settings.LLM_BACKEND`), envuelto
+    en un ResilientBackend con los modelos alternativos de
+    `settings.LLM_FALLBACK_MODELS`.
+    `name` es 'gemini', 'fake', 'stub' (respuestas deterministas al instante,
+    sin red) o la ruta de una clase con la interfaz de FakeBackend que recibe
+    el nombre del modelo.
+    """
+    name = name or settings.LLM_BACKEND
+    model_names = [settings.LLM_MODEL_NAME, *settings.LLM_FALLBACK_MODELS]
+    if name == 'gemini':
+        backends = [GeminiBackend(model_name) for model_name in model_names]
+    elif name == 'fake':
+        backends = [
+            FakeBackend(
+                model_name=f'fake-{model_name}',
+                latency=settings.LLM_FAKE_LATENCY,
+                jitter=settings.LLM_FAKE_JITTER,
+                error_rate=settings.LLM_FAKE_ERROR_RATE,
+            )
+            for model_name in model_names
+        ]
+    elif name == 'stub':
+        backends = [FakeBackend(model_name='stub', latency=0)]
+    else:
+        try:
+            backend_class = import_string(name)
+        except ImportError as e:
+            raise ValueError(f"Backend de LLM desconocido: {name}") from e
+        backends = [backend_class(model_name) for model_name in model_names]
+    return ResilientBackend(
+        backends,
+        max_retries=settings.LLM_MAX_RETRIES,
+        retry_base_delay=settings.LLM_RETRY_BASE_DELAY,
+        attempt_timeout=settings.LLM_ATTEMPT_TIMEOUT,
+        breaker_threshold=settings.LLM_BREAKER_THRESHOLD,
+        breaker_reset=settings.LLM_BREAKER_RESET,
+        hedge=settings.LLM_HEDGE_ENABLED,
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+    )
+
+
+_gateway = None
+_gateway_pid = None
+
+
+def get_gateway():
+    """
+    Devuelve la pasarela del proceso, creándola en la primera llamada.
+    Si el proceso se bifurcó después de crearla (servidores con precarga),
+    cada hijo crea la suya: los canales gRPC no sobreviven a un fork.
+    """
+    global _gateway, _gateway_pid
+    if _gateway is None or _gateway_pid != os.getpid():
+        _gateway_pid = os.getpid()
+        _gateway = LLMGateway(
+            build_backend(),
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            timeout=settings.LLM_TIMEOUT,
+        )
+    return _gateway
@@ -0,0 +1,41 @@
+import shlex
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.templatetags.assets import TAILWIND_CSS
+
+
+class Command(BaseCommand):
+    """
+    Compila Tailwind CSS con la CLI de Tailwind (`settings.TAILWIND_CLI`):
+    solo las clases usadas en las plantillas y en el JavaScript, minificado,
+    en core/static/css/tailwind.css. Después, `collectstatic` le añade el
+    hash del contenido y sus versiones comprimidas.
+    """
+    help = "Compila y minifica el CSS de Tailwind usado por las plantillas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help="Recompila al cambiar las plantillas (desarrollo).")
+
+    def handle(self, *args, **options):
+        cli = shlex.split(settings.TAILWIND_CLI)
+        if not cli or shutil.which(cli[0]) is None:
+            raise CommandError(
+                f"No se encuentra la CLI de Tailwind ({settings.TAILWIND_CLI!r}). Instala el ejecutable "
+                "independiente de Tailwind CSS v3 o usa TAILWIND_CLI='npx tailwindcss@3'."
+            )
+        output = settings.BASE_DIR / 'core' / 'static' / TAILWIND_CSS
+        command = cli + [
+            '--config', str(settings.BASE_DIR / 'tailwind.config.js'),
+            '--input', str(settings.BASE_DIR / 'core' / 'assets' / 'tailwind.css'),
+            '--output', str(output),
+            '--watch' if options['watch'] else '--minify',
+        ]
+        try:
+            subprocess.run(command, cwd=settings.BASE_DIR, check=True)
+        except subprocess.CalledProcessError as e:
+            raise CommandError(f"La CLI de Tailwind terminó con el código {e.returncode}.")
+        self.stdout.write(self.style.SUCCESS(f"CSS generado en {output} ({output.stat().st_size} bytes)."))
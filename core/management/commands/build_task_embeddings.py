@@ -0,0 +1,95 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.embeddings import INDEXED_SOURCES, EmbeddingIndex, get_embedder, priority_signals
+from core.models import EisenhowerCategory, Task, TaskEmbedding
+
+
+class Command(BaseCommand):
+    """
+    Calcula los embeddings que faltan de las tareas clasificadas por el
+    modelo o el usuario (las anteriores a la reutilización de tareas casi
+    iguales, o todas tras cambiar `EMBEDDING_BACKEND`) y los guarda por lotes. Con `--evaluate` mide, por
+    usuario, cuántas tareas recientes se habrían resuelto con una tarea
+    anterior, cuántas coinciden con la categoría guardada y el tiempo de búsqueda.
+    """
+    help = "Calcula y guarda los embeddings de las tareas para reutilizar la categoría de tareas casi iguales."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Solo este usuario (nombre de usuario).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--evaluate', action='store_true', help="Evalúa la reutilización tras calcularlos.")
+        parser.add_argument('--holdout', type=float, default=0.2, help="Fracción de tareas recientes para evaluar.")
+        parser.add_argument('--threshold', type=float, default=settings.SIMILAR_TASKS_THRESHOLD)
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No existe el usuario {options['user']}.")
+        embedder = get_embedder()
+
+        tasks = (
+            Task.objects.filter(user__in=users, category_source__in=INDEXED_SOURCES)
+            .exclude(eisenhower_category=EisenhowerCategory.UNSPECIFIED)
+            .exclude(taskembedding__model=embedder.name)
+            .only('id', 'user_id', 'description')
+            .order_by('id')
+        )
+        created = 0
+        batch = []
+        for task in tasks.iterator(chunk_size=options['batch_size']):
+            batch.append(task)
+            if len(batch) >= options['batch_size']:
+                created += self._save(embedder, batch)
+                batch = []
+        if batch:
+            created += self._save(embedder, batch)
+        self.stdout.write(self.style.SUCCESS(f"Embeddings calculados con {embedder.name}: {created}"))
+
+        if options['evaluate']:
+            for user in users.iterator():
+                self._evaluate(embedder, user, options['holdout'], options['threshold'])
+
+    def _save(self, embedder, tasks):
+        vectors = async_to_sync(embedder.aembed)([task.description for task in tasks])
+        # Un embedding de otro backend se reemplaza
+        TaskEmbedding.objects.filter(task__in=tasks).delete()
+        TaskEmbedding.objects.bulk_create([
+            TaskEmbedding(task=task, user_id=task.user_id, model=embedder.name, vector=vector.tobytes())
+            for task, vector in zip(tasks, vectors)
+        ])
+        return len(tasks)
+
+    def _evaluate(self, embedder, user, holdout, threshold):
+        rows = list(
+            TaskEmbedding.objects.filter(user=user, model=embedder.name, task__category_source__in=INDEXED_SOURCES)
+            .order_by('task_id')
+            .values_list('task_id', 'task__eisenhower_category', 'vector')
+        )
+        split = int(len(rows) * (1 - holdout))
+        if not split or split == len(rows):
+            return
+        index = EmbeddingIndex.from_rows(embedder.dimensions, rows[:split])
+        test = EmbeddingIndex.from_rows(embedder.dimensions, rows[split:])
+        descriptions = dict(Task.objects.filter(user=user).values_list('id', 'description'))
+        covered = agreed = 0
+        start = time.perf_counter()
+        for i in range(test.size):
+            match = index.search(test.vectors[i])
+            if match.similarity >= threshold and (
+                priority_signals(descriptions[int(test.task_ids[i])]) == priority_signals(descriptions[match.task_id])
+            ):
+                covered += 1
+                agreed += match.category == test.categories[i]
+        elapsed = (time.perf_counter() - start) / test.size
+        self.stdout.write(
+            f"{user.username}: índice de {index.size} tareas, evaluadas {test.size}, "
+            f"resueltas sin el modelo {covered} ({covered / test.size:.0%}), "
+            f"coincidencia {agreed}/{covered}, búsqueda media {elapsed * 1000:.3f} ms"
+        )
@@ -0,0 +1,36 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import EXPORTS, FORMATS, export
+
+
+class Command(BaseCommand):
+    """
+    Exporta el historial de tareas o de planes diarios, de todos los usuarios o
+    solo de `--user`, en NDJSON o CSV. Las filas se leen y escriben por bloques,
+    así que la memoria no depende del tamaño del historial.
+    """
+    help = "Exporta el historial de tareas o planes diarios en NDJSON o CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--user', help="Solo este usuario (nombre de usuario).")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--output', help="Fichero de salida (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"No existe el usuario {options['user']}.")
+        chunks = export(options['kind'], options['format'], user, options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(chunks)
+            self.stderr.write(f"Historial exportado a {options['output']}.")
+        else:
+            sys.stdout.writelines(chunks)
@@ -0,0 +1,70 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.analytics import rebuild as rebuild_task_stats
+from core.exports import EXPORTS, FORMATS, build_object, read_rows, save_rows
+
+
+class Command(BaseCommand):
+    """
+    Importa un historial exportado con `export_history` (NDJSON o CSV).
+    Las filas se leen de una en una y se guardan con `bulk_create` por lotes
+    de `--batch-size`, todas en una sola transacción: si una fila no es
+    válida no se importa nada. Cada fila se asigna al usuario de su columna
+    `user`, o a `--user` si se indica. Se conservan las fechas originales y,
+    en los planes, sus versiones anteriores.
+    """
+    help = "Importa el historial de tareas o planes diarios desde NDJSON o CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORTS))
+        parser.add_argument('path', help="Fichero a importar.")
+        parser.add_argument('--format', choices=list(FORMATS), help="Por defecto, según la extensión del fichero.")
+        parser.add_argument('--user', help="Asigna todas las filas a este usuario.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('csv' if options['path'].endswith('.csv') else 'ndjson')
+        target = None
+        if options['user']:
+            target = User.objects.filter(username=options['user']).first()
+            if target is None:
+                raise CommandError(f"No existe el usuario {options['user']}.")
+
+        user_ids = {}
+        imported = 0
+        batch = []
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as f, transaction.atomic():
+                for number, row in read_rows(fmt, f):
+                    try:
+                        user_id = target.pk if target else self._user_id(user_ids, row.get('user'))
+                        batch.append(build_object(options['kind'], row, user_id))
+                    except ValueError as e:
+                        raise CommandError(f"Línea {number}: {e}")
+                    if len(batch) >= options['batch_size']:
+                        save_rows(options['kind'], batch)
+                        imported += len(batch)
+                        batch = []
+                save_rows(options['kind'], batch)
+                imported += len(batch)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        if options['kind'] == 'tasks':
+            users = [target] if target else User.objects.filter(pk__in=user_ids.values())
+            rebuild_task_stats(users)
+        self.stdout.write(self.style.SUCCESS(f"Filas importadas: {imported}"))
+        if options['kind'] == 'tasks':
+            self.stdout.write("Para reutilizar su categoría en tareas casi iguales: python manage.py build_task_embeddings")
+
+    def _user_id(self, user_ids, username):
+        if not username:
+            raise ValueError("Falta la columna user (o indica --user).")
+        if username not in user_ids:
+            user = User.objects.filter(username=username).values_list('pk', flat=True).first()
+            if user is None:
+                raise ValueError(f"No existe el usuario {username}.")
+            user_ids[username] = user
+        return user_ids[username]
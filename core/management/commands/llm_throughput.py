@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.llm import FakeBackend, LLMGateway
+
+
+class Command(BaseCommand):
+    """
+    Mide el rendimiento de la pasarela del modelo sin conexión.
+    Lanza `--requests` análisis contra el backend simulado, con hasta
+    `--concurrency` llamadas en vuelo, y reporta el rendimiento obtenido.
+    """
+    help = "Mide el rendimiento de la pasarela LLM usando el backend simulado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--latency', type=float, default=0.5)
+        parser.add_argument('--jitter', type=float, default=0.0)
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        gateway = LLMGateway(
+            FakeBackend(latency=options['latency'], jitter=options['jitter']),
+            max_concurrency=options['concurrency'],
+            timeout=options['timeout'],
+        )
+        elapsed, errors = asyncio.run(self._run(gateway, options['requests']))
+        total = options['requests']
+        self.stdout.write(
+            f"{total} llamadas en {elapsed:.2f} s "
+            f"({total / elapsed:.1f} llamadas/s, {errors} errores, "
+            f"concurrencia {options['concurrency']}, latencia {options['latency']} s)"
+        )
+
+    async def _run(self, gateway, total):
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(gateway.generate(f"Tarea de prueba {i}") for i in range(total)),
+            return_exceptions=True,
+        )
+        elapsed = time.perf_counter() - start
+        errors = sum(1 for result in results if isinstance(result, Exception))
+        return elapsed, errors
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmark import MockGeminiServer
+
+
+class Command(BaseCommand):
+    """
+    Servidor local que imita la API REST de Gemini, para pruebas de carga.
+    Para apuntar la aplicación a él:
+    GEMINI_API_ENDPOINT=http://127.0.0.1:<puerto> GEMINI_TRANSPORT=rest
+    """
+    help = "Arranca un servidor que imita generateContent de Gemini con latencia y errores configurables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.5, help="Mediana de la latencia (segundos).")
+        parser.add_argument('--sigma', type=float, default=0.0, help="Dispersión de la latencia log-normal.")
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--error-status', type=int, default=503)
+        parser.add_argument('--seed', type=int)
+
+    def handle(self, *args, **options):
+        server = MockGeminiServer(
+            host=options['host'], port=options['port'],
+            latency=options['latency'], sigma=options['sigma'],
+            error_rate=options['error_rate'], error_status=options['error_status'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Gemini simulado en {server.url} (Ctrl+C para terminar).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.analytics import rebuild
+
+
+class Command(BaseCommand):
+    """
+    Recalcula desde cero las estadísticas diarias de la Matriz de Eisenhower
+    (`TaskDailyStats`) a partir de las tareas guardadas, de todos los usuarios
+    o solo de `--user`.
+    """
+    help = "Recalcula las estadísticas diarias de tareas por usuario y categoría."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Solo este usuario (nombre de usuario).")
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = User.objects.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No existe el usuario {options['user']}.")
+        rows = rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas recalculadas: {rows} filas."))
@@ -0,0 +1,55 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import claim_next_job, process_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    """
+    Worker de la cola de análisis.
+    Ejecuta hasta `--concurrency` trabajos a la vez; con `--once` vacía la
+    cola y termina, sin `--once` sigue esperando trabajos nuevos.
+    """
+    help = "Ejecuta los análisis encolados en la tabla AnalysisJob."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--max-attempts', type=int, default=settings.JOB_MAX_ATTEMPTS)
+        parser.add_argument('--stale-after', type=float, default=settings.JOB_STALE_AFTER)
+        parser.add_argument('--once', action='store_true', help="Vacía la cola y termina.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Worker iniciado con concurrencia {options['concurrency']}.")
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        await self._requeue(options)
+        workers = [self._worker(options) for _ in range(options['concurrency'])]
+        if options['once']:
+            await asyncio.gather(*workers)
+            return
+        await asyncio.gather(self._reaper(options), *workers)
+
+    async def _requeue(self, options):
+        requeued = await requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f"{requeued} trabajos abandonados vuelven a la cola.")
+
+    async def _reaper(self, options):
+        while True:
+            await asyncio.sleep(options['stale_after'])
+            await self._requeue(options)
+
+    async def _worker(self, options):
+        while True:
+            job = await claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                await asyncio.sleep(options['poll_interval'])
+                continue
+            await process_job(job, options['max_attempts'])
+            self.stdout.write(f"Trabajo {job}")
@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.benchmark import SCENARIOS, MockGeminiServer, run_scenario, start_server
+
+
+class Command(BaseCommand):
+    """
+    Prueba de carga de extremo a extremo.
+    Arranca el servidor simulado de Gemini y, para cada servidor (`--servers`),
+    levanta el proyecto en un proceso aparte y ejecuta cada escenario con
+    concurrencia fija usando las sesiones de los usuarios creados con
+    `seed_benchmark_data`. El resultado se emite como JSON para comparar
+    ejecuciones.
+    """
+    help = "Mide rendimiento y latencias (p50/p95/p99) de los endpoints bajo WSGI y ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi', help="Lista separada por comas: wsgi, asgi.")
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Lista separada por comas.")
+        parser.add_argument('--requests', type=int, default=200, help="Peticiones por escenario.")
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=5, help="Peticiones de calentamiento por escenario.")
+        parser.add_argument('--mock-latency', type=float, default=0.5)
+        parser.add_argument('--mock-sigma', type=float, default=0.3)
+        parser.add_argument('--mock-error-rate', type=float, default=0.0)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='bench', help="Prefijo de los usuarios de prueba.")
+        parser.add_argument('--env', action='append', default=[], metavar='CLAVE=VALOR',
+                            help="Variable de entorno extra para el servidor (repetible).")
+        parser.add_argument('--output', help="Fichero donde guardar el JSON (por defecto, la salida estándar).")
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = [name for name in scenarios if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Escenarios desconocidos: {', '.join(unknown)}")
+        sessions = self._sessions(options['prefix'])
+        cookie_name = settings.SESSION_COOKIE_NAME
+
+        mock = MockGeminiServer(
+            latency=options['mock_latency'], sigma=options['mock_sigma'],
+            error_rate=options['mock_error_rate'], seed=options['seed'],
+        ).start()
+        env = {
+            **os.environ,
+            'LLM_BACKEND': 'gemini',
+            'GEMINI_API_KEY': 'benchmark',
+            'GEMINI_API_ENDPOINT': mock.url,
+            'GEMINI_TRANSPORT': 'rest',
+            # Medimos el camino completo: sin caché, sin límites, sin clasificador
+            # local y sin reutilizar tareas casi iguales
+            'LLM_CACHE_BACKEND': 'none',
+            'RATE_LIMIT_ENABLED': 'false',
+            'LOCAL_CLASSIFIER_ENABLED': 'false',
+            'SIMILAR_TASKS_ENABLED': 'false',
+        }
+        for item in options['env']:
+            key, _, value = item.partition('=')
+            env[key] = value
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'revision': self._revision(),
+            'config': {
+                key: options[key] for key in (
+                    'requests', 'concurrency', 'warmup', 'mock_latency', 'mock_sigma', 'mock_error_rate', 'seed',
+                )
+            },
+            'results': [],
+        }
+        try:
+            for server in servers:
+                process, base_url = start_server(server, settings.BASE_DIR, env)
+                try:
+                    for scenario in scenarios:
+                        make_request = SCENARIOS[scenario]
+                        if options['warmup']:
+                            run_scenario(base_url, make_request, sessions, options['warmup'], 1, cookie_name)
+                        self.stderr.write(f"{server} / {scenario}...")
+                        result = run_scenario(
+                            base_url, make_request, sessions, options['requests'], options['concurrency'], cookie_name
+                        )
+                        report['results'].append({'server': server, 'scenario': scenario, **result})
+                finally:
+                    process.terminate()
+                    process.wait(timeout=10)
+        finally:
+            mock.stop()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(f"Resultados guardados en {options['output']}.")
+        else:
+            self.stdout.write(output)
+
+    def _sessions(self, prefix):
+        """Crea una sesión iniciada para cada usuario de prueba y devuelve sus claves."""
+        users = list(User.objects.filter(username__startswith=f'{prefix}-'))
+        if not users:
+            raise CommandError(
+                f"No hay usuarios '{prefix}-*'. Créalos antes con: python manage.py seed_benchmark_data"
+            )
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        keys = []
+        for user in users:
+            session = session_store()
+            session[SESSION_KEY] = str(user.pk)
+            # El mismo backend que usa un inicio de sesión real (CachedModelBackend)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            keys.append(session.session_key)
+        return keys
+
+    def _revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,73 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.analytics import rebuild as rebuild_task_stats
+from core.models import DailyPlan, EisenhowerCategory, Task
+from core.plans import save_version
+
+VERBS = ['Preparar', 'Revisar', 'Enviar', 'Pagar', 'Llamar a', 'Estudiar', 'Organizar', 'Terminar']
+OBJECTS = ['el informe', 'la factura', 'el cliente', 'la presentación', 'el examen', 'los correos', 'el proyecto', 'la reunión']
+WHEN = ['hoy', 'mañana', 'esta semana', 'antes del viernes', '', '']
+
+
+class Command(BaseCommand):
+    """
+    Crea usuarios de prueba (`<prefijo>-0`, `<prefijo>-1`, ...) con historiales
+    grandes de tareas y planes diarios. Con la misma `--seed` los datos son
+    siempre los mismos. Los datos anteriores de esos usuarios se borran.
+    Los planes se guardan como la aplicación (`plans.save_version`): uno por
+    día hacia atrás desde hoy, algunos con una segunda versión.
+    """
+    help = "Genera usuarios con historiales grandes para las pruebas de rendimiento."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5)
+        parser.add_argument('--tasks', type=int, default=10000, help="Tareas por usuario.")
+        parser.add_argument('--plans', type=int, default=1000, help="Planes diarios por usuario.")
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--password', default='bench-password')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        categories = list(EisenhowerCategory)
+        for n in range(options['users']):
+            with transaction.atomic():
+                username = f"{options['prefix']}-{n}"
+                User.objects.filter(username=username).delete()
+                user = User.objects.create_user(username, password=options['password'])
+                Task.objects.bulk_create((
+                    Task(
+                        user=user,
+                        description=f"{rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(WHEN)}".strip(),
+                        eisenhower_category=rng.choice(categories),
+                    )
+                    for _ in range(options['tasks'])
+                ), batch_size=1000)
+                self._seed_plans(rng, user, options['plans'])
+                # bulk_create no actualiza las estadísticas diarias
+                rebuild_task_stats([user])
+            self.stdout.write(f"{username}: {options['tasks']} tareas y {options['plans']} planes.")
+
+    def _seed_plans(self, rng, user, count):
+        today = timezone.localdate()
+        for days_ago in range(count):
+            day = today - timedelta(days=days_ago)
+            lines = [
+                f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} ({rng.randint(1, 4)}h)"
+                for _ in range(rng.randint(3, 8))
+            ]
+            plan = save_version(user, '\n'.join(lines) + '\n', day=day)
+            if rng.random() < 0.3:
+                # Segunda versión del día con una línea cambiada
+                lines[rng.randrange(len(lines))] = f"- {rng.choice(VERBS)} {rng.choice(OBJECTS)} (1h)"
+                plan = save_version(user, '\n'.join(lines) + '\n', day=day)
+            # Las fechas de ese día, como si se hubiera enviado entonces
+            moment = timezone.make_aware(datetime.combine(day, time(8)))
+            DailyPlan.objects.filter(pk=plan.pk).update(created_at=moment, updated_at=moment)
+            plan.revisions.update(created_at=moment)
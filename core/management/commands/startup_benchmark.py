@@ -0,0 +1,79 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Código que ejecuta cada proceso nuevo: arranca Django y carga todas las URLs
+# (y con ellas las vistas), como hace un worker antes de atender peticiones.
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'loaded': [name for name in %r if name in sys.modules]}))
+"""
+
+# Módulos pesados que no deberían cargarse al arrancar
+HEAVY_MODULES = ['google.generativeai', 'grpc', 'google.protobuf', 'numpy']
+
+
+class Command(BaseCommand):
+    """
+    Mide el tiempo de arranque en frío de un worker.
+    Lanza `--runs` procesos nuevos que inicializan Django y cargan las URLs, y
+    reporta la mediana y el mínimo, tanto del arranque de Django como del
+    proceso completo (incluido el intérprete), además de los módulos pesados
+    que se hayan importado por el camino.
+    """
+    help = "Mide el tiempo de arranque de Django y la carga de las URLs en procesos nuevos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON.")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'nexus_flow.settings')}
+        script = STARTUP_SCRIPT % (HEAVY_MODULES,)
+        django_times, process_times, loaded = [], [], set()
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', script],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            process_times.append(time.perf_counter() - start)
+            result = json.loads(output.strip().splitlines()[-1])
+            django_times.append(result['seconds'])
+            loaded.update(result['loaded'])
+
+        report = {
+            'runs': options['runs'],
+            'django_setup_median': statistics.median(django_times),
+            'django_setup_min': min(django_times),
+            'process_median': statistics.median(process_times),
+            'process_min': min(process_times),
+            'heavy_modules_loaded': sorted(loaded),
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"Arranque de Django y URLs: mediana {report['django_setup_median'] * 1000:.0f} ms, "
+            f"mínimo {report['django_setup_min'] * 1000:.0f} ms"
+        )
+        self.stdout.write(
+            f"Proceso completo: mediana {report['process_median'] * 1000:.0f} ms, "
+            f"mínimo {report['process_min'] * 1000:.0f} ms"
+        )
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"Módulos pesados cargados al arrancar: {', '.join(sorted(loaded))}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Ningún módulo pesado se carga al arrancar."))
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.classifier import NaiveBayes, is_confident, predict, training_examples
+from core.models import LocalClassifierModel
+
+
+class Command(BaseCommand):
+    """
+    Entrena y evalúa el clasificador local de cada usuario.
+    La evaluación entrena con las tareas más antiguas y mide sobre las más
+    recientes (`--holdout`): cuántas se habrían resuelto sin llamar al modelo
+    y cuántas de esas coinciden con la categoría guardada. Solo cuentan las
+    tareas que clasificó el modelo o el usuario (`training_examples`): las
+    que resolvió el propio clasificador inflarían el acierto.
+    """
+    help = "Entrena el clasificador local de Eisenhower con las tareas de cada usuario y reporta su acierto."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Solo este usuario (nombre de usuario).")
+        parser.add_argument('--holdout', type=float, default=0.2, help="Fracción de tareas recientes para evaluar.")
+        parser.add_argument('--threshold', type=float, default=settings.LOCAL_CLASSIFIER_THRESHOLD)
+        parser.add_argument('--dry-run', action='store_true', help="Evalúa sin guardar los modelos.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"No existe el usuario {options['user']}.")
+
+        totals = {'evaluated': 0, 'covered': 0, 'agreed': 0}
+        for user in users.iterator():
+            examples = training_examples(user)
+            if not examples:
+                continue
+
+            split = int(len(examples) * (1 - options['holdout']))
+            train, test = examples[:split], examples[split:]
+            stats = self._evaluate(NaiveBayes.train(train), test, options['threshold'])
+            for key in totals:
+                totals[key] += stats[key]
+            self.stdout.write(
+                f"{user.username}: {len(examples)} tareas, "
+                f"evaluadas {stats['evaluated']}, "
+                f"resueltas localmente {self._ratio(stats['covered'], stats['evaluated'])}, "
+                f"coincidencia {self._ratio(stats['agreed'], stats['covered'])}"
+            )
+
+            if not options['dry_run']:
+                model = NaiveBayes.train(examples)
+                LocalClassifierModel.objects.update_or_create(
+                    user=user, defaults={'data': model.to_json(), 'samples': len(examples)}
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: evaluadas {totals['evaluated']}, "
+            f"llamadas al modelo evitadas {self._ratio(totals['covered'], totals['evaluated'])}, "
+            f"coincidencia con la categoría guardada {self._ratio(totals['agreed'], totals['covered'])}"
+        ))
+
+    def _evaluate(self, model, test, threshold):
+        stats = {'evaluated': len(test), 'covered': 0, 'agreed': 0}
+        for description, category in test:
+            prediction = predict(description, model)
+            if not is_confident(prediction, threshold):
+                continue
+            stats['covered'] += 1
+            if prediction.category == category:
+                stats['agreed'] += 1
+        return stats
+
+    def _ratio(self, part, whole):
+        return f"{part}/{whole} ({part / whole:.0%})" if whole else "0/0"
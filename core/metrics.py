@@ -0,0 +1,283 @@
+"""
+Métricas de la aplicación en el formato de texto de Prometheus.
+
+Registro mínimo en memoria (contadores e histogramas con etiquetas), sin
+dependencias externas. Cada proceso expone sus propias métricas en
+`/metrics`; con varios workers, Prometheus debe consultar cada uno (o
+agregarlas por instancia).
+
+`MetricsMiddleware` mide cada petición por nombre de URL, cuenta sus
+consultas a la base de datos y añade la cabecera `Server-Timing` con el
+reparto del tiempo entre base de datos, modelo y el resto de la vista.
+"""
+import contextvars
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Límites de los cubos de los histogramas (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador monótono con etiquetas."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}_total{_format_labels(self.labels, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Histograma acumulado con etiquetas (cubos, suma y número de observaciones)."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        names = self.labels + ('le',)
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}'
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """Todas las métricas registradas en el formato de texto de Prometheus."""
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_LATENCY = register(Histogram(
+    'http_request_duration_seconds', "Tiempo de respuesta de cada petición por nombre de URL.",
+    labels=('view', 'method', 'status'),
+))
+REQUEST_DB_QUERIES = register(Histogram(
+    'http_request_db_queries', "Consultas a la base de datos por petición.",
+    labels=('view',), buckets=QUERY_COUNT_BUCKETS,
+))
+REQUEST_DB_TIME = register(Histogram(
+    'http_request_db_duration_seconds', "Tiempo en la base de datos por petición.",
+    labels=('view',),
+))
+LLM_LATENCY = register(Histogram(
+    'llm_request_duration_seconds', "Duración de las llamadas al modelo.",
+    labels=('model', 'operation', 'outcome'),
+))
+LLM_TOKENS = register(Counter(
+    'llm_tokens', "Tokens enviados y recibidos del modelo.",
+    labels=('model', 'direction'),
+))
+LLM_ERRORS = register(Counter(
+    'llm_errors', "Errores de las llamadas al modelo por tipo.",
+    labels=('model', 'error'),
+))
+LLM_ENDPOINT_TOKENS = register(Counter(
+    'llm_endpoint_tokens', "Tokens consumidos por cada endpoint de análisis (sin las respuestas cacheadas).",
+    labels=('endpoint', 'direction'),
+))
+LLM_PROMPT_SIZE = register(Histogram(
+    'llm_prompt_tokens_estimated', "Tokens estimados de cada prompt antes de enviarlo.",
+    labels=('endpoint',), buckets=TOKEN_BUCKETS,
+))
+LLM_CACHE = register(Counter(
+    'llm_cache_requests', "Consultas a la caché de respuestas del modelo.",
+    labels=('result',),
+))
+LLM_COALESCED = register(Counter(
+    'llm_coalesced_requests', "Peticiones que compartieron la llamada al modelo de otra idéntica en vuelo.",
+    labels=('scope',),
+))
+SIMILAR_TASK_LOOKUPS = register(Counter(
+    'similar_task_lookups', "Búsquedas de una tarea anterior casi igual para reutilizar su categoría.",
+    labels=('result',),
+))
+DAILY_PLAN_ANALYSES = register(Counter(
+    'daily_plan_analyses', "Análisis de planes diarios: completos, incrementales o sin cambios (sin llamar al modelo).",
+    labels=('mode',),
+))
+
+
+@dataclass
+class RequestStats:
+    """Tiempos acumulados durante una petición."""
+    queries: int = 0
+    db_time: float = 0.0
+    llm_time: float = 0.0
+
+
+# Estadísticas de la petición en curso. Las vistas asíncronas consultan la
+# base de datos en hilos de `sync_to_async`, que heredan el contexto.
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+# Las conexiones nuevas (una por hilo) reciben el contador al abrirse; las que
+# ya estuvieran abiertas al importar este módulo, ahora
+connection_created.connect(_install_query_counter)
+for _connection in connections.all(initialized_only=True):
+    _install_query_counter(None, _connection)
+
+
+def observe_llm_call(model, operation, seconds, error=None, prompt_tokens=0, response_tokens=0):
+    """Registra una llamada al modelo (la usa la pasarela de core/llm.py)."""
+    LLM_LATENCY.observe(seconds, model=model, operation=operation, outcome='error' if error else 'ok')
+    if error is not None:
+        LLM_ERRORS.inc(model=model, error=type(error).__name__)
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, direction='prompt')
+    if response_tokens:
+        LLM_TOKENS.inc(response_tokens, model=model, direction='response')
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.llm_time += seconds
+
+
+def observe_endpoint_usage(endpoint, result):
+    """Suma al endpoint los tokens de una respuesta del modelo (las cacheadas no cuestan)."""
+    if result.cached:
+        return
+    if result.prompt_tokens:
+        LLM_ENDPOINT_TOKENS.inc(result.prompt_tokens, endpoint=endpoint, direction='prompt')
+    if result.response_tokens:
+        LLM_ENDPOINT_TOKENS.inc(result.response_tokens, endpoint=endpoint, direction='response')
+
+
+class MetricsMiddleware:
+    """
+    Mide la latencia, las consultas y el tiempo de base de datos de cada
+    petición. En las respuestas en streaming la latencia es la del primer byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats, token, start = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats, token, start = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self._finish(request, response, stats, start)
+
+    def _start(self):
+        stats = RequestStats()
+        return stats, _request_stats.set(stats), time.perf_counter()
+
+    # Métodos con etiqueta propia; el resto (los inventa el cliente) cuentan como 'other'
+    METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+    def _finish(self, request, response, stats, start):
+        elapsed = time.perf_counter() - start
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        method = request.method if request.method in self.METHODS else 'other'
+        REQUEST_LATENCY.observe(elapsed, view=view, method=method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(stats.queries, view=view)
+        REQUEST_DB_TIME.observe(stats.db_time, view=view)
+        app_time = max(0.0, elapsed - stats.db_time - stats.llm_time)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} consultas", '
+            f'llm;dur={stats.llm_time * 1000:.1f}, '
+            f'app;dur={app_time * 1000:.1f}, '
+            f'total;dur={elapsed * 1000:.1f}'
+        )
+        return response
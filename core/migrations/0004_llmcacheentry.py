@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_dailyplan_user_task_user_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCacheEntry',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('value', models.JSONField()),
+                ('expires_at', models.DateTimeField()),
+                ('accessed_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_analysisjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyplan',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='dailyplan_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Convierte Task.eisenhower_category de texto libre a un entero pequeño.
+
+import re
+
+from django.db import migrations, models
+
+
+NAMES = {
+    0: 'No especificada',
+    1: 'Urgente e Importante',
+    2: 'Urgente y No Importante',
+    3: 'No Urgente e Importante',
+    4: 'No Urgente y No Importante',
+}
+LABELS = {name.casefold(): number for number, name in NAMES.items()}
+
+
+# Filas que se leen y actualizan en cada bloque
+BATCH_SIZE = 1000
+
+
+def label_to_number(value):
+    """Número de la categoría `value` (su nombre, con o sin "N. " delante, o su número); 0 si no es ninguna."""
+    text = str(value).strip().strip('.*"').strip()
+    if text.isdigit():
+        number = int(text)
+        return number if 1 <= number <= 4 else 0
+    text = re.sub(r'^\d+\.\s*', '', text)
+    return LABELS.get(text.casefold(), 0)
+
+
+def convert(Task, conversion):
+    # Fila a fila por clave primaria y en una sola pasada: un valor ya
+    # convertido no vuelve a pasar por `conversion`
+    batch = []
+    for task in Task.objects.only('pk', 'eisenhower_category').order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        task.eisenhower_category = conversion(task.eisenhower_category)
+        batch.append(task)
+        if len(batch) >= BATCH_SIZE:
+            Task.objects.bulk_update(batch, ['eisenhower_category'])
+            batch = []
+    Task.objects.bulk_update(batch, ['eisenhower_category'])
+
+
+def labels_to_numbers(apps, schema_editor):
+    convert(apps.get_model('core', 'Task'), lambda category: str(label_to_number(category)))
+
+
+def numbers_to_labels(apps, schema_editor):
+    convert(apps.get_model('core', 'Task'), lambda category: NAMES.get(int(category), NAMES[0]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_history_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(labels_to_numbers, numbers_to_labels),
+        migrations.AlterField(
+            model_name='task',
+            name='eisenhower_category',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'No especificada'), (1, 'Urgente e Importante'), (2, 'Urgente y No Importante'), (3, 'No Urgente e Importante'), (4, 'No Urgente y No Importante')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['user', 'eisenhower_category', '-created_at'], name='task_user_category_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_todo_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyplan',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='response_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='response_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
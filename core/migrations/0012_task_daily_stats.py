@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def build_stats(apps, schema_editor):
+    Task = apps.get_model('core', 'Task')
+    TaskDailyStats = apps.get_model('core', 'TaskDailyStats')
+    rows = (
+        Task.objects.filter(is_todo=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('user_id', 'day', 'eisenhower_category')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    TaskDailyStats.objects.bulk_create((
+        TaskDailyStats(user_id=row['user_id'], day=row['day'], category=row['eisenhower_category'], count=row['count'])
+        for row in rows.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_task_embedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.PositiveSmallIntegerField(choices=[(0, 'No especificada'), (1, 'Urgente e Importante'), (2, 'Urgente y No Importante'), (3, 'No Urgente e Importante'), (4, 'No Urgente y No Importante')])),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category'), name='taskdailystats_user_day_category_uniq')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
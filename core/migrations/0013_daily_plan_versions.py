@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+
+def set_plan_days(apps, schema_editor):
+    DailyPlan = apps.get_model('core', 'DailyPlan')
+    DailyPlan.objects.update(day=TruncDate('created_at'), updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_task_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPlanRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('diff', models.JSONField()),
+                ('incremental', models.BooleanField(default=False)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('response_tokens', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='analysis',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='day',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='dailyplan',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='dailyplan',
+            index=models.Index(fields=['user', 'day', '-id'], name='dailyplan_user_day_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyplanrevision',
+            name='plan',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='core.dailyplan'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyplanrevision',
+            constraint=models.UniqueConstraint(fields=('plan', 'version'), name='dailyplanrevision_plan_version_uniq'),
+        ),
+        migrations.RunPython(set_plan_days, migrations.RunPython.noop),
+    ]
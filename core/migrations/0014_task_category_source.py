@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+def mark_llm_tasks(apps, schema_editor):
+    # Solo las tareas con tokens salieron con seguridad de una llamada al
+    # modelo; las demás (caché, clasificador local, tareas casi iguales)
+    # quedan como de origen desconocido y no se usan para entrenar
+    Task = apps.get_model('core', 'Task')
+    Task.objects.filter(prompt_tokens__gt=0).exclude(eisenhower_category=0).update(category_source='llm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_daily_plan_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='category_source',
+            field=models.CharField(blank=True, choices=[('', 'Desconocido'), ('llm', 'Modelo'), ('local', 'Clasificador local'), ('reused', 'Tarea casi igual'), ('manual', 'Manual')], default='', max_length=10),
+        ),
+        migrations.RunPython(mark_llm_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_task_category_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='prompt_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='response_tokens',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
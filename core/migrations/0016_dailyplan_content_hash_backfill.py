@@ -0,0 +1,52 @@
+# Calcula el hash del contenido de los planes guardados antes de 0013, que
+# quedaron con content_hash vacío: sin él, reenviar sin cambios el plan de un
+# día anterior a las versiones creaba una versión 2 con un diff vacío.
+
+import hashlib
+
+from django.db import migrations
+
+
+# Filas que se leen y actualizan en cada bloque
+BATCH_SIZE = 1000
+
+
+# Copia congelada de core.prompts.plan_lines y core.plans.content_hash al
+# escribir esta migración: debe dar el mismo hash que la aplicación al guardar
+# cada versión (si no, el plan sin cambios se seguiría tomando por uno nuevo),
+# pero sin cambiar si la aplicación cambia después.
+def plan_lines(plan):
+    lines = []
+    for line in str(plan).splitlines():
+        line = ' '.join(line.split())
+        if line and (not lines or line.casefold() != lines[-1].casefold()):
+            lines.append(line)
+    return lines
+
+
+def content_hash(text):
+    return hashlib.sha256('\n'.join(plan_lines(text)).encode('utf-8')).hexdigest()
+
+
+def fill_content_hashes(apps, schema_editor):
+    DailyPlan = apps.get_model('core', 'DailyPlan')
+    batch = []
+    plans = DailyPlan.objects.filter(content_hash='').only('pk', 'plan_text').order_by('pk')
+    for plan in plans.iterator(chunk_size=BATCH_SIZE):
+        plan.content_hash = content_hash(plan.plan_text)
+        batch.append(plan)
+        if len(batch) >= BATCH_SIZE:
+            DailyPlan.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    DailyPlan.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_analysisjob_token_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
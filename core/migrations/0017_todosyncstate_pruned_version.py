@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_dailyplan_content_hash_backfill'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todosyncstate',
+            name='pruned_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
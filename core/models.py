@@ -1,5 +1,29 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+class EisenhowerCategory(models.IntegerChoices):
+    """
+    Categorías de la Matriz de Eisenhower. Se guardan como un entero pequeño
+    (el mismo número que usan los prompts) para poder indexarlas y agregarlas.
+    """
+    UNSPECIFIED = 0, 'No especificada'
+    URGENT_IMPORTANT = 1, 'Urgente e Importante'
+    URGENT_NOT_IMPORTANT = 2, 'Urgente y No Importante'
+    NOT_URGENT_IMPORTANT = 3, 'No Urgente e Importante'
+    NOT_URGENT_NOT_IMPORTANT = 4, 'No Urgente y No Importante'
+
+class CategorySource(models.TextChoices):
+    """
+    Quién asignó la categoría de una tarea. El clasificador local solo se
+    entrena y se evalúa con las del modelo y las manuales, nunca con las que
+    asignó él mismo o la reutilización de tareas casi iguales.
+    """
+    UNKNOWN = '', 'Desconocido'
+    LLM = 'llm', 'Modelo'
+    LOCAL = 'local', 'Clasificador local'
+    REUSED = 'reused', 'Tarea casi igual'
+    MANUAL = 'manual', 'Manual'
 
 class Task(models.Model):
     """
@@ -8,9 +32,45 @@ class Task(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     description = models.TextField()
-    eisenhower_category = models.CharField(max_length=50)
+    eisenhower_category = models.PositiveSmallIntegerField(
+        choices=EisenhowerCategory.choices, default=EisenhowerCategory.UNSPECIFIED
+    )
+    category_source = models.CharField(
+        max_length=10, choices=CategorySource.choices, blank=True, default=CategorySource.UNKNOWN
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Campos de la lista de tareas sincronizada (ver core/todos.py). Las tareas
+    # de la lista tienen `is_todo`; las demás son solo resultados de análisis.
+    is_todo = models.BooleanField(default=False)
+    client_id = models.CharField(max_length=64, blank=True, default='')
+    completed = models.BooleanField(default=False)
+    due_date = models.DateField(null=True, blank=True)
+    # Orden fraccionario: mover una tarea solo cambia su propia posición
+    position = models.FloatField(default=0)
+    # Versión de sincronización del usuario en la que cambió por última vez
+    version = models.PositiveBigIntegerField(default=0)
+    # Las tareas borradas de la lista se conservan para propagar el borrado
+    deleted = models.BooleanField(default=False)
+    # Tokens que costó el análisis (0 si salió de la caché o del clasificador local)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Índice para el historial paginado por cursor (del más reciente al más antiguo)
+            models.Index(fields=['user', '-created_at', '-id'], name='task_user_created_idx'),
+            # Índice para filtrar y agregar por categoría
+            models.Index(fields=['user', 'eisenhower_category', '-created_at'], name='task_user_category_idx'),
+            # Índice para los cambios de la lista desde una versión
+            models.Index(fields=['user', 'version'], name='task_user_version_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_id'], condition=~models.Q(client_id=''), name='task_user_client_id_uniq'
+            ),
+        ]
+
     def __str__(self):
         return f'{self.user.username} - {self.description[:30]}'
 
@@ -18,12 +78,167 @@ class DailyPlan(models.Model):
     """
     Modelo para guardar un plan diario.
     Se relaciona con el modelo de usuario por una llave foránea.
+    Cada usuario tiene un plan por día: al volver a enviarlo cambiado se
+    guarda la nueva versión aquí y solo las líneas cambiadas en
+    `DailyPlanRevision` (ver core/plans.py).
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     plan_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    day = models.DateField(default=timezone.localdate)
+    version = models.PositiveIntegerField(default=1)
+    # Hash del plan normalizado: un plan reenviado sin cambios no se vuelve a analizar
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    # Último análisis de Yerkes-Dodson, del que parte el análisis incremental
+    analysis = models.TextField(blank=True, default='')
+    # Tokens que costaron los análisis de todas las versiones (0 si salieron de la caché)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Índice para el historial paginado por cursor (del más reciente al más antiguo)
+            models.Index(fields=['user', '-created_at', '-id'], name='dailyplan_user_created_idx'),
+            # Índice para encontrar el plan del día de un usuario
+            models.Index(fields=['user', 'day', '-id'], name='dailyplan_user_day_idx'),
+        ]
 
     def __str__(self):
         return f'Plan de {self.user.username} - {self.created_at.strftime("%Y-%m-%d")}'
 
+class DailyPlanRevision(models.Model):
+    """
+    Cambio de un plan diario de la versión anterior a `version`: solo las
+    líneas cambiadas, en los dos sentidos (ver core/plans.py), así que el
+    espacio crece con el tamaño del cambio y no con el del plan.
+    """
+    plan = models.ForeignKey(DailyPlan, on_delete=models.CASCADE, related_name='revisions')
+    version = models.PositiveIntegerField()
+    diff = models.JSONField()
+    # El análisis de esta versión partió del anterior y solo recibió los cambios
+    incremental = models.BooleanField(default=False)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'version'], name='dailyplanrevision_plan_version_uniq'),
+        ]
+
+    def __str__(self):
+        return f'Plan {self.plan_id}, versión {self.version}'
+
+class LLMCacheEntry(models.Model):
+    """
+    Respuesta del modelo guardada por la caché de respuestas (backend 'db').
+    La clave es el hash de endpoint, modelo, versión del prompt y entrada.
+    """
+    key = models.CharField(max_length=64, primary_key=True)
+    value = models.JSONField()
+    expires_at = models.DateTimeField()
+    accessed_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.key
+
+class AnalysisJob(models.Model):
+    """
+    Análisis pendiente en la cola de trabajos.
+    Lo crea una vista y lo ejecuta el worker `run_analysis_jobs`.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendiente'),
+        (RUNNING, 'En ejecución'),
+        (DONE, 'Terminado'),
+        (FAILED, 'Fallido'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Tokens que costó el resultado (0 si salió de la caché)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    response_tokens = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+class LocalClassifierModel(models.Model):
+    """
+    Clasificador local (Naive Bayes) entrenado con las tareas de un usuario.
+    Lo genera el comando `train_local_classifier`.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    data = models.JSONField()
+    samples = models.PositiveIntegerField(default=0)
+    trained_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Clasificador de {self.user.username} ({self.samples} tareas)'
+
+class TaskDailyStats(models.Model):
+    """
+    Tareas analizadas por un usuario en un día con una categoría (ver core/analytics.py).
+    Se actualiza al guardar cada tarea; `rebuild_task_stats` la recalcula.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    category = models.PositiveSmallIntegerField(choices=EisenhowerCategory.choices)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # La restricción también sirve de índice para los rangos de fechas de un usuario
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'category'], name='taskdailystats_user_day_category_uniq'),
+        ]
 
+    def __str__(self):
+        return f'{self.user.username} - {self.day} - {self.get_category_display()}: {self.count}'
+
+class TaskEmbedding(models.Model):
+    """
+    Embedding de la descripción de una tarea clasificada (ver core/embeddings.py).
+    Se calcula una sola vez; `model` identifica el embedder y sus dimensiones.
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=100)
+    # Vector float32 normalizado, en bytes
+    vector = models.BinaryField()
+
+    class Meta:
+        # Índice para cargar las tareas más recientes de un usuario con un embedder
+        indexes = [models.Index(fields=['user', 'model', '-task'], name='taskembedding_user_model_idx')]
+
+    def __str__(self):
+        return f'Embedding de la tarea {self.task_id} ({self.model})'
+
+class TodoSyncState(models.Model):
+    """
+    Versión actual de la lista de tareas de un usuario. Cada sincronización
+    con cambios la incrementa y marca con ella las tareas que modificó.
+    `pruned_version` es la versión hasta la que se eliminaron las marcas de
+    borrado.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField(default=0)
+    pruned_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'Lista de {self.user.username} (versión {self.version})'
@@ -0,0 +1,66 @@
+"""
+Paginación por cursor (keyset) para los historiales.
+
+En lugar de OFFSET, cada página continúa justo después de la última fila de
+la anterior usando el par (created_at, id), que recorre el índice compuesto
+(user, -created_at, -id). El coste de cada página depende solo de su tamaño,
+no de cuántas filas haya en el historial.
+"""
+import base64
+import hashlib
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def encode_cursor(created_at, pk):
+    """Cursor opaco con la posición de la última fila devuelta."""
+    raw = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Devuelve (created_at, id) del cursor. Lanza ValueError si no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (UnicodeError, ValueError) as e:
+        raise ValueError("Cursor no válido.") from e
+
+
+def paginate_keyset(queryset, cursor=None, limit=50):
+    """
+    Devuelve (filas, siguiente_cursor) para un queryset de `.values()` que
+    incluya 'id' y 'created_at'. El orden es del más reciente al más antiguo.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+
+def conditional_json_response(request, payload, last_modified=None):
+    """
+    JsonResponse con ETag y Last-Modified. Si el cliente ya tiene esta misma
+    página (If-None-Match / If-Modified-Since) responde 304 sin cuerpo.
+    """
+    response = JsonResponse(payload)
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp, response=response)
+    response.headers['ETag'] = etag
+    if timestamp is not None:
+        response.headers['Last-Modified'] = http_date(timestamp)
+    # El navegador puede guardar la página, pero debe revalidarla siempre
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,140 @@
+"""
+Versiones de los planes diarios.
+
+Cada usuario tiene un plan por día (`DailyPlan`). Al volver a enviarlo:
+- Si su contenido normalizado (`prompts.plan_lines`) coincide con la última
+  versión del día, se responde con el análisis guardado sin llamar al modelo
+  ni escribir en la base de datos.
+- Si cambió, el texto nuevo sustituye al anterior y en `DailyPlanRevision`
+  se guardan solo las líneas cambiadas, con su contenido de antes y de
+  después. Aplicadas hacia atrás desde el texto actual reconstruyen
+  cualquier versión anterior (`text_at_version`).
+- Si el plan ya tenía análisis y el cambio es pequeño
+  (`settings.PLAN_INCREMENTAL_MAX_CHANGE`), el análisis es incremental: el
+  modelo recibe su análisis anterior, las líneas cambiadas y un resumen del
+  resto (ver `plan_analysis` en core/analysis.py).
+"""
+import difflib
+import hashlib
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DailyPlan, DailyPlanRevision
+from .prompts import plan_lines
+
+
+def content_hash(text):
+    """Hash del plan normalizado: los cambios de espacios o líneas vacías no crean versiones."""
+    return hashlib.sha256('\n'.join(plan_lines(text)).encode('utf-8')).hexdigest()
+
+
+def line_diff(old_lines, new_lines):
+    """
+    Líneas cambiadas de `old_lines` a `new_lines`, como lista de
+    [posición en old, posición en new, líneas quitadas, líneas añadidas].
+    """
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        [i1, j1, old_lines[i1:i2], new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal'
+    ]
+
+
+def apply_diff(lines, diff, reverse=False):
+    """Aplica `diff` a las líneas de antes o, con `reverse`, lo deshace sobre las de después."""
+    result, position = [], 0
+    for old_at, new_at, removed, added in diff:
+        at, before, after = (new_at, added, removed) if reverse else (old_at, removed, added)
+        result.extend(lines[position:at])
+        result.extend(after)
+        position = at + len(before)
+    result.extend(lines[position:])
+    return result
+
+
+def _split(text):
+    # Con los finales de línea, para reconstruir cada versión tal cual se envió
+    return text.splitlines(keepends=True)
+
+
+@dataclass
+class PlanDraft:
+    """Plan recién enviado comparado con la última versión del día."""
+    current: DailyPlan = None
+    unchanged: bool = False
+    # Diferencias entre las líneas normalizadas y líneas que no cambiaron
+    diff: list = field(default_factory=list)
+    kept: list = field(default_factory=list)
+
+    @property
+    def incremental(self):
+        """El análisis puede partir del anterior: el plan ya tenía uno y el cambio es pequeño."""
+        if not settings.PLAN_INCREMENTAL_ENABLED or self.current is None or not self.current.analysis:
+            return False
+        changed = sum(max(len(removed), len(added)) for _, _, removed, added in self.diff)
+        return 0 < changed <= settings.PLAN_INCREMENTAL_MAX_CHANGE * (len(self.kept) + changed)
+
+
+async def compare_plan(user, text):
+    """PlanDraft de `text` frente al plan de hoy del usuario."""
+    current = await DailyPlan.objects.filter(user=user, day=timezone.localdate()).order_by('-id').afirst()
+    if current is None:
+        return PlanDraft()
+    if current.content_hash == content_hash(text):
+        return PlanDraft(current, unchanged=True)
+    old_lines, new_lines = plan_lines(current.plan_text), plan_lines(text)
+    diff = line_diff(old_lines, new_lines)
+    added_at = {start + k for _, start, _, added in diff for k in range(len(added))}
+    kept = [line for j, line in enumerate(new_lines) if j not in added_at]
+    return PlanDraft(current, diff=diff, kept=kept)
+
+
+def save_version(user, text, analysis='', incremental=False, prompt_tokens=0, response_tokens=0, day=None):
+    """
+    Guarda `text` como plan del usuario de `day` (por defecto, hoy): lo crea,
+    añade una versión con las líneas cambiadas o, si no cambió, solo
+    actualiza el análisis. Devuelve el DailyPlan.
+    """
+    text_hash = content_hash(text)
+    with transaction.atomic():
+        # Los envíos simultáneos del mismo usuario se guardan uno tras otro
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+        day = day or timezone.localdate()
+        plan = DailyPlan.objects.filter(user=user, day=day).order_by('-id').first()
+        if plan is None:
+            return DailyPlan.objects.create(
+                user=user, day=day, plan_text=text, content_hash=text_hash, analysis=analysis,
+                prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+            )
+        if plan.content_hash != text_hash:
+            plan.version += 1
+            DailyPlanRevision.objects.create(
+                plan=plan, version=plan.version, diff=line_diff(_split(plan.plan_text), _split(text)),
+                incremental=incremental, prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+            )
+            plan.plan_text, plan.content_hash = text, text_hash
+        plan.analysis = analysis or plan.analysis
+        plan.prompt_tokens += prompt_tokens
+        plan.response_tokens += response_tokens
+        plan.save(update_fields=[
+            'plan_text', 'content_hash', 'version', 'analysis', 'prompt_tokens', 'response_tokens', 'updated_at',
+        ])
+    return plan
+
+
+asave_version = sync_to_async(save_version)
+
+
+def text_at_version(plan, version):
+    """Texto del plan en `version`. Lanza ValueError si no existe esa versión."""
+    if not 1 <= version <= plan.version:
+        raise ValueError(f"El plan tiene las versiones de la 1 a la {plan.version}.")
+    lines = _split(plan.plan_text)
+    for revision in plan.revisions.filter(version__gt=version).order_by('-version'):
+        lines = apply_diff(lines, revision.diff, reverse=True)
+    return ''.join(lines)
@@ -0,0 +1,109 @@
+"""
+Compactación de las entradas de los prompts.
+
+Antes de rellenar las plantillas de Laborit y Yerkes-Dodson, la entrada del
+usuario se normaliza y se recorta a un presupuesto de tokens:
+- Las listas de tareas pierden viñetas y numeración, se eliminan las tareas
+  repetidas y se limita su número.
+- Los planes diarios pierden líneas vacías y repeticiones consecutivas y,
+  si siguen sin caber, se conservan las primeras líneas con una nota de las
+  omitidas (no se resumen con el modelo: costaría otra llamada).
+Prompts más pequeños cuestan menos y responden antes, y entradas equivalentes
+comparten entrada en la caché de respuestas.
+"""
+import re
+
+from django.conf import settings
+
+from .llm import estimate_tokens
+
+# Viñetas y numeración al principio de una línea: "- ", "* ", "1. ", "2) ", "[ ] "
+_BULLET_RE = re.compile(r'^\s*(?:[-*•·]+|\d+[.)]|\[[ xX]?\])\s*')
+
+
+def _clean_line(line):
+    return ' '.join(line.split())
+
+
+def _truncate_lines(lines, budget, omitted_note, max_lines=None):
+    """Conserva las primeras líneas (como mucho `max_lines`) que caben en `budget` tokens."""
+    kept, used = [], 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if kept and (used + cost > budget or len(kept) == max_lines):
+            break
+        kept.append(line)
+        used += cost
+    omitted = len(lines) - len(kept)
+    if omitted:
+        kept.append(omitted_note.format(omitted=omitted))
+    return kept
+
+
+def task_lines(tasks):
+    """
+    Tareas de una lista (texto con una tarea por línea) sin viñetas ni
+    espacios sobrantes y sin duplicados (sin distinguir mayúsculas).
+    """
+    seen, items = set(), []
+    for line in str(tasks).splitlines():
+        item = _clean_line(_BULLET_RE.sub('', line))
+        key = item.casefold()
+        if item and key not in seen:
+            seen.add(key)
+            items.append(item)
+    return items
+
+
+def compact_tasks(tasks, max_items=None, token_budget=None):
+    """
+    Normaliza una lista de tareas (ver `task_lines`) y la recorta a
+    `max_items` tareas y `token_budget` tokens.
+    """
+    max_items = settings.PROMPT_MAX_TASKS if max_items is None else max_items
+    token_budget = settings.PROMPT_TASKS_TOKEN_BUDGET if token_budget is None else token_budget
+    items = [f'- {item}' for item in task_lines(tasks)]
+    return '\n'.join(_truncate_lines(items, token_budget, '- ({omitted} tareas más omitidas)', max_items))
+
+
+def plan_lines(plan):
+    """
+    Líneas de un plan diario sin líneas vacías, espacios sobrantes ni líneas
+    repetidas seguidas (en un plan, dos pausas iguales en momentos distintos
+    sí cuentan).
+    """
+    lines = []
+    for line in str(plan).splitlines():
+        line = _clean_line(line)
+        if line and (not lines or line.casefold() != lines[-1].casefold()):
+            lines.append(line)
+    return lines
+
+
+def compact_plan(plan, token_budget=None):
+    """
+    Compacta un plan diario (ver `plan_lines`) y si aun así supera
+    `token_budget` tokens conserva las primeras líneas e indica cuántas se
+    omitieron.
+    """
+    token_budget = settings.PROMPT_PLAN_TOKEN_BUDGET if token_budget is None else token_budget
+    lines = plan_lines(plan)
+    if estimate_tokens('\n'.join(lines)) <= token_budget:
+        return '\n'.join(lines)
+    return '\n'.join(_truncate_lines(lines, token_budget, '({omitted} líneas más omitidas)'))
+
+
+def compact_plan_changes(diff, unchanged, token_budget=None):
+    """
+    Texto de los cambios de un plan diario (`diff` de core/plans.py entre
+    líneas normalizadas) y resumen de las líneas sin cambios: las primeras
+    que caben en `token_budget` tokens y cuántas más hay.
+    Devuelve (cambios, resumen).
+    """
+    token_budget = settings.PLAN_SUMMARY_TOKEN_BUDGET if token_budget is None else token_budget
+    changes = []
+    for _, _, removed, added in diff:
+        changes.extend(f'- Quitada: {line}' for line in removed)
+        changes.extend(f'- Añadida: {line}' for line in added)
+    summary = _truncate_lines(unchanged, token_budget, '({omitted} líneas más sin cambios)') if unchanged else ['(ninguna)']
+    return '\n'.join(changes), '\n'.join(summary)
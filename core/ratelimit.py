@@ -0,0 +1,241 @@
+"""
+Límites de uso de los endpoints de análisis.
+
+Dos controles, ambos comprobados antes de llamar al modelo para que una
+petición rechazada no cueste nada:
+- Cubos de fichas por usuario y global (implementados con GCRA, que guarda
+  un único número por clave: el instante teórico de la siguiente petición).
+- Un presupuesto diario de tokens por usuario, que se descuenta con el uso
+  real que informa Gemini (`usage_metadata`) en cada llamada no cacheada.
+
+Con `RATE_LIMIT_BACKEND='django'` (el valor por defecto si hay
+`SHARED_CACHE`) el estado vive en la caché compartida `RATE_LIMIT_CACHE_ALIAS`
+(Redis o base de datos) y los límites se cumplen entre procesos; una caché
+que no se comparte (la de memoria) se rechaza con ImproperlyConfigured. La lectura y
+escritura de los cubos no es atómica: dos peticiones exactamente simultáneas
+pueden colar una petición de más, lo que es aceptable para un limitador. Con
+`'memory'` cada proceso aplica sus propios límites.
+
+Una petición solo consume fichas si pasa todos los cubos: la que rechaza el
+cubo global no gasta la del usuario.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .llm import usage_callback
+
+
+class MemoryBackend:
+    """
+    Estado en memoria del proceso: cada worker aplica sus propios límites.
+    Cada `prune_every` escrituras borra las claves caducadas (los cubos y
+    presupuestos de usuarios que ya no hacen peticiones).
+    """
+
+    def __init__(self, prune_every=1000):
+        self.prune_every = prune_every
+        self._data = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _written(self):
+        # Se llama con el cerrojo tomado
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            now = time.time()
+            for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+                del self._data[key]
+
+    async def aget(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    async def aset(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._written()
+
+    async def aincr(self, key, amount, ttl):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, 0))
+            if expires_at <= time.time():
+                value, expires_at = 0, time.time() + ttl
+            self._data[key] = (value + amount, expires_at)
+            self._written()
+            return value + amount
+
+
+class DjangoCacheBackend:
+    """Estado en una caché de `settings.CACHES`, compartida entre procesos."""
+
+    def __init__(self, alias='shared'):
+        if alias not in settings.CACHES:
+            raise ImproperlyConfigured(
+                f"Los límites de uso necesitan la caché compartida {alias!r}: configura SHARED_CACHE "
+                "o RATE_LIMIT_CACHE_ALIAS, o usa RATE_LIMIT_BACKEND=memory."
+            )
+        self.cache = caches[alias]
+        if isinstance(self.cache, (LocMemCache, DummyCache)):
+            raise ImproperlyConfigured(
+                f"La caché {alias!r} no se comparte entre procesos: no sirve para los límites de uso."
+            )
+
+    async def aget(self, key):
+        return await self.cache.aget(f'rl:{key}')
+
+    async def aset(self, key, value, ttl):
+        await self.cache.aset(f'rl:{key}', value, math.ceil(ttl))
+
+    async def aincr(self, key, amount, ttl):
+        await self.cache.aadd(f'rl:{key}', 0, math.ceil(ttl))
+        try:
+            return await self.cache.aincr(f'rl:{key}', amount)
+        except ValueError:
+            # La clave caducó entre `add` e `incr`
+            await self.cache.aset(f'rl:{key}', amount, math.ceil(ttl))
+            return amount
+
+
+class RateLimiter:
+    """Cubos de fichas y presupuestos diarios sobre un backend de estado."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def take(self, *buckets):
+        """
+        Consume una ficha de cada cubo `(clave, rate, burst)`, que se rellena a
+        `rate` fichas por segundo hasta un máximo de `burst`, solo si todos la
+        tienen. Devuelve None si la petición pasa o, si no, la clave del
+        primer cubo que la rechaza y los segundos que hay que esperar.
+        """
+        now = time.time()
+        taken = []
+        for key, rate, burst in buckets:
+            interval = 1 / rate
+            tat = max(await self.backend.aget(key) or now, now)
+            allowed_at = tat + interval - burst * interval
+            if now < allowed_at:
+                return key, allowed_at - now
+            taken.append((key, tat + interval))
+        for key, tat in taken:
+            await self.backend.aset(key, tat, tat - now)
+        return None
+
+    async def tokens_used(self, user_id):
+        return await self.backend.aget(_budget_key(user_id)) or 0
+
+    async def add_tokens(self, user_id, tokens):
+        return await self.backend.aincr(_budget_key(user_id), tokens, _seconds_until_tomorrow())
+
+
+def _budget_key(user_id):
+    return f'budget:{user_id}:{timezone.localdate().isoformat()}'
+
+
+def _seconds_until_tomorrow():
+    now = timezone.localtime()
+    tomorrow = timezone.make_aware(datetime.combine(now.date() + timedelta(days=1), datetime.min.time()))
+    return (tomorrow - now).total_seconds()
+
+
+_limiter = None
+
+
+def get_rate_limiter():
+    """Devuelve el limitador del proceso, creándolo la primera vez."""
+    global _limiter
+    if _limiter is None:
+        if settings.RATE_LIMIT_BACKEND == 'django':
+            backend = DjangoCacheBackend(settings.RATE_LIMIT_CACHE_ALIAS)
+        elif settings.RATE_LIMIT_BACKEND == 'memory':
+            backend = MemoryBackend()
+        else:
+            raise ValueError(f"Backend de límites desconocido: {settings.RATE_LIMIT_BACKEND}")
+        _limiter = RateLimiter(backend)
+    return _limiter
+
+
+async def check_limits(user):
+    """
+    Comprueba el presupuesto diario y los cubos del usuario y global.
+    Devuelve None si la petición puede seguir, o (mensaje, segundos de espera).
+    """
+    limiter = get_rate_limiter()
+    if settings.DAILY_TOKEN_BUDGET and await limiter.tokens_used(user.pk) >= settings.DAILY_TOKEN_BUDGET:
+        return "Has agotado tu presupuesto diario de análisis.", _seconds_until_tomorrow()
+    rejected = await limiter.take(
+        (f'user:{user.pk}', settings.RATE_LIMIT_USER_RATE / 60, settings.RATE_LIMIT_USER_BURST),
+        ('global', settings.RATE_LIMIT_GLOBAL_RATE / 60, settings.RATE_LIMIT_GLOBAL_BURST),
+    )
+    if rejected is None:
+        return None
+    key, retry_after = rejected
+    if key == 'global':
+        return "El servicio está saturado. Inténtalo de nuevo en unos segundos.", retry_after
+    return "Demasiadas peticiones. Inténtalo de nuevo en unos segundos.", retry_after
+
+
+@contextmanager
+def charge_tokens_to(user):
+    """Carga al presupuesto diario de `user` los tokens de las llamadas al modelo del bloque."""
+    if not settings.DAILY_TOKEN_BUDGET:
+        yield
+        return
+
+    async def charge(tokens):
+        await get_rate_limiter().add_tokens(user.pk, tokens)
+
+    token = usage_callback.set(charge)
+    try:
+        yield
+    finally:
+        usage_callback.reset(token)
+
+
+async def _charged_stream(events, user):
+    """Mantiene el cobro de tokens mientras se emite una respuesta en streaming."""
+    with charge_tokens_to(user):
+        async for event in events:
+            yield event
+
+
+def rate_limited(view):
+    """
+    Decorador para las vistas asíncronas de análisis: rechaza con 429 y
+    `Retry-After` las peticiones POST que superan los límites, antes de
+    llamar al modelo, y carga los tokens consumidos al usuario.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return await view(request, *args, **kwargs)
+        user = await request.auser()
+        if settings.RATE_LIMIT_ENABLED:
+            limited = await check_limits(user)
+            if limited is not None:
+                message, retry_after = limited
+                response = JsonResponse({"error": message, "retry_after": round(retry_after, 3)}, status=429)
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+        with charge_tokens_to(user):
+            response = await view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = _charged_stream(response.streaming_content, user)
+        return response
+    return wrapper
@@ -0,0 +1,185 @@
+"""
+Esquemas de las respuestas estructuradas (JSON) que pedimos al modelo.
+
+Cada esquema tiene dos caras: el diccionario que se envía a Gemini como
+`response_schema` y el modelo de pydantic con el que validamos lo que
+devuelve.
+"""
+import json
+import re
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+from .models import EisenhowerCategory
+
+# Nombre de cada categoría (en minúsculas) -> categoría
+_CATEGORY_BY_LABEL = {
+    category.label.casefold(): category
+    for category in EisenhowerCategory
+    if category != EisenhowerCategory.UNSPECIFIED
+}
+
+
+def parse_category(value):
+    """
+    Devuelve la `EisenhowerCategory` que corresponde a `value` (el nombre de
+    la categoría o su número del 1 al 4), o None si no corresponde a ninguna.
+    """
+    text = str(value).strip().strip('.*"').strip()
+    if text.isdigit():
+        number = int(text)
+        return EisenhowerCategory(number) if 1 <= number <= 4 else None
+    text = re.sub(r'^\d+\.\s*', '', text)
+    return _CATEGORY_BY_LABEL.get(text.casefold())
+
+
+def _category_from_label(value):
+    category = parse_category(value)
+    if category is None:
+        raise ValueError(f"Categoría desconocida: {value!r}")
+    return category
+
+
+class EisenhowerAnalysis(BaseModel):
+    """Respuesta estructurada del análisis de Eisenhower."""
+    task: str
+    category: EisenhowerCategory
+    justification: str
+
+    _category_from_label = field_validator('category', mode='before')(_category_from_label)
+
+    def as_text(self):
+        """El mismo formato de texto que muestra la interfaz."""
+        return (
+            f"- Tarea: {self.task}\n"
+            f"- Categoría: {self.category.label}\n"
+            f"- Justificación: {self.justification}"
+        )
+
+
+EISENHOWER_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'task': {'type': 'string'},
+        'category': {'type': 'string', 'enum': [category.label for category in _CATEGORY_BY_LABEL.values()]},
+        'justification': {'type': 'string'},
+    },
+    'required': ['task', 'category', 'justification'],
+}
+
+
+class DayPlanTask(BaseModel):
+    """Categoría de una tarea (por su número en la lista) en el plan del día."""
+    index: int
+    category: EisenhowerCategory
+
+    _category_from_label = field_validator('category', mode='before')(_category_from_label)
+
+
+class DayPlanAnalysis(BaseModel):
+    """Respuesta estructurada del plan del día: Eisenhower, Laborit y Yerkes-Dodson en una sola llamada."""
+    tasks: list[DayPlanTask]
+    first_task: int
+    first_task_justification: str
+    analysis: str
+    justification: str
+    schedule: list[str]
+
+    def categories(self, count):
+        """Categoría de cada una de las `count` tareas (sin categoría las que falten)."""
+        categories = {task.index: task.category for task in self.tasks}
+        return [categories.get(i, EisenhowerCategory.UNSPECIFIED) for i in range(1, count + 1)]
+
+    def laborit_text(self, tasks):
+        """El mismo formato de texto que el análisis de Laborit."""
+        first = tasks[self.first_task - 1] if 1 <= self.first_task <= len(tasks) else '(ninguna)'
+        return (
+            f"- Tarea sugerida: {first}\n"
+            f"- Justificación (Ley de Laborit y Pareto): {self.first_task_justification}"
+        )
+
+    def yerkes_dodson_text(self):
+        """El mismo formato de texto que el análisis de Yerkes-Dodson."""
+        schedule = '\n'.join(f"  - {line}" for line in self.schedule)
+        return (
+            f"- Análisis: {self.analysis}\n"
+            f"- Justificación (Yerkes-Dodson e Illich): {self.justification}\n"
+            f"- Sugerencia (Yerkes-Dodson e Illich):\n{schedule}"
+        )
+
+
+class PartialDayPlan(DayPlanAnalysis):
+    """
+    Las partes válidas de una respuesta del plan del día que no pasó la
+    validación: las categorías bien formadas, la primera tarea (Laborit) si
+    está completa y el plan (Yerkes-Dodson) si está completo. Lo que falte se
+    pide con las llamadas de cada ley.
+    """
+    tasks: list[DayPlanTask] = []
+    first_task: int = None
+    first_task_justification: str = None
+    analysis: str = None
+    justification: str = None
+    schedule: list[str] = None
+
+    @classmethod
+    def from_text(cls, text, count):
+        """Partes válidas del JSON `text` para una lista de `count` tareas."""
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return cls()
+        if not isinstance(data, dict):
+            return cls()
+        values = {}
+        for name, value in data.items():
+            if name not in cls.model_fields:
+                continue
+            if name == 'tasks':
+                value = [task for task in value if _is_valid(DayPlanTask, task)] if isinstance(value, list) else []
+            if _is_valid(cls, {name: value}):
+                values[name] = value
+        partial = cls.model_validate(values)
+        if partial.first_task is not None and not 1 <= partial.first_task <= count:
+            partial.first_task = None
+        return partial
+
+    @property
+    def has_laborit(self):
+        return self.first_task is not None and self.first_task_justification is not None
+
+    @property
+    def has_yerkes_dodson(self):
+        return None not in (self.analysis, self.justification, self.schedule)
+
+
+def _is_valid(model_class, value):
+    try:
+        model_class.model_validate(value)
+    except ValidationError:
+        return False
+    return True
+
+
+DAY_PLAN_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'tasks': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'index': {'type': 'integer'},
+                    'category': EISENHOWER_RESPONSE_SCHEMA['properties']['category'],
+                },
+                'required': ['index', 'category'],
+            },
+        },
+        'first_task': {'type': 'integer'},
+        'first_task_justification': {'type': 'string'},
+        'analysis': {'type': 'string'},
+        'justification': {'type': 'string'},
+        'schedule': {'type': 'array', 'items': {'type': 'string'}},
+    },
+    'required': ['tasks', 'first_task', 'first_task_justification', 'analysis', 'justification', 'schedule'],
+}
@@ -63,6 +63,81 @@ async function callBackendApi(endpoint, data) {
     }
 }
 
+// Función para recibir la respuesta del servidor en streaming (Server-Sent Events).
+// Llama a onChunk con cada trozo de texto y devuelve el texto completo al terminar.
+async function streamBackendApi(endpoint, data, onChunk) {
+    try {
+        const response = await fetch(`/api/${endpoint}/`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ ...data, stream: true })
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            // Cada evento SSE termina con una línea en blanco
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) eventName = line.slice(7);
+                    else if (line.startsWith('data: ')) eventData += line.slice(6);
+                });
+                const payload = JSON.parse(eventData);
+                if (eventName === 'chunk') {
+                    onChunk(payload.text);
+                } else if (eventName === 'done') {
+                    result = payload.result;
+                } else if (eventName === 'error') {
+                    throw new Error(payload.error);
+                }
+            }
+        }
+        return result;
+    } catch (error) {
+        console.error('Error al llamar al servidor de backend:', error);
+        showStatusMessage(`Ocurrió un error al procesar tu solicitud: ${error.message}`, false);
+        return `Ocurrió un error al procesar tu solicitud: ${error.message}`;
+    }
+}
+
+// Muestra la respuesta de una herramienta a medida que llega del servidor
+async function renderStreamedAnalysis(resultId, endpoint, data, successMessage) {
+    const resultDiv = document.getElementById(resultId);
+    showLoading(resultId);
+    let pre = null;
+    const response = await streamBackendApi(endpoint, data, (text) => {
+        if (!pre) {
+            resultDiv.innerHTML = '<pre class="whitespace-pre-wrap"></pre>';
+            pre = resultDiv.querySelector('pre');
+        }
+        pre.textContent += text;
+    });
+    // Como texto, no como HTML: la respuesta del modelo no se interpreta
+    resultDiv.innerHTML = '<pre class="whitespace-pre-wrap"></pre>';
+    resultDiv.querySelector('pre').textContent = response;
+    if (response && !response.startsWith('Ocurrió un error')) {
+        showStatusMessage(successMessage, true);
+    }
+}
+
 // Funciones para los botones de las herramientas
 
 
@@ -72,13 +147,7 @@ async function analyzeEisenhower() {
         showStatusMessage('Por favor, ingresa al menos una tarea para analizar.', false);
         return;
     }
-    const resultDiv = document.getElementById('eisenhower-result');
-    showLoading('eisenhower-result');
-    const response = await callBackendApi('eisenhower', { task: input });
-    resultDiv.innerHTML = `<pre class="whitespace-pre-wrap">${response}</pre>`;
-    if (response && !response.startsWith('Ocurrió un error')) {
-        showStatusMessage('Solicitud analizada con éxito.', true);
-    }
+    await renderStreamedAnalysis('eisenhower-result', 'eisenhower', { task: input }, 'Solicitud analizada con éxito.');
 }
 
 
@@ -88,13 +157,7 @@ async function analyzeLaborit() {
         showStatusMessage('Por favor, ingresa una lista de tareas para analizar.', false);
         return;
     }
-    const resultDiv = document.getElementById('laborit-result');
-    showLoading('laborit-result');
-    const response = await callBackendApi('laborit', { tasks: input });
-    resultDiv.innerHTML = `<pre class="whitespace-pre-wrap">${response}</pre>`;
-    if (response && !response.startsWith('Ocurrió un error')) {
-        showStatusMessage('Lista de tareas analizada con éxito.', true);
-    }
+    await renderStreamedAnalysis('laborit-result', 'laborit', { tasks: input }, 'Lista de tareas analizada con éxito.');
 }
 
 async function analyzeYerkesDodson() {
@@ -103,28 +166,177 @@ async function analyzeYerkesDodson() {
         showStatusMessage('Por favor, ingresa un plan diario para analizar.', false);
         return;
     }
-    const resultDiv = document.getElementById('yerkes-dodson-result');
-    showLoading('yerkes-dodson-result');
-    const response = await callBackendApi('yerkes-dodson', { plan: input });
-    resultDiv.innerHTML = `<pre class="whitespace-pre-wrap">${response}</pre>`;
+    await renderStreamedAnalysis('yerkes-dodson-result', 'yerkes-dodson', { plan: input }, 'Plan diario analizado con éxito.');
+}
+
+// Planifica el día con las tareas pendientes de la lista: prioridades,
+// primera tarea y plan ajustado en una sola petición (/api/plan-day/)
+async function planMyDay() {
+    const tasks = getTasks().filter(task => !task.completed).map(task => task.text);
+    if (tasks.length === 0) {
+        showStatusMessage('No hay tareas pendientes para planificar.', false);
+        return;
+    }
+    const resultDiv = document.getElementById('plan-day-result');
+    resultDiv.classList.remove('hidden');
+    showLoading('plan-day-result');
+    const response = await callBackendApi('plan-day', { tasks });
+    resultDiv.innerHTML = '<pre class="whitespace-pre-wrap"></pre>';
+    resultDiv.querySelector('pre').textContent = response;
     if (response && !response.startsWith('Ocurrió un error')) {
-        showStatusMessage('Plan diario analizado con éxito.', true);
+        showStatusMessage('Día planificado con éxito.', true);
     }
 }
 
 // --- LÓGICA DE LA LISTA DE TAREAS ---
+// La lista se sincroniza con el servidor por deltas (/api/todos/sync/).
+// localStorage guarda cada tarea en su propia clave ("todo:<id>"), la última
+// versión conocida del servidor ("todoVersion") y las operaciones pendientes
+// de enviar ("todoPendingOps"), así que cada cambio solo escribe una tarea y
+// cada sincronización envía y recibe solo lo que cambió.
 let draggedItem = null;
 let currentFilter = 'all';
+const TODO_KEY_PREFIX = 'todo:';
+let todoTasks = null; // Map id -> tarea, cargado una vez desde localStorage
+let syncTimer = null;
+let syncInFlight = false;
+
+function newTaskId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(16)}-${Math.random().toString(16).slice(2)}`;
+}
+
+function loadTodoTasks() {
+    if (todoTasks === null) {
+        todoTasks = new Map();
+        for (let i = 0; i < localStorage.length; i++) {
+            const key = localStorage.key(i);
+            if (key.startsWith(TODO_KEY_PREFIX)) {
+                const task = JSON.parse(localStorage.getItem(key));
+                todoTasks.set(task.id, task);
+            }
+        }
+    }
+    return todoTasks;
+}
 
-// Carga las tareas desde localStorage
+function storeTask(task) {
+    loadTodoTasks().set(task.id, task);
+    localStorage.setItem(TODO_KEY_PREFIX + task.id, JSON.stringify(task));
+}
+
+function removeStoredTask(id) {
+    loadTodoTasks().delete(id);
+    localStorage.removeItem(TODO_KEY_PREFIX + id);
+}
+
+// Devuelve las tareas ordenadas por su posición
 function getTasks() {
-    const tasks = localStorage.getItem('todoTasks');
-    return tasks ? JSON.parse(tasks) : [];
+    return Array.from(loadTodoTasks().values()).sort((a, b) => a.position - b.position);
+}
+
+function getPendingOps() {
+    const ops = localStorage.getItem('todoPendingOps');
+    return ops ? JSON.parse(ops) : [];
+}
+
+function savePendingOps(ops) {
+    localStorage.setItem('todoPendingOps', JSON.stringify(ops));
+}
+
+// Aplica una operación ("upsert" o "delete") a la copia local
+function applyTodoOp(op) {
+    if (op.op === 'delete') {
+        removeStoredTask(op.id);
+        return;
+    }
+    const current = loadTodoTasks().get(op.id) || { id: op.id, text: '', completed: false, due_date: null, position: 0 };
+    const { op: _kind, ...fields } = op;
+    storeTask({ ...current, ...fields });
 }
 
-// Guarda las tareas en localStorage
-function saveTasks(tasks) {
-    localStorage.setItem('todoTasks', JSON.stringify(tasks));
+// Aplica la operación localmente, la encola y programa la sincronización
+function queueTodoOp(op) {
+    applyTodoOp(op);
+    const ops = getPendingOps();
+    ops.push(op);
+    savePendingOps(ops);
+    scheduleSync();
+}
+
+function scheduleSync(delay = 300) {
+    clearTimeout(syncTimer);
+    syncTimer = setTimeout(syncTodos, delay);
+}
+
+// Envía las operaciones pendientes y aplica los cambios del servidor
+async function syncTodos() {
+    if (syncInFlight) {
+        scheduleSync();
+        return;
+    }
+    syncInFlight = true;
+    const ops = getPendingOps();
+    try {
+        const response = await fetch('/api/todos/sync/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({ since: parseInt(localStorage.getItem('todoVersion') || '0'), ops: ops })
+        });
+        const result = await response.json();
+        if (!response.ok) {
+            if (response.status === 400) {
+                // El servidor rechazó estas operaciones: no tiene sentido reenviarlas
+                savePendingOps(getPendingOps().slice(ops.length));
+            }
+            throw new Error(result.error);
+        }
+        // Mientras tanto pueden haberse encolado operaciones nuevas
+        const stillPending = getPendingOps().slice(ops.length);
+        savePendingOps(stillPending);
+        if (result.reset) {
+            Array.from(loadTodoTasks().keys()).forEach(removeStoredTask);
+        }
+        result.changes.forEach(change => {
+            if (change.deleted) {
+                removeStoredTask(change.id);
+            } else {
+                storeTask(change);
+            }
+        });
+        // Los cambios locales aún no enviados siguen prevaleciendo
+        stillPending.forEach(applyTodoOp);
+        localStorage.setItem('todoVersion', String(result.version));
+        if (result.changes.length > 0) {
+            renderTasks();
+        }
+    } catch (error) {
+        console.error('Error al sincronizar la lista de tareas:', error);
+    } finally {
+        syncInFlight = false;
+    }
+}
+
+// Convierte la lista antigua ("todoTasks", un único array) al nuevo formato
+function migrateLegacyTasks() {
+    const legacy = localStorage.getItem('todoTasks');
+    if (!legacy) return;
+    JSON.parse(legacy).forEach((task, index) => {
+        queueTodoOp({
+            op: 'upsert',
+            id: newTaskId(),
+            text: task.text,
+            completed: Boolean(task.completed),
+            due_date: task.dueDate || null,
+            position: index + 1
+        });
+    });
+    localStorage.removeItem('todoTasks');
 }
 
 // Renderiza las tareas en el DOM con soporte para arrastrar y soltar
@@ -145,18 +357,16 @@ function renderTasks() {
         return;
     }
     
-    filteredTasks.forEach((task, index) => {
-        const originalIndex = tasks.findIndex(t => t.text === task.text && t.completed === task.completed && t.dueDate === task.dueDate);
-        
+    filteredTasks.forEach(task => {
         const li = document.createElement('li');
         li.className = `p-4 rounded-lg shadow flex items-center justify-between transition-colors duration-300 todo-item`;
         if (task.completed) {
             li.classList.add('completed');
         }
         li.draggable = true;
-        li.dataset.index = originalIndex;
+        li.dataset.id = task.id;
 
-        const dueDateHtml = task.dueDate ? `<span class="text-xs text-secondary ml-4">Fecha: ${new Date(task.dueDate).toLocaleDateString()}</span>` : '';
+        const dueDateHtml = task.due_date ? `<span class="text-xs text-secondary ml-4">Fecha: ${new Date(task.due_date).toLocaleDateString()}</span>` : '';
         
         li.innerHTML = `
             <div class="flex items-center flex-grow">
@@ -165,7 +375,7 @@ function renderTasks() {
                     <span class="text-primary task-text flex-grow">${task.text}</span>
                     ${dueDateHtml}
                     <input type="text" value="${task.text}" class="hidden flex-grow p-2 rounded-lg border border-teal-500 bg-container text-primary focus:outline-none task-input">
-                    <input type="date" value="${task.dueDate || ''}" class="hidden p-2 rounded-lg border border-teal-500 bg-container text-primary focus:outline-none due-date-input">
+                    <input type="date" value="${task.due_date || ''}" class="hidden p-2 rounded-lg border border-teal-500 bg-container text-primary focus:outline-none due-date-input">
                 </div>
             </div>
             <div class="flex items-center space-x-2 ml-2">
@@ -189,24 +399,21 @@ function addEventListeners() {
     document.querySelectorAll('.toggle-task-checkbox').forEach(checkbox => {
         checkbox.addEventListener('change', (e) => {
             const li = e.target.closest('.todo-item');
-            const index = parseInt(li.dataset.index);
-            toggleTask(index);
+            toggleTask(li.dataset.id);
         });
     });
 
     document.querySelectorAll('.delete-task-btn').forEach(button => {
         button.addEventListener('click', (e) => {
             const li = e.target.closest('.todo-item');
-            const index = parseInt(li.dataset.index);
-            deleteTask(index);
+            deleteTask(li.dataset.id);
         });
     });
 
     document.querySelectorAll('.edit-task-btn').forEach(button => {
         button.addEventListener('click', (e) => {
             const li = e.target.closest('.todo-item');
-            const index = parseInt(li.dataset.index);
-            toggleEditMode(li, index);
+            toggleEditMode(li, li.dataset.id);
         });
     });
 
@@ -222,12 +429,14 @@ function addEventListeners() {
             if (draggedItem) {
                 draggedItem.classList.remove('dragging');
                 draggedItem = null;
-                // Re-renderizamos para actualizar los índices
                 renderTasks();
             }
         });
     });
+}
 
+// Los eventos de la lista se registran una sola vez, no en cada renderizado
+function addListDropListeners() {
     const todoList = document.getElementById('todo-list');
     todoList.addEventListener('dragover', (e) => {
         e.preventDefault();
@@ -247,13 +456,21 @@ function addEventListeners() {
         const draggingElement = document.querySelector('.dragging');
         if (!draggingElement) return;
 
-        const tasks = getTasks();
-        const newOrder = Array.from(todoList.children).map(li => {
-            const index = parseInt(li.dataset.index);
-            return tasks[index];
-        });
-
-        saveTasks(newOrder);
+        // Solo cambia la posición de la tarea movida: queda entre sus vecinas
+        const tasks = loadTodoTasks();
+        const previous = draggingElement.previousElementSibling;
+        const next = draggingElement.nextElementSibling;
+        const previousPosition = previous ? tasks.get(previous.dataset.id).position : null;
+        const nextPosition = next ? tasks.get(next.dataset.id).position : null;
+        let position = 0;
+        if (previousPosition !== null && nextPosition !== null) {
+            position = (previousPosition + nextPosition) / 2;
+        } else if (previousPosition !== null) {
+            position = previousPosition + 1;
+        } else if (nextPosition !== null) {
+            position = nextPosition - 1;
+        }
+        queueTodoOp({ op: 'upsert', id: draggingElement.dataset.id, position: position });
         // No necesitamos llamar a renderTasks aquí, ya se hace en dragend
     });
 }
@@ -280,12 +497,15 @@ function addTask() {
 
     if (taskText) {
         const tasks = getTasks();
-        tasks.push({
+        const lastPosition = tasks.length > 0 ? tasks[tasks.length - 1].position : 0;
+        queueTodoOp({
+            op: 'upsert',
+            id: newTaskId(),
             text: taskText,
             completed: false,
-            dueDate: dueDate || null
+            due_date: dueDate || null,
+            position: lastPosition + 1
         });
-        saveTasks(tasks);
         newTaskInput.value = '';
         newDueDateInput.value = '';
         renderTasks();
@@ -295,27 +515,24 @@ function addTask() {
     }
 }
 
-function toggleTask(index) {
-    const tasks = getTasks();
-    if (tasks[index]) {
-        tasks[index].completed = !tasks[index].completed;
-        saveTasks(tasks);
+function toggleTask(id) {
+    const task = loadTodoTasks().get(id);
+    if (task) {
+        queueTodoOp({ op: 'upsert', id: id, completed: !task.completed });
         renderTasks();
         //showStatusMessage('Estado de la tarea actualizado.', true);
     }
 }
 
-function deleteTask(index) {
-    const tasks = getTasks();
-    if (tasks[index]) {
-        tasks.splice(index, 1);
-        saveTasks(tasks);
+function deleteTask(id) {
+    if (loadTodoTasks().has(id)) {
+        queueTodoOp({ op: 'delete', id: id });
         renderTasks();
         //showStatusMessage('Tarea eliminada con éxito.', true);
     }
 }
 
-function toggleEditMode(li, index) {
+function toggleEditMode(li, id) {
     const taskTextSpan = li.querySelector('.task-text');
     const taskTextInput = li.querySelector('.task-input');
     const dueDateSpan = li.querySelector('span.text-xs.text-secondary.ml-4'); // Selecciona la etiqueta de la fecha
@@ -332,13 +549,10 @@ function toggleEditMode(li, index) {
         taskTextInput.focus();
         editBtn.innerHTML = `<svg xmlns="http://www.w3.org/2000/svg" class="h-6 w-6" viewBox="0 0 24 24" fill="currentColor"><path d="M17 3H5c-1.11 0-2 .9-2 2v14c0 1.1.89 2 2 2h14c1.1 0 2-.9 2-2V7l-4-4zm-5 16c-1.66 0-3-1.34-3-3s1.34-3 3-3 3 1.34 3 3-1.34 3-3 3z"/></svg>`;
     } else {
-        const tasks = getTasks();
         const newText = taskTextInput.value.trim();
         const newDueDate = dueDatePicker.value;
         if (newText !== "") {
-            tasks[index].text = newText;
-            tasks[index].dueDate = newDueDate || null;
-            saveTasks(tasks);
+            queueTodoOp({ op: 'upsert', id: id, text: newText, due_date: newDueDate || null });
             renderTasks();
             //showStatusMessage('Tarea editada con éxito.', true);
         } else {
@@ -350,9 +564,9 @@ function toggleEditMode(li, index) {
 }
 
 function clearCompletedTasks() {
-    const tasks = getTasks();
-    const incompleteTasks = tasks.filter(task => !task.completed);
-    saveTasks(incompleteTasks);
+    getTasks().filter(task => task.completed).forEach(task => {
+        queueTodoOp({ op: 'delete', id: task.id });
+    });
     renderTasks();
     showStatusMessage('Se han limpiado las tareas completadas.', true);
 }
@@ -363,7 +577,7 @@ async function copyTasks() {
         showStatusMessage('No hay tareas para copiar.', false);
         return;
     }
-    const tasksText = tasks.map(task => `${task.text}${task.dueDate ? ' - ' + new Date(task.dueDate).toLocaleDateString() : ''}`).join('\n');
+    const tasksText = tasks.map(task => `${task.text}${task.due_date ? ' - ' + new Date(task.due_date).toLocaleDateString() : ''}`).join('\n');
     try {
         if (navigator.clipboard && navigator.clipboard.writeText) {
             await navigator.clipboard.writeText(tasksText);
@@ -478,7 +692,14 @@ document.addEventListener('DOMContentLoaded', () => {
             addTask();
         }
     });
+    addListDropListeners();
     openTab('todo-list-content');
+    migrateLegacyTasks();
     renderTasks();
     setFilter(currentFilter); // Asegura que el botón de filtro inicial esté activo
+    // Sincroniza al cargar, al volver a la pestaña o recuperar la conexión y cada 30 segundos
+    syncTodos();
+    window.addEventListener('focus', () => scheduleSync(0));
+    window.addEventListener('online', () => scheduleSync(0));
+    setInterval(() => scheduleSync(0), 30000);
 });
\ No newline at end of file
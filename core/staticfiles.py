@@ -0,0 +1,168 @@
+"""
+Servicio de los ficheros estáticos desde el propio proceso de Django.
+
+Con DEBUG desactivado, `StaticFilesMiddleware` responde a las peticiones
+bajo `STATIC_URL` con los ficheros de `STATIC_ROOT` (los que deja
+`collectstatic`, ver core/storage.py) antes de pasar por el resto de
+middlewares:
+- Elige la versión precomprimida (.br o .gz) según `Accept-Encoding`.
+- Los nombres con hash del contenido no cambian nunca: se sirven con
+  `Cache-Control: immutable` y un año de caducidad, así que las visitas
+  repetidas no vuelven a pedirlos. El resto caduca en `STATIC_MAX_AGE`.
+- Responde 304 a `If-None-Match` con el ETag actual.
+
+El índice de ficheros se construye al recibir la primera petición y los
+ficheros de hasta `STATIC_MEMORY_MAX_SIZE` bytes se guardan en memoria; tras
+un `collectstatic` hay que reiniciar el proceso.
+"""
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from urllib.parse import unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+
+from .storage import ENCODING_SUFFIXES
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+@dataclass
+class StaticVariant:
+    """Una versión (sin comprimir o comprimida) de un fichero estático."""
+    path: str
+    size: int
+    etag: str
+    content: bytes = None
+
+
+@dataclass
+class StaticFile:
+    content_type: str
+    cache_control: str
+    # Codificación ('identity', 'br', 'gzip') -> StaticVariant
+    variants: dict = field(default_factory=dict)
+
+
+def _variant(path, encoding):
+    stat = os.stat(path)
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}-{encoding}"'
+    content = None
+    if stat.st_size <= settings.STATIC_MEMORY_MAX_SIZE:
+        with open(path, 'rb') as f:
+            content = f.read()
+    return StaticVariant(path, stat.st_size, etag, content)
+
+
+def build_index(root):
+    """Ficheros de `root` por nombre relativo (con barras '/'), con sus versiones comprimidas."""
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    suffixes = set(ENCODING_SUFFIXES.values())
+    index = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            stem, suffix = os.path.splitext(path)
+            if suffix in suffixes and os.path.exists(stem):
+                # Versión comprimida: va con su fichero original
+                continue
+            content_type, _ = mimetypes.guess_type(name)
+            static_file = StaticFile(
+                content_type=content_type or 'application/octet-stream',
+                cache_control=IMMUTABLE_CACHE_CONTROL if name in hashed else f'public, max-age={settings.STATIC_MAX_AGE}',
+            )
+            static_file.variants['identity'] = _variant(path, 'identity')
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                if os.path.exists(path + suffix):
+                    static_file.variants[encoding] = _variant(path + suffix, encoding)
+            index[name] = static_file
+    return index
+
+
+def accepted_encodings(header):
+    """Codificaciones aceptadas en una cabecera `Accept-Encoding` (sin las de q=0)."""
+    encodings = set()
+    for item in header.split(','):
+        encoding, *params = [part.strip() for part in item.split(';')]
+        quality = next((param[2:] for param in params if param.startswith('q=')), '1')
+        try:
+            quality = float(quality)
+        except ValueError:
+            quality = 1.0
+        if encoding and quality > 0:
+            encodings.add(encoding.lower())
+    return encodings
+
+
+class StaticFilesMiddleware:
+    """Sirve `STATIC_ROOT` con compresión negociada y caché inmutable (solo sin DEBUG)."""
+    sync_capable = True
+    async_capable = True
+
+    # Preferencia entre las versiones comprimidas disponibles
+    ENCODINGS = ('br', 'gzip')
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            # En desarrollo los sirve runserver desde las carpetas de origen
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else f'/{settings.STATIC_URL}'
+        self._index = None
+        self._lock = threading.Lock()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.serve(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return response if response is not None else await self.get_response(request)
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = build_index(str(settings.STATIC_ROOT))
+            return self._index
+
+    def serve(self, request):
+        """Respuesta con el fichero estático pedido, o None si la petición no es de uno."""
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        static_file = self.index.get(unquote(request.path[len(self.prefix):]))
+        if static_file is None:
+            return None
+
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        encoding = next((e for e in self.ENCODINGS if e in accepted and e in static_file.variants), 'identity')
+        variant = static_file.variants[encoding]
+
+        if variant.etag in (tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')):
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=static_file.content_type)
+            elif variant.content is not None:
+                response = HttpResponse(variant.content, content_type=static_file.content_type)
+            else:
+                response = FileResponse(open(variant.path, 'rb'), content_type=static_file.content_type)
+            response['Content-Length'] = variant.size
+        response['ETag'] = variant.etag
+        response['Cache-Control'] = static_file.cache_control
+        if len(static_file.variants) > 1:
+            response['Vary'] = 'Accept-Encoding'
+        if encoding != 'identity' and response.status_code == 200:
+            response['Content-Encoding'] = encoding
+        return response
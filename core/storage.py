@@ -0,0 +1,70 @@
+"""
+Almacenamiento de los ficheros estáticos para `collectstatic`.
+
+Sobre `ManifestStaticFilesStorage` (que añade el hash del contenido al
+nombre: css/style.3f2a9c1b04d7.css), guarda junto a cada fichero de texto
+sus versiones comprimidas con gzip (.gz) y, si está instalado el paquete
+`brotli`, con Brotli (.br). Se comprimen una sola vez al desplegar y
+`core.staticfiles.StaticFilesMiddleware` sirve la que acepte el navegador.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se genera la versión gzip
+    brotli = None
+
+# Extensiones que merece la pena comprimir (las imágenes y fuentes ya lo están)
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+# Por debajo de este tamaño la compresión no compensa
+MIN_COMPRESS_SIZE = 256
+# La versión comprimida solo se guarda si ocupa menos del 95 % del original
+MAX_COMPRESS_RATIO = 0.95
+
+
+def compress(content):
+    """Versiones comprimidas de `content` que compensan: {codificación: bytes}."""
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, quality=11)
+    return {
+        encoding: data for encoding, data in variants.items()
+        if len(data) < len(content) * MAX_COMPRESS_RATIO
+    }
+
+
+# Extensión de fichero de cada codificación
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Una entrada que falte en el manifiesto se sirve con su nombre sin hash
+    # en lugar de romper la página
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in {*paths, *self.hashed_files.values()}:
+            self._compress(name)
+
+    def _compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+            return
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        variants = compress(content)
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            path = self.path(name) + suffix
+            if encoding in variants:
+                with open(path, 'wb') as target:
+                    target.write(variants[encoding])
+            elif os.path.exists(path):
+                # De un collectstatic anterior, cuando sí compensaba
+                os.remove(path)
@@ -0,0 +1,45 @@
+import threading
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+# CSS de Tailwind compilado por `python manage.py build_css`
+TAILWIND_CSS = 'css/tailwind.css'
+TAILWIND_CDN = 'https://cdn.tailwindcss.com'
+# Configuración del CDN: el mismo modo oscuro por clase que tailwind.config.js
+TAILWIND_CDN_CONFIG = mark_safe("tailwind.config = {darkMode: 'class'}")
+
+
+def _tailwind_built():
+    return staticfiles_storage.exists(TAILWIND_CSS) or finders.find(TAILWIND_CSS) is not None
+
+
+# Etiqueta ya resuelta: se comprueba una sola vez por proceso si existe el
+# CSS compilado, así que tras `build_css` hay que reiniciar el proceso
+_tailwind_tag = None
+_tailwind_lock = threading.Lock()
+
+
+@register.simple_tag
+def tailwind_css():
+    """
+    Hoja de estilos de Tailwind compilada (con hash tras `collectstatic`).
+    Si aún no se ha ejecutado `build_css`, usa el CDN de Tailwind, que
+    compila las clases en el navegador.
+    """
+    global _tailwind_tag
+    with _tailwind_lock:
+        if _tailwind_tag is None:
+            if _tailwind_built():
+                _tailwind_tag = format_html('<link rel="stylesheet" href="{}">', static(TAILWIND_CSS))
+            else:
+                _tailwind_tag = format_html(
+                    '<script src="{}"></script>\n    <script>{}</script>', TAILWIND_CDN, TAILWIND_CDN_CONFIG
+                )
+        return _tailwind_tag
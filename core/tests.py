@@ -1,3 +1,1442 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDbSessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import auth, cache, classifier, coalesce, embeddings, llm, ratelimit, storage, todos
+from .analysis import chunk_tasks, run_eisenhower, split_usage
+from .auth import CachedModelBackend
+from .cache import DatabaseBackend
+from .classifier import NaiveBayes, classify_locally, heuristic_predict, load_user_model, training_examples
+from .coalesce import Coalescer
+from .jobs import claim_next_job, enqueue_job, process_job
+from .llm import estimate_tokens
+from .models import (
+    AnalysisJob, CategorySource, DailyPlan, DailyPlanRevision, EisenhowerCategory, LLMCacheEntry, Task, TaskDailyStats,
+    TaskEmbedding, TodoSyncState,
+)
+from .plans import content_hash, save_version, text_at_version
+from .ratelimit import RateLimiter
+from .staticfiles import StaticFilesMiddleware
+from .storage import CompressedManifestStaticFilesStorage
+from .templatetags import assets
+
+
+class ScriptedBackend:
+    """Backend del modelo para las pruebas: responde con `responses` en orden (la última se repite)."""
+    model_name = 'prueba'
+
+    def __init__(self, *responses, prompt_tokens=10, response_tokens=5):
+        self.responses = list(responses)
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.prompts = []
+
+    async def generate(self, prompt, response_schema=None):
+        self.prompts.append(prompt)
+        text = self.responses[min(len(self.prompts), len(self.responses)) - 1]
+        return llm.LLMResult(
+            text=text, model=self.model_name,
+            prompt_tokens=self.prompt_tokens, response_tokens=self.response_tokens,
+        )
+
+
+@contextmanager
+def use_backend(backend):
+    """Sustituye la pasarela del proceso por una que usa `backend` directamente."""
+    with mock.patch.object(llm, '_gateway', llm.LLMGateway(backend)), \
+            mock.patch.object(llm, '_gateway_pid', os.getpid()):
+        yield backend
+
+
+# Sin caché ni atajos locales: cada análisis llega al backend de la prueba
+analysis_settings = override_settings(
+    LLM_CACHE_BACKEND='none',
+    LOCAL_CLASSIFIER_ENABLED=False,
+    SIMILAR_TASKS_ENABLED=False,
+    RATE_LIMIT_ENABLED=False,
+)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Migra la app `core` hasta `migrate_from`, prepara datos y migra hasta `migrate_to`."""
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([('core', self.migrate_from)])
+        self.apps = self.executor.loader.project_state([('core', self.migrate_from)]).apps
+
+    def tearDown(self):
+        # Deja la base de datos con todas las migraciones para las demás pruebas
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('core', self.migrate_to)])
+        return executor.loader.project_state([('core', self.migrate_to)]).apps
+
+
+class EisenhowerCategoryMigrationTests(MigrationTestCase):
+    migrate_from = '0006_history_indexes'
+    migrate_to = '0007_task_eisenhower_category_enum'
+
+    LEGACY = {
+        'Urgente e Importante': 1,
+        '1. Urgente e Importante': 1,
+        '**No Urgente e Importante**': 3,
+        '"Urgente y No Importante".': 2,
+        '4. no urgente y no importante': 4,
+        '3': 3,
+        '2.': 2,
+        '7': 0,
+        'No especificada': 0,
+        'Otra cosa': 0,
+        '': 0,
+    }
+
+    def test_labels_become_numbers_without_overwriting(self):
+        Task = self.apps.get_model('core', 'Task')
+        user = self.apps.get_model('auth', 'User').objects.create(username='ana')
+        tasks = {
+            label: Task.objects.create(user_id=user.pk, description=label, eisenhower_category=label).pk
+            for label in self.LEGACY
+        }
+
+        Task = self.migrate().get_model('core', 'Task')
+        for label, number in self.LEGACY.items():
+            with self.subTest(label=label):
+                self.assertEqual(Task.objects.get(pk=tasks[label]).eisenhower_category, number)
+
+
+class PlanContentHashMigrationTests(MigrationTestCase):
+    migrate_from = '0015_analysisjob_token_usage'
+    migrate_to = '0016_dailyplan_content_hash_backfill'
+
+    def test_legacy_plans_get_their_hash(self):
+        DailyPlan = self.apps.get_model('core', 'DailyPlan')
+        user = self.apps.get_model('auth', 'User').objects.create(username='ana')
+        plan = DailyPlan.objects.create(user_id=user.pk, plan_text='- Revisar correo\n- Escribir informe\n')
+        # Espacios, líneas vacías y líneas repetidas seguidas: la copia de la migración normaliza igual
+        messy = DailyPlan.objects.create(
+            user_id=user.pk, plan_text='  - Revisar   correo\n\n- Escribir informe\n- escribir informe\n'
+        )
+
+        DailyPlan = self.migrate().get_model('core', 'DailyPlan')
+        self.assertEqual(DailyPlan.objects.get(pk=messy.pk).content_hash, content_hash(plan.plan_text))
+        self.assertEqual(DailyPlan.objects.get(pk=plan.pk).content_hash, content_hash(plan.plan_text))
+
+
+class DatabaseCacheBackendTests(TestCase):
+    async def test_hit_only_touches_stale_entries(self):
+        backend = DatabaseBackend()
+        await backend.aset('clave', {'text': 'hola'}, ttl=60)
+        entry = await LLMCacheEntry.objects.aget(key='clave')
+
+        self.assertEqual(await backend.aget('clave'), {'text': 'hola'})
+        self.assertEqual((await LLMCacheEntry.objects.aget(key='clave')).accessed_at, entry.accessed_at)
+
+        stale = timezone.now() - timedelta(hours=1)
+        await LLMCacheEntry.objects.filter(key='clave').aupdate(accessed_at=stale)
+        self.assertEqual(await backend.aget('clave'), {'text': 'hola'})
+        self.assertGreater((await LLMCacheEntry.objects.aget(key='clave')).accessed_at, stale)
+        self.assertIsNone(await backend.aget('otra'))
+
+
+@analysis_settings
+class AnalysisJobTests(TestCase):
+    async def test_invalid_structured_response_fails_without_retry(self):
+        user = await User.objects.acreate(username='ana')
+        await enqueue_job(user, 'eisenhower', {'task': 'Pagar el alquiler'})
+        with use_backend(ScriptedBackend('no es JSON')):
+            job = await process_job(await claim_next_job(), max_attempts=3)
+
+        self.assertEqual(job.status, AnalysisJob.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNone(await claim_next_job())
+        self.assertEqual(await Task.objects.filter(user=user).acount(), 1)
+
+    async def test_transient_error_is_retried(self):
+        class FailingBackend(ScriptedBackend):
+            async def generate(self, prompt, response_schema=None):
+                raise ConnectionError('sin conexión')
+
+        user = await User.objects.acreate(username='ana')
+        await enqueue_job(user, 'laborit', {'tasks': ['Pagar el alquiler']})
+        with use_backend(FailingBackend()):
+            job = await process_job(await claim_next_job(), max_attempts=3)
+
+        self.assertEqual(job.status, AnalysisJob.PENDING)
+        self.assertEqual((await claim_next_job()).pk, job.pk)
+
+
+@analysis_settings
+class LocalClassifierTests(TestCase):
+    async def test_local_and_reused_categories_are_not_training_data(self):
+        user = await User.objects.acreate(username='ana')
+        with use_backend(ScriptedBackend(
+            '{"task": "Pagar el alquiler", "category": "Urgente e Importante", "justification": "Vence hoy."}'
+        )):
+            await run_eisenhower(user, 'Pagar el alquiler')
+        # Un modelo del usuario que coincide con las reglas: se clasifica sin llamar al modelo
+        model = NaiveBayes.train([('Pagar la factura hoy', 1), ('Ver una serie', 4)])
+        with override_settings(LOCAL_CLASSIFIER_ENABLED=True), \
+                mock.patch.dict(classifier._models, {user.pk: (time.monotonic(), model)}):
+            await run_eisenhower(user, 'Pagar la factura del médico hoy')
+        await Task.objects.acreate(
+            user=user, description='Llamar al banco', eisenhower_category=EisenhowerCategory.NOT_URGENT_IMPORTANT,
+            category_source=CategorySource.MANUAL,
+        )
+
+        sources = [source async for source in Task.objects.order_by('id').values_list('category_source', flat=True)]
+        self.assertEqual(sources, [CategorySource.LLM, CategorySource.LOCAL, CategorySource.MANUAL])
+        self.assertEqual(await sync_to_async(training_examples)(user), [
+            ('Pagar el alquiler', EisenhowerCategory.URGENT_IMPORTANT),
+            ('Llamar al banco', EisenhowerCategory.NOT_URGENT_IMPORTANT),
+        ])
+
+    def test_negated_or_conflicting_signals_are_not_urgent_important(self):
+        for text in (
+            'no hace falta llamar hoy al cliente',
+            'ya lo haré algún día: preparar presentación del cliente',
+            'pagar netflix hoy sin falta, no es para el cliente',
+        ):
+            with self.subTest(text=text):
+                prediction = heuristic_predict(text)
+                self.assertNotEqual(prediction and prediction.category, EisenhowerCategory.URGENT_IMPORTANT)
+
+    @override_settings(LOCAL_CLASSIFIER_ENABLED=True)
+    async def test_rules_alone_never_skip_the_model(self):
+        user = await User.objects.acreate(username='ana')
+        # Sin modelo del usuario, ni siquiera una tarea evidente se resuelve localmente
+        self.assertIsNone(await classify_locally(user, 'Pagar la factura del médico hoy'))
+        disagreeing = NaiveBayes.train([('Pagar la factura hoy', 4), ('Ver una serie', 1)] * 5)
+        with mock.patch.dict(classifier._models, {user.pk: (time.monotonic(), disagreeing)}):
+            self.assertIsNone(await classify_locally(user, 'Pagar la factura del médico hoy'))
+
+    async def test_model_cache_is_bounded(self):
+        users = [await User.objects.acreate(username=f'usuario{i}') for i in range(5)]
+        with mock.patch.object(classifier, '_MODEL_CACHE_SIZE', 3), mock.patch.object(classifier, '_models', OrderedDict()):
+            for user in users:
+                await load_user_model(user)
+            self.assertEqual(list(classifier._models), [user.pk for user in users[-3:]])
+
+
+class RateLimiterTests(TestCase):
+    async def test_burst_then_wait(self):
+        limiter = RateLimiter(ratelimit.MemoryBackend())
+        for _ in range(3):
+            self.assertIsNone(await limiter.take(('user:1', 1, 3)))
+        key, retry_after = await limiter.take(('user:1', 1, 3))
+        self.assertEqual(key, 'user:1')
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 1)
+
+    async def test_rejected_request_does_not_charge_other_buckets(self):
+        limiter = RateLimiter(ratelimit.MemoryBackend())
+        self.assertIsNone(await limiter.take(('global', 1, 1)))
+        for _ in range(3):
+            key, _ = await limiter.take(('user:1', 1, 2), ('global', 1, 1))
+            self.assertEqual(key, 'global')
+        self.assertIsNone(await limiter.backend.aget('user:1'))
+
+    async def test_memory_backend_prunes_expired_keys(self):
+        backend = ratelimit.MemoryBackend(prune_every=2)
+        await backend.aset('viejo', 1, ttl=-1)
+        await backend.aincr('budget:1', 10, ttl=60)
+        self.assertEqual(list(backend._data), ['budget:1'])
+        self.assertEqual(await backend.aincr('budget:1', 5, ttl=60), 15)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_django_backend_requires_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ratelimit.DjangoCacheBackend('shared')
+        with self.assertRaises(ImproperlyConfigured):
+            ratelimit.DjangoCacheBackend('default')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_shared_cache'},
+})
+class SharedRateLimiterTests(TransactionTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+
+    async def test_limits_are_shared_between_limiters(self):
+        # Dos limitadores con su propio backend, como dos procesos
+        first = RateLimiter(ratelimit.DjangoCacheBackend('shared'))
+        second = RateLimiter(ratelimit.DjangoCacheBackend('shared'))
+        self.assertIsNone(await first.take(('user:1', 1, 2)))
+        self.assertIsNone(await second.take(('user:1', 1, 2)))
+        self.assertEqual((await first.take(('user:1', 1, 2)))[0], 'user:1')
+
+        await first.add_tokens(1, 100)
+        self.assertEqual(await second.add_tokens(1, 50), 150)
+        self.assertEqual(await first.tokens_used(1), 150)
+
+
+class SessionTests(TestCase):
+    def test_session_flushed_by_another_process_is_rejected(self):
+        user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/tasks/history/').status_code, 200)
+        # Otro proceso cierra la sesión: borra la fila, pero no la caché de este
+        Session.objects.filter(session_key=self.client.session.session_key).delete()
+        self.assertEqual(self.client.get('/api/tasks/history/').status_code, 302)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_shared_cache'},
+    },
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    SESSION_CACHE_ALIAS='shared',
+)
+class SharedSessionTests(TransactionTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+
+    def test_session_flushed_by_another_process_is_rejected(self):
+        user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/tasks/history/').status_code, 200)
+        # Otro proceso cierra la sesión con su propio SessionStore: borra la fila y la caché compartida
+        CachedDbSessionStore().delete(self.client.session.session_key)
+        self.assertEqual(self.client.get('/api/tasks/history/').status_code, 302)
+
+
+class CachedUserTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.backend = CachedModelBackend()
+        patcher = mock.patch.object(auth, '_users', OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_users_are_cached_per_process_without_a_shared_cache(self):
+        self.assertEqual(self.backend.get_user(str(self.user.pk)).username, 'ana')
+        # Un cambio que no pasa por save() no invalida la caché
+        User.objects.filter(pk=self.user.pk).update(first_name='Ana')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk).first_name, '')
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    @override_settings(AUTH_USER_CACHE_ALIAS='default')
+    def test_per_process_cache_alias_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.backend.get_user(self.user.pk)
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_shared_cache'},
+    },
+    AUTH_USER_CACHE_ALIAS='shared',
+)
+class SharedCachedUserTests(TransactionTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.backend = CachedModelBackend()
+        patcher = mock.patch.object(auth, '_users', OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changes_saved_by_another_process_apply_at_once(self):
+        self.assertEqual(self.backend.get_user(self.user.pk).username, 'ana')
+        User.objects.filter(pk=self.user.pk).update(first_name='Ana')
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, '')
+        self.assertEqual(auth._users, {})
+        # Otro proceso desactiva al usuario: borra su entrada de la caché compartida
+        other = User.objects.get(pk=self.user.pk)
+        other.is_active = False
+        other.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    async def test_async_lookup_uses_the_shared_cache(self):
+        self.assertEqual((await self.backend.aget_user(self.user.pk)).username, 'ana')
+        await User.objects.filter(pk=self.user.pk).aupdate(first_name='Ana')
+        self.assertEqual((await self.backend.aget_user(self.user.pk)).first_name, '')
+        await sync_to_async(self.user.delete)()
+        self.assertIsNone(await self.backend.aget_user(self.user.pk))
+
+
+class MetricsTests(TestCase):
+    def test_metrics_are_denied_without_token(self):
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic('BREW', '/metrics')
+        text = self.client.get('/metrics', headers={'Authorization': 'Bearer secreto'}).content.decode()
+        self.assertIn('method="other"', text)
+        self.assertNotIn('BREW', text)
+
+
+class StreamingBackend(ScriptedBackend):
+    """Backend que responde a trozos; con `fail_after` falla tras ese número de trozos."""
+
+    def __init__(self, *chunks, fail_after=None):
+        super().__init__(''.join(chunks))
+        self.chunks = chunks
+        self.fail_after = fail_after
+
+    async def stream(self, prompt):
+        self.prompts.append(prompt)
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise llm.LLMUnavailableError("El modelo se cortó.")
+            yield chunk
+
+
+def parse_events(body):
+    """(evento, datos) de cada evento SSE de `body`."""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if block:
+            event, data = block.split('\n')
+            events.append((event.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+    return events
+
+
+@analysis_settings
+class StreamingAnalysisTests(TestCase):
+    async def stream(self, endpoint, data):
+        user, _ = await User.objects.aget_or_create(username='ana')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.post(
+            f'/api/{endpoint}/', {**data, 'stream': True}, content_type='application/json'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return parse_events(b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def test_chunks_then_done_with_the_full_text(self):
+        with use_backend(StreamingBackend('- Tarea sugerida: ', 'Pagar <b>el</b> alquiler')):
+            events = await self.stream('laborit', {'tasks': 'Pagar el alquiler\nEstudiar'})
+        self.assertEqual(events, [
+            ('chunk', {'text': '- Tarea sugerida: '}),
+            ('chunk', {'text': 'Pagar <b>el</b> alquiler'}),
+            ('done', {'result': '- Tarea sugerida: Pagar <b>el</b> alquiler'}),
+        ])
+
+    async def test_cached_response_is_replayed_without_calling_the_model(self):
+        backend = StreamingBackend('Categoría: ', 'Urgente e Importante')
+        with override_settings(LLM_CACHE_BACKEND='memory'), mock.patch.object(cache, '_response_cache', None), \
+                use_backend(backend):
+            first = await self.stream('eisenhower', {'task': 'Renovar el pasaporte'})
+            again = await self.stream('eisenhower', {'task': 'Renovar el pasaporte'})
+        self.assertEqual(len(backend.prompts), 1)
+        self.assertEqual(first[-1], ('done', {'result': 'Categoría: Urgente e Importante'}))
+        self.assertEqual(again, [
+            ('chunk', {'text': 'Categoría: Urgente e Importante'}),
+            ('done', {'result': 'Categoría: Urgente e Importante'}),
+        ])
+        self.assertEqual(await Task.objects.filter(eisenhower_category=EisenhowerCategory.URGENT_IMPORTANT).acount(), 2)
+
+    async def test_backend_error_mid_stream_ends_with_error(self):
+        with use_backend(StreamingBackend('Categoría: ', 'Urgente e Importante', fail_after=1)):
+            events = await self.stream('eisenhower', {'task': 'Renovar el pasaporte'})
+        self.assertEqual(events[0], ('chunk', {'text': 'Categoría: '}))
+        self.assertEqual(events[-1], ('error', {'error': 'El modelo se cortó.'}))
+        self.assertNotIn('done', [event for event, _ in events])
+        # La tarea solo se guarda si el stream termina
+        self.assertFalse(await Task.objects.aexists())
+
+
+class CoalescerTests(TestCase):
+    async def test_identical_requests_share_one_call(self):
+        coalescer = Coalescer()
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return llm.LLMResult(text='respuesta', model='prueba', prompt_tokens=10, response_tokens=5)
+
+        results = await asyncio.gather(*(coalescer.run('clave', generate) for _ in range(5)))
+        self.assertEqual(calls, 1)
+        self.assertEqual({result.text for result in results}, {'respuesta'})
+        # Solo la líder cuenta tokens: las demás reciben el resultado como cacheado
+        self.assertEqual(sum(not result.cached for result in results), 1)
+
+    async def test_followers_receive_the_leader_error(self):
+        coalescer = Coalescer()
+
+        async def generate():
+            await asyncio.sleep(0.05)
+            raise llm.LLMUnavailableError('caído')
+
+        results = await asyncio.gather(*(coalescer.run('clave', generate) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, llm.LLMUnavailableError) for result in results))
+        self.assertEqual(coalescer._flights, {})
+
+    async def test_followers_stream_the_leader_chunks(self):
+        coalescer = Coalescer()
+
+        async def produce():
+            for word in ('uno ', 'dos ', 'tres'):
+                await asyncio.sleep(0.01)
+                yield word
+            yield llm.LLMResult(text='uno dos tres', model='prueba')
+
+        async def collect():
+            return [item async for item in coalescer.stream('clave', produce)]
+
+        leader, follower = await asyncio.gather(collect(), collect())
+        self.assertEqual(leader[:-1], ['uno ', 'dos ', 'tres'])
+        self.assertEqual(follower[:-1], ['uno ', 'dos ', 'tres'])
+        self.assertTrue(follower[-1].cached)
+
+    async def test_followers_retry_when_the_leader_is_cancelled(self):
+        coalescer = Coalescer()
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return llm.LLMResult(text='respuesta', model='prueba')
+
+        leader = asyncio.ensure_future(coalescer.run('clave', generate))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(coalescer.run('clave', generate))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        # La seguidora no hereda la cancelación: llama ella misma al modelo
+        self.assertEqual((await follower).text, 'respuesta')
+        self.assertEqual(calls, 2)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_shared_cache'},
+})
+class SharedCoalescerTests(TransactionTestCase):
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+
+    async def test_processes_share_one_call(self):
+        # Dos coalescers sobre la misma caché, como dos procesos
+        cache = caches['shared']
+        first = Coalescer(cache, wait_timeout=5, poll_interval=0.01)
+        second = Coalescer(cache, wait_timeout=5, poll_interval=0.01)
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return llm.LLMResult(text='respuesta', model='prueba')
+
+        results = await asyncio.gather(first.run('clave', generate), second.run('clave', generate))
+        self.assertEqual(calls, 1)
+        self.assertEqual([result.text for result in results], ['respuesta', 'respuesta'])
+
+    async def test_failed_leader_lets_another_process_call(self):
+        cache = caches['shared']
+        first = Coalescer(cache, wait_timeout=5, poll_interval=0.01)
+        second = Coalescer(cache, wait_timeout=5, poll_interval=0.01)
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            if calls == 1:
+                raise llm.LLMUnavailableError('caído')
+            return llm.LLMResult(text='respuesta', model='prueba')
+
+        failed, result = await asyncio.gather(
+            first.run('clave', generate), second.run('clave', generate), return_exceptions=True
+        )
+        self.assertIsInstance(failed, llm.LLMUnavailableError)
+        self.assertEqual((calls, result.text), (2, 'respuesta'))
+
+    def test_cross_process_coalescing_needs_a_shared_cache(self):
+        with mock.patch.object(coalesce, '_coalescer', None):
+            with override_settings(COALESCE_BACKEND='django', COALESCE_CACHE_ALIAS='shared'):
+                self.assertIs(coalesce.get_coalescer().cache, caches['shared'])
+        for alias in ('default', 'no-existe'):
+            with self.subTest(alias=alias), mock.patch.object(coalesce, '_coalescer', None), \
+                    override_settings(COALESCE_BACKEND='django', COALESCE_CACHE_ALIAS=alias):
+                with self.assertRaises(ImproperlyConfigured):
+                    coalesce.get_coalescer()
+
+
+class SlowBackend:
+    """Backend que tarda `delay` segundos y cuenta cuántas llamadas tiene a la vez."""
+    model_name = 'lento'
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+
+    async def generate(self, prompt, response_schema=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            with self.lock:
+                self.active -= 1
+        return llm.LLMResult(text='respuesta', model=self.model_name)
+
+
+class LLMGatewayTests(TestCase):
+    def test_concurrency_limit_covers_every_event_loop(self):
+        backend = SlowBackend(0.05)
+        gateway = llm.LLMGateway(backend, max_concurrency=2)
+        # Como bajo WSGI: cada hilo llama con su propio bucle de eventos
+        threads = [threading.Thread(target=gateway.generate_sync, args=('hola',)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(backend.peak, 2)
+
+    async def test_concurrency_limit_within_one_loop(self):
+        backend = SlowBackend(0.02)
+        gateway = llm.LLMGateway(backend, max_concurrency=3)
+        await asyncio.gather(*(gateway.generate('hola') for _ in range(8)))
+        self.assertEqual(backend.peak, 3)
+
+    async def test_timeout_raises_timeout_error_and_frees_the_slot(self):
+        gateway = llm.LLMGateway(SlowBackend(1), max_concurrency=1, timeout=0.05)
+        with self.assertRaises(llm.LLMTimeoutError):
+            await gateway.generate('hola')
+        gateway.backend.delay = 0
+        self.assertEqual((await gateway.generate('hola')).text, 'respuesta')
+
+
+class ResilientBackendTests(TestCase):
+    def build(self, *backends, **options):
+        options = {'max_retries': 1, 'retry_base_delay': 0, 'breaker_threshold': 2, 'breaker_reset': 60, **options}
+        return llm.ResilientBackend(list(backends), **options)
+
+    async def test_transient_errors_are_retried(self):
+        class Flaky(ScriptedBackend):
+            async def generate(self, prompt, response_schema=None):
+                if not self.prompts:
+                    self.prompts.append(prompt)
+                    raise ConnectionError('sin conexión')
+                return await super().generate(prompt, response_schema)
+
+        backend = Flaky('bien')
+        result = await self.build(backend).generate('hola')
+        self.assertEqual(result.text, 'bien')
+        self.assertEqual(len(backend.prompts), 2)
+
+    async def test_open_breaker_falls_back_to_the_next_model(self):
+        class Down(ScriptedBackend):
+            model_name = 'caido'
+
+            async def generate(self, prompt, response_schema=None):
+                self.prompts.append(prompt)
+                raise ConnectionError('sin conexión')
+
+        class Fallback(ScriptedBackend):
+            model_name = 'alternativo'
+
+        down, fallback = Down(), Fallback('alternativa')
+        resilient = self.build(down, fallback)
+        self.assertEqual((await resilient.generate('uno')).text, 'alternativa')
+        self.assertTrue(resilient.breakers['caido'].is_open)
+        # Con el circuito abierto ya no se llama al modelo caído
+        await resilient.generate('dos')
+        self.assertEqual(down.prompts, ['uno', 'uno'])
+
+    async def test_non_transient_errors_are_not_retried(self):
+        class Invalid(ScriptedBackend):
+            async def generate(self, prompt, response_schema=None):
+                self.prompts.append(prompt)
+                raise ValueError('petición no válida')
+
+        backend = Invalid()
+        with self.assertRaises(ValueError):
+            await self.build(backend).generate('hola')
+        self.assertEqual(len(backend.prompts), 1)
+
+    async def test_every_model_down_raises_unavailable(self):
+        class Down(ScriptedBackend):
+            async def generate(self, prompt, response_schema=None):
+                self.prompts.append(prompt)
+                raise ConnectionError('sin conexión')
+
+        backend = Down()
+        with self.assertRaises(llm.LLMUnavailableError):
+            await self.build(backend, breaker_threshold=5).generate('hola')
+        # El intento y su reintento
+        self.assertEqual(len(backend.prompts), 2)
+
+    def test_breaker_lets_one_probe_through_after_the_reset(self):
+        breaker = llm.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        with mock.patch.object(llm.time, 'monotonic', return_value=time.monotonic() + 31):
+            self.assertTrue(breaker.allow())
+            # Mientras la prueba está en curso, las demás llamadas se rechazan
+            self.assertFalse(breaker.allow())
+            # Si la prueba falla, el circuito sigue abierto otro periodo
+            breaker.record_failure()
+            self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertFalse(breaker.is_open)
+        self.assertTrue(breaker.allow())
+
+    async def test_slow_call_is_hedged(self):
+        class SlowFirst(ScriptedBackend):
+            async def generate(self, prompt, response_schema=None):
+                self.prompts.append(prompt)
+                if len(self.prompts) == 1:
+                    await asyncio.sleep(5)
+                return llm.LLMResult(text=f'llamada {len(self.prompts)}', model=self.model_name)
+
+        backend = SlowFirst()
+        started = time.monotonic()
+        result = await self.build(backend, hedge=True, hedge_min_delay=0.05).generate('hola')
+        self.assertEqual(result.text, 'llamada 2')
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class TailwindAssetTests(TestCase):
+    def test_built_css_is_resolved_once_per_process(self):
+        with mock.patch.object(assets, '_tailwind_tag', None):
+            with mock.patch.object(assets.staticfiles_storage, 'exists', return_value=False), \
+                    mock.patch.object(assets.finders, 'find', return_value=None):
+                fallback = assets.tailwind_css()
+            self.assertIn(assets.TAILWIND_CDN, fallback)
+            self.assertIn("darkMode: 'class'", fallback)
+            # Tras `build_css` el proceso sigue con el CDN hasta reiniciarse
+            with mock.patch.object(assets.staticfiles_storage, 'exists', return_value=True) as exists:
+                self.assertEqual(assets.tailwind_css(), fallback)
+            exists.assert_not_called()
+        with mock.patch.object(assets, '_tailwind_tag', None), \
+                mock.patch.object(assets.staticfiles_storage, 'exists', return_value=True):
+            self.assertIn('<link rel="stylesheet"', assets.tailwind_css())
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        static_settings = override_settings(DEBUG=False, STATIC_ROOT=self.root)
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+        # Como collectstatic: copia los ficheros y después los procesa
+        self.css = 'body { color: black; }\n' * 40
+        os.makedirs(os.path.join(self.root, 'css'))
+        for name, content in (('css/app.css', self.css), ('css/tiny.css', 'a{}')):
+            with open(os.path.join(self.root, name), 'w') as f:
+                f.write(content)
+        self.storage = CompressedManifestStaticFilesStorage(location=self.root)
+        paths = {name: (self.storage, name) for name in ('css/app.css', 'css/tiny.css')}
+        list(self.storage.post_process(paths))
+        self.hashed = self.storage.hashed_files['css/app.css']
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def get(self, name, **headers):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse('vista'))
+        return middleware(RequestFactory().get(f'/static/{name}', headers=headers))
+
+    def test_collectstatic_writes_compressed_variants(self):
+        with gzip.open(self.path(self.hashed) + '.gz', 'rt') as f:
+            self.assertEqual(f.read(), self.css)
+        self.assertEqual(os.path.exists(self.path(self.hashed) + '.br'), storage.brotli is not None)
+        # Los ficheros pequeños no se comprimen
+        self.assertFalse(os.path.exists(self.path(self.storage.hashed_files['css/tiny.css']) + '.gz'))
+
+    def test_encoding_is_negotiated(self):
+        with open(self.path(self.hashed) + '.br', 'wb') as f:
+            f.write(b'brotli')
+        cases = (
+            ('gzip, deflate, br', 'br'),
+            ('gzip, br;q=0', 'gzip'),
+            ('identity', None),
+            ('', None),
+        )
+        for accept, encoding in cases:
+            with self.subTest(accept=accept):
+                response = self.get(self.hashed, accept_encoding=accept)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(self.get(self.hashed, accept_encoding='br').content, b'brotli')
+        self.assertEqual(self.get(self.hashed).content.decode(), self.css)
+
+    def test_hashed_names_are_immutable(self):
+        hashed = self.get(self.hashed)
+        self.assertEqual(hashed['Cache-Control'], 'public, max-age=31536000, immutable')
+        unhashed = self.get('css/app.css')
+        self.assertEqual(unhashed['Cache-Control'], f'public, max-age={settings.STATIC_MAX_AGE}')
+        # Sin versión comprimida no hace falta Vary
+        self.assertNotIn('Vary', self.get(self.storage.hashed_files['css/tiny.css']))
+        self.assertEqual(self.get(self.hashed, if_none_match=hashed['ETag']).status_code, 304)
+        self.assertEqual(self.get('css/no-existe.css').content, b'vista')
+
+
+class HistoryPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(self.user)
+        moment = timezone.now()
+        tasks = Task.objects.bulk_create(Task(user=self.user, description=f'Tarea {i}') for i in range(5))
+        # Dos tareas con la misma fecha: el cursor las separa por id
+        for i, task in enumerate(tasks):
+            Task.objects.filter(pk=task.pk).update(created_at=moment - timedelta(minutes=i // 2))
+        self.ids = [task.pk for task in sorted(tasks, key=lambda task: task.pk)]
+
+    def test_pages_cover_every_task_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.client.get('/api/tasks/history/', params).json()
+            seen += [task['id'] for task in page['tasks']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), self.ids)
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get('/api/tasks/history/')
+        again = self.client.get('/api/tasks/history/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        Task.objects.create(user=self.user, description='Nueva')
+        changed = self.client.get('/api/tasks/history/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/tasks/history/', {'cursor': 'no-es-un-cursor'}).status_code, 400)
+
+    def test_tasks_added_while_paging_do_not_shift_pages(self):
+        first = self.client.get('/api/tasks/history/', {'limit': 2}).json()
+        # Una tarea nueva al principio no desplaza las páginas siguientes (con OFFSET se repetiría una)
+        Task.objects.create(user=self.user, description='Nueva')
+        seen, cursor = [task['id'] for task in first['tasks']], first['next_cursor']
+        while cursor:
+            page = self.client.get('/api/tasks/history/', {'limit': 2, 'cursor': cursor}).json()
+            seen += [task['id'] for task in page['tasks']]
+            cursor = page['next_cursor']
+        self.assertEqual(sorted(seen), self.ids)
+
+    def test_only_the_users_own_tasks_are_listed(self):
+        other = User.objects.create_user('luis', password='clave-segura-123')
+        Task.objects.create(user=other, description='De otro usuario')
+        Task.objects.create(user=self.user, description='Tarea de la lista', is_todo=True)
+        tasks = self.client.get('/api/tasks/history/', {'limit': 50}).json()['tasks']
+        self.assertEqual(sorted(task['id'] for task in tasks), self.ids)
+
+    def test_new_plan_version_changes_the_etag(self):
+        save_version(self.user, '- Revisar correo\n')
+        response = self.client.get('/api/daily-plans/history/')
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        save_version(self.user, '- Revisar correo\n- Llamar a Luis\n')
+        changed = self.client.get('/api/daily-plans/history/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['daily_plans'][0]['version'], 2)
+
+
+class TodoSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(self.user)
+
+    def sync(self, since=0, ops=()):
+        return self.client.post('/api/todos/sync/', {'since': since, 'ops': list(ops)}, content_type='application/json')
+
+    def test_each_sync_with_changes_bumps_the_version_once(self):
+        first = self.sync(ops=[
+            {'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'},
+            {'op': 'upsert', 'id': 'b', 'text': 'Llamar a Luis'},
+        ]).json()
+        self.assertEqual(first['version'], 1)
+        second = self.sync(1, [{'op': 'upsert', 'id': 'a', 'completed': True}]).json()
+        self.assertEqual(second['version'], 2)
+        self.assertEqual(second['changes'], [
+            {'id': 'a', 'text': 'Comprar pan', 'completed': True, 'due_date': None, 'position': 0.0},
+        ])
+        # Sin operaciones (o sin cambios reales) la versión no cambia
+        self.assertEqual(self.sync(2).json(), {'version': 2, 'reset': False, 'changes': []})
+        self.assertEqual(self.sync(2, [{'op': 'delete', 'id': 'no-existe'}]).json()['version'], 2)
+
+    def test_deletes_are_sent_as_tombstones(self):
+        self.sync(ops=[{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'}])
+        result = self.sync(1, [{'op': 'delete', 'id': 'a'}]).json()
+        self.assertEqual(result['changes'], [{'id': 'a', 'deleted': True}])
+        self.assertTrue(Task.objects.get(client_id='a').deleted)
+        # La primera sincronización de otro dispositivo no recibe los borrados
+        self.assertEqual(self.sync(0).json()['changes'], [])
+        # Actualizar una tarea borrada no la recupera; volver a crearla sí
+        self.assertEqual(self.sync(2, [{'op': 'upsert', 'id': 'a', 'completed': True}]).json()['changes'], [])
+        restored = self.sync(2, [{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'}]).json()
+        self.assertEqual(restored['changes'][0]['text'], 'Comprar pan')
+
+    @override_settings(TODO_TOMBSTONE_VERSIONS=2)
+    def test_client_older_than_the_kept_tombstones_is_reset(self):
+        self.sync(ops=[
+            {'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'},
+            {'op': 'upsert', 'id': 'b', 'text': 'Llamar a Luis'},
+        ])
+        self.sync(1, [{'op': 'delete', 'id': 'a'}])
+        for version in range(2, 5):
+            self.sync(version, [{'op': 'upsert', 'id': 'b', 'position': version}])
+        # La marca de borrado de 'a' (versión 2) ya se eliminó
+        self.assertFalse(Task.objects.filter(client_id='a').exists())
+        self.assertEqual(TodoSyncState.objects.get(user=self.user).pruned_version, 3)
+        stale = self.sync(1).json()
+        self.assertTrue(stale['reset'])
+        self.assertEqual([change['id'] for change in stale['changes']], ['b'])
+        self.assertFalse(self.sync(3).json()['reset'])
+
+    def test_client_newer_than_the_server_is_reset(self):
+        self.sync(ops=[{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'}])
+        result = self.sync(7).json()
+        self.assertTrue(result['reset'])
+        self.assertEqual([change['id'] for change in result['changes']], ['a'])
+
+    def test_invalid_requests_are_rejected_without_applying_anything(self):
+        too_many = [{'op': 'upsert', 'id': str(i), 'text': 'Tarea'} for i in range(todos.MAX_OPS + 1)]
+        for response in (
+            self.sync(ops=too_many),
+            self.sync(ops=[{'op': 'upsert', 'id': 'a', 'text': 'Válida'}, {'op': 'mover', 'id': 'b'}]),
+            self.sync(ops=[{'op': 'upsert', 'id': 'a', 'text': 'Tarea', 'due_date': 'mañana'}]),
+            self.sync(ops=[{'op': 'upsert', 'text': 'Sin id'}]),
+            self.sync(since=-1),
+            self.client.post('/api/todos/sync/', 'no es json', content_type='application/json'),
+            self.client.post('/api/todos/sync/', '[]', content_type='application/json'),
+        ):
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+        self.assertFalse(Task.objects.exists())
+
+    def test_two_clients_converge(self):
+        # Cada cliente guarda su copia y su versión como lo hace el navegador
+        copies, versions = [{}, {}], [0, 0]
+
+        def sync(client, ops=()):
+            result = self.sync(versions[client], ops).json()
+            if result['reset']:
+                copies[client].clear()
+            for change in result['changes']:
+                if change.get('deleted'):
+                    copies[client].pop(change['id'], None)
+                else:
+                    copies[client][change['id']] = change
+            versions[client] = result['version']
+
+        sync(0, [{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'}, {'op': 'upsert', 'id': 'b', 'text': 'Correo'}])
+        sync(1, [{'op': 'upsert', 'id': 'c', 'text': 'Llamar a Luis'}])
+        sync(0, [{'op': 'delete', 'id': 'b'}, {'op': 'upsert', 'id': 'c', 'completed': True}])
+        sync(1, [{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan integral'}])
+        sync(0)
+        self.assertEqual(copies[0], copies[1])
+        self.assertEqual(versions[0], versions[1])
+        self.assertEqual(sorted(copies[0]), ['a', 'c'])
+        self.assertEqual(copies[0]['a']['text'], 'Comprar pan integral')
+        self.assertTrue(copies[0]['c']['completed'])
+
+    def test_concurrent_create_of_the_same_id_becomes_an_update(self):
+        self.sync(ops=[{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan'}])
+        # Simula otra sincronización que creó 'a' después de leer las tareas
+        load_tasks = todos._load_tasks
+        with mock.patch.object(todos, '_load_tasks', side_effect=[{}, load_tasks(self.user, {'a'})]):
+            response = self.sync(1, [{'op': 'upsert', 'id': 'a', 'text': 'Comprar pan integral'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 2)
+        self.assertEqual(Task.objects.get(client_id='a').description, 'Comprar pan integral')
+
+
+class HistoryExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def round_trip(self, kind, fmt):
+        path = os.path.join(self.directory.name, f'{kind}.{fmt}')
+        call_command('export_history', kind, format=fmt, output=path, stderr=io.StringIO())
+        with open(path, encoding='utf-8') as f:
+            exported = f.read()
+        Task.objects.all().delete()
+        DailyPlan.objects.all().delete()
+        call_command('import_history', kind, path, user='ana', stdout=io.StringIO())
+        return exported
+
+    def test_plans_keep_every_field_and_version(self):
+        save_version(self.user, '- Revisar correo\n- Escribir informe\n', analysis='Primer análisis')
+        plan = save_version(self.user, '=Revisar correo\n- Escribir el informe\n', analysis='Segundo análisis')
+        moment = timezone.now() - timedelta(days=3)
+        DailyPlan.objects.filter(pk=plan.pk).update(created_at=moment, updated_at=moment)
+        DailyPlanRevision.objects.filter(plan=plan).update(created_at=moment)
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(fmt=fmt):
+                exported = self.round_trip('daily-plans', fmt)
+                imported = DailyPlan.objects.get()
+                self.assertEqual(
+                    (imported.day, imported.version, imported.plan_text, imported.analysis, imported.content_hash),
+                    (plan.day, 2, plan.plan_text, 'Segundo análisis', plan.content_hash),
+                )
+                self.assertEqual((imported.created_at, imported.updated_at), (moment, moment))
+                self.assertEqual(imported.revisions.get().created_at, moment)
+                self.assertEqual(text_at_version(imported, 1), '- Revisar correo\n- Escribir informe\n')
+                if fmt == 'csv':
+                    # Ninguna celda empieza por un carácter que la hoja de cálculo ejecutaría
+                    self.assertNotIn('\n=', exported)
+                    self.assertIn("'=Revisar", exported)
+
+    def test_export_view_includes_revisions(self):
+        save_version(self.user, '- Revisar correo\n')
+        save_version(self.user, '- Revisar correo\n- Llamar a Luis\n')
+        self.client.force_login(self.user)
+        response = self.client.get('/api/export/daily-plans/')
+        row = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((row['version'], [revision['version'] for revision in row['revisions']]), (2, [2]))
+
+    def test_plans_of_the_same_day_become_versions(self):
+        day = timezone.localdate()
+        rows = [
+            {'user': 'ana', 'day': day.isoformat(), 'plan_text': '- Revisar correo\n'},
+            {'user': 'ana', 'day': day.isoformat(), 'plan_text': '- Revisar correo\n- Llamar a Luis\n'},
+            {'user': 'ana', 'day': day.isoformat(), 'plan_text': '- Revisar correo\n- Llamar a Luis\n'},
+        ]
+        save_version(self.user, '- Ordenar la mesa\n')
+        path = os.path.join(self.directory.name, 'planes.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        call_command('import_history', 'daily-plans', path, stdout=io.StringIO())
+        plan = DailyPlan.objects.get()
+        self.assertEqual((plan.version, plan.plan_text), (3, '- Revisar correo\n- Llamar a Luis\n'))
+        self.assertEqual(text_at_version(plan, 1), '- Ordenar la mesa\n')
+
+    def test_tasks_keep_their_creation_date(self):
+        task = Task.objects.create(user=self.user, description='-1 llamadas pendientes')
+        moment = timezone.now() - timedelta(days=10)
+        Task.objects.filter(pk=task.pk).update(created_at=moment)
+        self.round_trip('tasks', 'csv')
+        imported = Task.objects.get()
+        self.assertEqual((imported.description, imported.created_at), ('-1 llamadas pendientes', moment))
+
+    def test_csv_keeps_cells_that_start_with_an_apostrophe(self):
+        descriptions = ["'=x", "'-5", "'hola", "'", '=SUMA(A1:A2)', '@Luis', "Día 'normal'"]
+        Task.objects.bulk_create(Task(user=self.user, description=description) for description in descriptions)
+        exported = self.round_trip('tasks', 'csv')
+        self.assertIn("''=x", exported)
+        self.assertEqual(list(Task.objects.order_by('id').values_list('description', flat=True)), descriptions)
+
+
+class FailingChunkBackend(ScriptedBackend):
+    """Clasifica cada lote salvo el que contiene `failing`, cuya llamada falla."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    async def generate(self, prompt, response_schema=None):
+        self.prompts.append(prompt)
+        if self.failing in prompt:
+            raise llm.LLMUnavailableError("Modelo no disponible.")
+        listing = re.findall(r'^\[(\d+)\] ', prompt, re.MULTILINE)
+        text = '\n'.join(f'[{number}] Urgente e Importante' for number in listing)
+        return llm.LLMResult(text=text, model=self.model_name, prompt_tokens=10, response_tokens=5)
+
+
+@analysis_settings
+class EisenhowerBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(self.user)
+
+    def post(self, data):
+        return self.client.post('/api/eisenhower/batch/', data, content_type='application/json')
+
+    def test_chunks_respect_the_budget_and_the_item_limit(self):
+        tasks = ['Pagar el alquiler', 'Estudiar', 'Llamar al banco', 'Ver una serie', 'Ir al gimnasio']
+        costs = [estimate_tokens(task) + 3 for task in tasks]
+        self.assertEqual(chunk_tasks(tasks, sum(costs), 2), [tasks[:2], tasks[2:4], tasks[4:]])
+        self.assertEqual(chunk_tasks(tasks, sum(costs[:3]), 10), [tasks[:3], tasks[3:]])
+        # Justo un token menos: la tercera tarea pasa al lote siguiente
+        self.assertEqual(chunk_tasks(tasks, sum(costs[:3]) - 1, 10)[0], tasks[:2])
+        # Una tarea que no cabe sola va en su propio lote
+        self.assertEqual(chunk_tasks(tasks[:2], 1, 10), [tasks[:1], tasks[1:2]])
+        self.assertEqual(chunk_tasks([], 100, 10), [])
+
+    @override_settings(LLM_BATCH_MAX_ITEMS=2)
+    def test_failed_chunk_does_not_lose_the_others(self):
+        backend = FailingChunkBackend(failing='Ver una serie')
+        with use_backend(backend):
+            response = self.post({'tasks': ['Pagar', 'Estudiar', 'Ver una serie', 'Leer']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(backend.prompts), 2)
+        results = response.json()['results']
+        self.assertEqual([result['category'] for result in results[:2]], ['Urgente e Importante'] * 2)
+        self.assertTrue(all('error' in result for result in results[2:]))
+        failed = Task.objects.get(description='Ver una serie')
+        self.assertEqual(
+            (failed.eisenhower_category, failed.category_source, failed.prompt_tokens),
+            (EisenhowerCategory.UNSPECIFIED, CategorySource.UNKNOWN, 0),
+        )
+        self.assertEqual(Task.objects.filter(category_source=CategorySource.LLM).count(), 2)
+
+    def test_all_chunks_failing_saves_nothing(self):
+        with use_backend(FailingChunkBackend(failing='[1]')):
+            response = self.post({'tasks': ['Pagar', 'Estudiar']})
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Task.objects.exists())
+
+    @override_settings(EISENHOWER_BATCH_MAX_TASKS=3)
+    def test_invalid_input_is_rejected(self):
+        for data in ({}, {'tasks': 'Pagar'}, {'tasks': []}, {'tasks': ['  ', '']}, {'tasks': ['a', 'b', 'c', 'd']}):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+        self.assertEqual(self.client.get('/api/eisenhower/batch/').status_code, 405)
+        self.assertFalse(Task.objects.exists())
+
+
+@analysis_settings
+class TokenUsageTests(TestCase):
+    def test_split_usage_keeps_the_total(self):
+        usages = split_usage(llm.LLMResult(text='', model='prueba', prompt_tokens=10, response_tokens=3), 4)
+        self.assertEqual([usage['prompt_tokens'] for usage in usages], [3, 3, 2, 2])
+        self.assertEqual([usage['response_tokens'] for usage in usages], [1, 1, 1, 0])
+
+    def test_batch_tasks_store_their_share_of_the_tokens(self):
+        user = User.objects.create_user('ana', password='clave-segura-123')
+        self.client.force_login(user)
+        backend = ScriptedBackend(
+            '[1] Urgente e Importante\n[2] No Urgente e Importante\n[3] No Urgente y No Importante',
+            prompt_tokens=100, response_tokens=31,
+        )
+        with use_backend(backend):
+            response = self.client.post(
+                '/api/eisenhower/batch/', {'tasks': ['Pagar', 'Estudiar', 'Ver una serie']}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        tasks = Task.objects.filter(user=user).order_by('id')
+        self.assertEqual(sum(task.prompt_tokens for task in tasks), 100)
+        self.assertEqual(sum(task.response_tokens for task in tasks), 31)
+        self.assertTrue(all(task.prompt_tokens for task in tasks))
+
+    async def test_laborit_job_stores_tokens(self):
+        user = await User.objects.acreate(username='ana')
+        await enqueue_job(user, 'laborit', {'tasks': ['Pagar el alquiler', 'Estudiar']})
+        with use_backend(ScriptedBackend('- Tarea sugerida: Pagar el alquiler', prompt_tokens=40, response_tokens=12)):
+            job = await process_job(await claim_next_job())
+        job = await AnalysisJob.objects.aget(pk=job.pk)
+        self.assertEqual((job.status, job.prompt_tokens, job.response_tokens), (AnalysisJob.DONE, 40, 12))
+
+    @override_settings(LLM_STRUCTURED_OUTPUT=False)
+    async def test_parallel_plan_day_job_stores_every_call(self):
+        user = await User.objects.acreate(username='ana')
+        await enqueue_job(user, 'plan-day', {'tasks': ['Pagar el alquiler', 'Estudiar']})
+        # La misma respuesta sirve para la clasificación, Laborit y Yerkes-Dodson
+        backend = ScriptedBackend(
+            '[1] Urgente e Importante\n[2] No Urgente e Importante\n- Tarea sugerida: Pagar el alquiler',
+            prompt_tokens=10, response_tokens=5,
+        )
+        with use_backend(backend):
+            job = await process_job(await claim_next_job())
+        job = await AnalysisJob.objects.aget(pk=job.pk)
+        self.assertEqual(len(backend.prompts), 3)
+        self.assertEqual((job.status, job.prompt_tokens, job.response_tokens), (AnalysisJob.DONE, 30, 15))
+        tasks = [task async for task in Task.objects.filter(user=user).order_by('id')]
+        self.assertEqual([(task.prompt_tokens, task.response_tokens) for task in tasks], [(5, 3), (5, 2)])
+        plan = await DailyPlan.objects.aget(user=user)
+        self.assertEqual((plan.prompt_tokens, plan.response_tokens), (20, 10))
+        self.assertEqual(await TaskDailyStats.objects.filter(user=user).acount(), 2)
+
+
+def day_plan_json(categories, first_task=1, schedule=('09:00 Pagar el alquiler',)):
+    """Respuesta estructurada del plan del día con `categories` (nombres) por orden."""
+    return json.dumps({
+        'tasks': [{'index': i, 'category': category} for i, category in enumerate(categories, start=1)],
+        'first_task': first_task,
+        'first_task_justification': 'Es la más difícil.',
+        'analysis': 'Carga moderada.',
+        'justification': 'Deja pausas.',
+        'schedule': list(schedule),
+    })
+
+
+@analysis_settings
+class PlanDayTests(TestCase):
+    tasks = ['Pagar el alquiler', 'Estudiar']
+
+    async def plan_day(self, tasks=None):
+        user, _ = await User.objects.aget_or_create(username='ana')
+        await self.async_client.aforce_login(user)
+        response = await self.async_client.post(
+            '/api/plan-day/', {'tasks': self.tasks if tasks is None else tasks}, content_type='application/json'
+        )
+        return response.status_code, response.json()
+
+    async def test_short_list_takes_one_structured_call(self):
+        backend = ScriptedBackend(day_plan_json(['Urgente e Importante', 'No Urgente e Importante']))
+        with use_backend(backend):
+            status, body = await self.plan_day()
+        self.assertEqual(status, 200)
+        self.assertEqual((body['mode'], body['llm_calls'], len(backend.prompts)), ('single', 1, 1))
+        self.assertEqual(
+            [(task['description'], task['category']) for task in body['tasks']],
+            [('Pagar el alquiler', 'Urgente e Importante'), ('Estudiar', 'No Urgente e Importante')],
+        )
+        self.assertEqual(body['first_task'], 'Pagar el alquiler')
+        self.assertIn('09:00 Pagar el alquiler', body['yerkes_dodson'])
+        plan = await DailyPlan.objects.aget()
+        self.assertEqual((plan.version, plan.analysis, plan.prompt_tokens), (1, body['yerkes_dodson'], 10))
+
+    @override_settings(DAY_PLAN_MAX_TASKS=1)
+    async def test_longer_list_takes_a_call_per_law(self):
+        backend = ScriptedBackend('[1] Urgente e Importante\n[2] No Urgente e Importante\n- Tarea sugerida: Estudiar')
+        with use_backend(backend):
+            status, body = await self.plan_day()
+        self.assertEqual(status, 200)
+        # Clasificación, Laborit y Yerkes-Dodson
+        self.assertEqual((body['mode'], body['llm_calls'], len(backend.prompts)), ('parallel', 3, 3))
+        self.assertEqual(body['first_task'], 'Estudiar')
+
+    async def test_unchanged_plan_reuses_its_analysis(self):
+        backend = ScriptedBackend(
+            day_plan_json(['Urgente e Importante', 'No Urgente e Importante']),
+            '[1] Urgente e Importante\n[2] No Urgente e Importante\n- Tarea sugerida: Pagar el alquiler',
+        )
+        with use_backend(backend):
+            _, first = await self.plan_day()
+            _, again = await self.plan_day(['- Pagar el alquiler', 'Estudiar  '])
+        # Solo la clasificación y Laborit: el plan de Yerkes-Dodson es el guardado
+        self.assertEqual((again['llm_calls'], len(backend.prompts)), (2, 3))
+        self.assertEqual(again['yerkes_dodson'], first['yerkes_dodson'])
+        self.assertEqual((await DailyPlan.objects.aget()).version, 1)
+
+    async def test_only_the_invalid_parts_are_requested_again(self):
+        # La categoría de la segunda tarea y la primera tarea no son válidas, ni tras la reparación
+        invalid = day_plan_json(['Urgente e Importante', 'Imprescindible'], first_task=7)
+        backend = ScriptedBackend(invalid, invalid, '[1] No Urgente e Importante\n- Tarea sugerida: Estudiar')
+        with use_backend(backend):
+            status, body = await self.plan_day()
+        self.assertEqual(status, 200)
+        # Llamada estructurada, reparación, un lote con la tarea que faltaba y Laborit
+        self.assertEqual((body['llm_calls'], len(backend.prompts)), (4, 4))
+        chunk_prompt = next(prompt for prompt in backend.prompts[2:] if '[1] Estudiar' in prompt)
+        self.assertNotIn('Pagar el alquiler', chunk_prompt)
+        self.assertEqual(
+            [task['category'] for task in body['tasks']], ['Urgente e Importante', 'No Urgente e Importante']
+        )
+        self.assertEqual(body['first_task'], 'Estudiar')
+        self.assertIn('09:00 Pagar el alquiler', body['yerkes_dodson'])
+        tasks = [task async for task in Task.objects.order_by('id')]
+        self.assertEqual([(task.prompt_tokens, task.response_tokens) for task in tasks], [(0, 0), (10, 5)])
+        plan = await DailyPlan.objects.aget()
+        # Las dos llamadas estructuradas y Laborit
+        self.assertEqual((plan.prompt_tokens, plan.response_tokens), (30, 15))
+
+    @override_settings(EISENHOWER_BATCH_MAX_TASKS=2)
+    async def test_invalid_requests_are_rejected(self):
+        for tasks in ([], '  \n ', ['Uno', 'Dos', 'Tres'], 7):
+            with self.subTest(tasks=tasks):
+                status, body = await self.plan_day(tasks)
+                self.assertEqual(status, 400)
+                self.assertIn('error', body)
+        self.assertEqual((await self.async_client.get('/api/plan-day/')).status_code, 405)
+
+
+@override_settings(SIMILAR_TASKS_ENABLED=True, SIMILAR_TASKS_THRESHOLD=0.85, EMBEDDING_BACKEND='hashing')
+class SimilarTaskTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            embeddings, _embedder=embeddings.HashingEmbedder(128), _indexes=OrderedDict(), _recent=OrderedDict()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_negated_task_does_not_reuse_the_category(self):
+        user = await User.objects.acreate(username='ana')
+        task = await Task.objects.acreate(
+            user=user, description='Revisar el contrato del proveedor antes de firmar',
+            eisenhower_category=EisenhowerCategory.URGENT_IMPORTANT, category_source=CategorySource.LLM,
+        )
+        await embeddings.index_tasks([task])
+
+        match = await embeddings.find_similar(user, 'revisar contrato proveedor antes de firmar')
+        self.assertEqual(match.task_id, task.pk)
+        # Supera el umbral, pero la negación cambia las señales de prioridad
+        negated = 'No revisar el contrato del proveedor antes de firmar'
+        vectors = embeddings.get_embedder().embed([task.description, negated])
+        self.assertGreater(float(vectors[0] @ vectors[1]), 0.85)
+        self.assertIsNone(await embeddings.find_similar(user, negated))
+
+    async def test_tasks_with_other_priority_signals_are_not_reused(self):
+        user = await User.objects.acreate(username='ana')
+        task = await Task.objects.acreate(
+            user=user, description='Revisar contrato proveedor acme',
+            eisenhower_category=EisenhowerCategory.NOT_URGENT_IMPORTANT, category_source=CategorySource.LLM,
+        )
+        await embeddings.index_tasks([task])
+        self.assertEqual((await embeddings.find_similar(user, 'revisar el contrato del proveedor')).task_id, task.pk)
+        for text in ('Revisar contrato proveedor acme hoy', 'Revisar contrato proveedor acme 2'):
+            self.assertIsNone(await embeddings.find_similar(user, text))
+
+    async def test_only_model_and_manual_categories_are_indexed(self):
+        user = await User.objects.acreate(username='ana')
+        tasks = [
+            await Task.objects.acreate(
+                user=user, description=f'Revisar contrato proveedor {name}',
+                eisenhower_category=EisenhowerCategory.NOT_URGENT_IMPORTANT, category_source=source,
+            )
+            for name, source in (
+                ('acme', CategorySource.LLM), ('beta', CategorySource.MANUAL),
+                ('gamma', CategorySource.REUSED), ('delta', CategorySource.LOCAL),
+            )
+        ]
+        await embeddings.index_tasks(tasks)
+        indexed = [task_id async for task_id in TaskEmbedding.objects.values_list('task_id', flat=True)]
+        self.assertEqual(sorted(indexed), [tasks[0].pk, tasks[1].pk])
+        # Tampoco se cargan los embeddings de una categoría reutilizada guardados antes
+        await TaskEmbedding.objects.acreate(
+            task=tasks[2], user=user, model=embeddings.get_embedder().name,
+            vector=embeddings.get_embedder().embed([tasks[2].description])[0].tobytes(),
+        )
+        embeddings._indexes.clear()
+        index = await embeddings.load_index(user)
+        self.assertEqual(sorted(index.task_ids[:index.size].tolist()), [tasks[0].pk, tasks[1].pk])
+
+    async def test_recent_embeddings_are_kept_in_lru_order(self):
+        with mock.patch.object(embeddings, '_RECENT_SIZE', 2):
+            for text in ('llamar al banco', 'pagar la renta', 'llamar al banco', 'comprar pan'):
+                await embeddings.embed_text(text)
+        self.assertEqual(list(embeddings._recent), ['llamar al banco', 'comprar pan'])
+
+    @override_settings(SIMILAR_TASKS_CACHE_VECTORS=2048)
+    async def test_index_cache_is_bounded(self):
+        users = [await User.objects.acreate(username=f'usuario{i}') for i in range(4)]
+        for user in users:
+            await embeddings.load_index(user)
+        # Cada índice vacío reserva 1024 vectores: caben los dos más recientes
+        self.assertEqual(list(embeddings._indexes), [user.pk for user in users[-2:]])
+
+
+@analysis_settings
+@override_settings(TIME_ZONE='America/Mexico_City')
+class TaskAnalyticsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana', password='clave-segura-123')
+        patcher = mock.patch.multiple(
+            embeddings, _embedder=embeddings.HashingEmbedder(128), _indexes=OrderedDict(), _recent=OrderedDict()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def snapshot(self):
+        return sorted(TaskDailyStats.objects.values_list('user_id', 'day', 'category', 'count'))
+
+    @override_settings(SIMILAR_TASKS_ENABLED=True, SIMILAR_TASKS_THRESHOLD=0.85)
+    async def test_rollups_match_a_rebuild_across_day_boundaries(self):
+        model = NaiveBayes.train([('Pagar la factura hoy', 1), ('Ver una serie', 4)])
+        backend = ScriptedBackend(
+            '{"task": "Revisar el contrato del proveedor", "category": "No Urgente e Importante", "justification": "."}'
+        )
+        # 23:30 del 28 de febrero en Ciudad de México (05:30 UTC del 1 de marzo), luego 00:30 del 1 de marzo
+        late, early = datetime.fromisoformat('2026-03-01T05:30Z'), datetime.fromisoformat('2026-03-01T06:30Z')
+        with use_backend(backend):
+            with mock.patch('django.utils.timezone.now', return_value=late):
+                await run_eisenhower(self.user, 'Revisar el contrato del proveedor')
+            # La transacción de la prueba no se confirma: el índice se recarga con el nuevo embedding
+            embeddings._indexes.clear()
+            with mock.patch('django.utils.timezone.now', return_value=early):
+                # Casi igual: se reutiliza la categoría
+                await run_eisenhower(self.user, 'revisar contrato proveedor')
+                with override_settings(LOCAL_CLASSIFIER_ENABLED=True), \
+                        mock.patch.dict(classifier._models, {self.user.pk: (time.monotonic(), model)}):
+                    await run_eisenhower(self.user, 'Pagar la factura del médico hoy')
+                # Las tareas de la lista no son tareas analizadas
+                await Task.objects.acreate(user=self.user, description='Comprar pan', is_todo=True)
+        self.assertEqual(len(backend.prompts), 1)
+        sources = [source async for source in Task.objects.filter(is_todo=False).order_by('id').values_list('category_source', flat=True)]
+        self.assertEqual(sources, [CategorySource.LLM, CategorySource.REUSED, CategorySource.LOCAL])
+
+        recorded = await sync_to_async(self.snapshot)()
+        self.assertEqual([(day.isoformat(), category, count) for _, day, category, count in recorded], [
+            ('2026-02-28', EisenhowerCategory.NOT_URGENT_IMPORTANT, 1),
+            ('2026-03-01', EisenhowerCategory.URGENT_IMPORTANT, 1),
+            ('2026-03-01', EisenhowerCategory.NOT_URGENT_IMPORTANT, 1),
+        ])
+        await sync_to_async(call_command)('rebuild_task_stats', stdout=io.StringIO())
+        self.assertEqual(await sync_to_async(self.snapshot)(), recorded)
+
+    def test_rebuild_of_one_user_keeps_the_others(self):
+        other = User.objects.create_user('luis', password='clave-segura-123')
+        for user in (self.user, other):
+            Task.objects.create(user=user, description='Llamar al banco', eisenhower_category=EisenhowerCategory.NOT_URGENT_IMPORTANT)
+        call_command('rebuild_task_stats', stdout=io.StringIO())
+        TaskDailyStats.objects.filter(user=other).update(count=7)
+        TaskDailyStats.objects.filter(user=self.user).delete()
+        call_command('rebuild_task_stats', user='ana', stdout=io.StringIO())
+        self.assertEqual(TaskDailyStats.objects.get(user=self.user).count, 1)
+        self.assertEqual(TaskDailyStats.objects.get(user=other).count, 7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_task_stats', user='nadie', stdout=io.StringIO())
+
+    def test_endpoint_groups_the_rollups_by_period(self):
+        self.client.force_login(self.user)
+        days = {'2026-03-02': 2, '2026-03-04': 1, '2026-03-09': 3}
+        TaskDailyStats.objects.bulk_create(
+            TaskDailyStats(user=self.user, day=day, category=EisenhowerCategory.URGENT_IMPORTANT, count=count)
+            for day, count in days.items()
+        )
+        TaskDailyStats.objects.create(user=self.user, day='2026-03-10', category=EisenhowerCategory.NOT_URGENT_NOT_IMPORTANT, count=4)
+        params = {'period': 'week', 'since': '2026-03-01', 'until': '2026-03-09'}
+        payload = self.client.get('/api/analytics/eisenhower/', params).json()
+        urgent = EisenhowerCategory.URGENT_IMPORTANT.label
+        self.assertEqual(payload['total'], 6)
+        self.assertEqual(payload['totals'][urgent], 6)
+        # Las semanas empiezan en lunes: 2 y 9 de marzo
+        self.assertEqual([(week['start'], week['counts'][urgent]) for week in payload['series']], [
+            ('2026-03-02', 3), ('2026-03-09', 3),
+        ])
+        for bad in ({'period': 'year'}, {'since': 'ayer'}, {'since': '2026-03-09', 'until': '2026-03-01'},
+                    {'since': '2020-01-01', 'until': '2026-03-01'}):
+            with self.subTest(params=bad):
+                self.assertEqual(self.client.get('/api/analytics/eisenhower/', bad).status_code, 400)
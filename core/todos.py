@@ -0,0 +1,180 @@
+"""
+Sincronización por deltas de la lista de tareas.
+
+El cliente identifica cada tarea con un id propio (`client_id`, un UUID) y
+envía solo las operaciones hechas desde la última sincronización junto con
+la última versión que conoce. El servidor aplica las operaciones, sube la
+versión del usuario una vez y devuelve solo las tareas que cambiaron desde
+la versión del cliente, así que el tamaño de cada sincronización depende de
+los cambios y no del tamaño de la lista.
+
+Operaciones:
+- `{"op": "upsert", "id": ..., "text": ..., "completed": ..., "due_date": ..., "position": ...}`
+  crea la tarea (con `text` obligatorio) o actualiza solo los campos enviados.
+- `{"op": "delete", "id": ...}` la borra (queda una marca para propagar el borrado).
+Si dos dispositivos cambian el mismo campo, gana la última sincronización.
+
+Las marcas de borrado se eliminan cuando tienen más de
+`TODO_TOMBSTONE_VERSIONS` versiones; un cliente que no sincroniza desde antes
+recibe la lista completa con `reset`.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import Task, TodoSyncState
+
+MAX_OPS = 500
+MAX_ID_LENGTH = 64
+
+
+def _parse_fields(op):
+    """Valida los campos editables de una operación y devuelve los presentes."""
+    fields = {}
+    if 'text' in op:
+        text = str(op['text'] or '').strip()
+        if not text:
+            raise ValueError("El texto de la tarea no puede estar vacío.")
+        fields['description'] = text
+    if 'completed' in op:
+        fields['completed'] = bool(op['completed'])
+    if 'due_date' in op:
+        try:
+            fields['due_date'] = date.fromisoformat(op['due_date']) if op['due_date'] else None
+        except (TypeError, ValueError):
+            raise ValueError(f"Fecha no válida: {op['due_date']!r}")
+    if 'position' in op:
+        try:
+            fields['position'] = float(op['position'])
+        except (TypeError, ValueError):
+            raise ValueError(f"Posición no válida: {op['position']!r}")
+    return fields
+
+
+def _validate(ops):
+    if not isinstance(ops, list):
+        raise ValueError("`ops` debe ser una lista.")
+    if len(ops) > MAX_OPS:
+        raise ValueError(f"Como máximo se pueden enviar {MAX_OPS} operaciones por sincronización.")
+    parsed = []
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in ('upsert', 'delete'):
+            raise ValueError("Cada operación debe ser un objeto con `op` 'upsert' o 'delete'.")
+        client_id = str(op.get('id') or '')
+        if not client_id or len(client_id) > MAX_ID_LENGTH:
+            raise ValueError("Cada operación necesita un `id` de tarea válido.")
+        parsed.append((op['op'], client_id, _parse_fields(op) if op['op'] == 'upsert' else {}))
+    return parsed
+
+
+def _load_tasks(user, client_ids):
+    return {
+        task.client_id: task
+        for task in Task.objects.filter(user=user, is_todo=True, client_id__in=client_ids)
+    }
+
+
+def _apply(user, parsed):
+    with transaction.atomic():
+        state, _ = TodoSyncState.objects.select_for_update().get_or_create(user=user)
+        if not parsed:
+            return state
+        version = state.version + 1
+
+        tasks = _load_tasks(user, {client_id for _, client_id, _ in parsed})
+        changed = {}
+        for kind, client_id, fields in parsed:
+            task = tasks.get(client_id)
+            if kind == 'delete':
+                if task is not None and not task.deleted:
+                    task.deleted = True
+                    changed[client_id] = task
+                continue
+            if task is None or task.deleted:
+                if 'description' not in fields:
+                    # Actualización de una tarea que ya no existe: se ignora
+                    continue
+                if task is None:
+                    task = Task(user=user, is_todo=True, client_id=client_id)
+                    tasks[client_id] = task
+                task.deleted = False
+            for name, value in fields.items():
+                setattr(task, name, value)
+            changed[client_id] = task
+
+        if not changed:
+            return state
+        for task in changed.values():
+            task.version = version
+        Task.objects.bulk_create([task for task in changed.values() if task.pk is None])
+        Task.objects.bulk_update(
+            [task for task in changed.values() if task.pk is not None],
+            ['description', 'completed', 'due_date', 'position', 'deleted', 'version'],
+        )
+        state.version = version
+        update_fields = ['version']
+        horizon = version - settings.TODO_TOMBSTONE_VERSIONS
+        if horizon > state.pruned_version:
+            Task.objects.filter(user=user, is_todo=True, deleted=True, version__lte=horizon).delete()
+            state.pruned_version = horizon
+            update_fields.append('pruned_version')
+        state.save(update_fields=update_fields)
+        return state
+
+
+def apply_ops(user, ops):
+    """
+    Aplica las operaciones en una transacción y devuelve el estado resultante.
+    Lanza ValueError si alguna operación no es válida (no se aplica ninguna).
+    """
+    parsed = _validate(ops)
+    try:
+        return _apply(user, parsed)
+    except IntegrityError:
+        # Otra sincronización creó a la vez una tarea con el mismo id: al
+        # repetir, la tarea ya existe y la operación la actualiza
+        return _apply(user, parsed)
+
+
+def serialize(task):
+    """Representación de una fila de `.values()` en la respuesta de sincronización."""
+    if task['deleted']:
+        return {'id': task['client_id'], 'deleted': True}
+    return {
+        'id': task['client_id'],
+        'text': task['description'],
+        'completed': task['completed'],
+        'due_date': task['due_date'].isoformat() if task['due_date'] else None,
+        'position': task['position'],
+    }
+
+
+def changes_since(user, since):
+    """Tareas de la lista que cambiaron después de la versión `since`."""
+    queryset = Task.objects.filter(user=user, is_todo=True, version__gt=since)
+    if not since:
+        # Primera sincronización: no hace falta enviar los borrados
+        queryset = queryset.filter(deleted=False)
+    rows = queryset.order_by('version', 'id').values(
+        'client_id', 'description', 'completed', 'due_date', 'position', 'deleted'
+    )
+    return [serialize(row) for row in rows]
+
+
+def sync(user, since, ops=None):
+    """
+    Aplica `ops` y devuelve la versión actual y los cambios desde `since`.
+    Si la versión del cliente es anterior a las marcas de borrado que se
+    conservan (se perdería algún borrado) o posterior a la del servidor (por
+    ejemplo, tras restaurar la base de datos), recibe la lista completa con
+    `reset` para que descarte su copia.
+    """
+    with transaction.atomic():
+        state = apply_ops(user, [] if ops is None else ops)
+        reset = since > state.version or 0 < since < state.pruned_version
+        return {
+            'version': state.version,
+            'reset': reset,
+            'changes': changes_since(user, 0 if reset else since),
+        }
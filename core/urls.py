@@ -9,10 +9,19 @@ urlpatterns = [
     
     # Endpoints de la API, ahora protegidos
     path('api/eisenhower/', views.analyze_eisenhower, name='analyze_eisenhower'),
+    path('api/eisenhower/batch/', views.analyze_eisenhower_batch, name='analyze_eisenhower_batch'),
     path('api/laborit/', views.analyze_laborit, name='analyze_laborit'),
     path('api/yerkes-dodson/', views.analyze_yerkes_dodson, name='analyze_yerkes_dodson'),
+    path('api/plan-day/', views.plan_day, name='plan_day'),
+    path('api/todos/sync/', views.todo_sync, name='todo_sync'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/llm-cache/stats/', views.llm_cache_stats, name='llm_cache_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     # Nuevos endpoints para el historial
     path('api/tasks/history/', views.tasks_history, name='tasks_history'),
     path('api/daily-plans/history/', views.daily_plans_history, name='daily_plans_history'),
+    path('api/daily-plans/<int:plan_id>/versions/', views.daily_plan_versions, name='daily_plan_versions'),
+    path('api/analytics/eisenhower/', views.eisenhower_analytics, name='eisenhower_analytics'),
+    path('api/export/<str:kind>/', views.export_history, name='export_history'),
 ]
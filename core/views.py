@@ -1,28 +1,120 @@
-import os
+import hmac
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
+from datetime import datetime, time, timedelta
 
-from django.http import JsonResponse
-from django.shortcuts import render, redirect
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from pydantic import ValidationError
 
-from .models import Task, DailyPlan # Importamos los modelos
+from .analysis import (
+    EISENHOWER_PROMPT, LABORIT_PROMPT,
+    chunk_tasks, classify_chunks, extract_category, plan_analysis, save_eisenhower_task, save_daily_plan,
+    run_eisenhower, run_laborit, run_yerkes_dodson, run_local_eisenhower, run_plan_day, normalize_day_tasks,
+    remember_tasks,
+)
+from .analytics import arecord_tasks, summarize as summarize_tasks
+from .cache import get_response_cache, make_key
+from .coalesce import get_coalescer
+from .exports import EXPORTS, FORMATS, aexport, export
+from .jobs import enqueue_job
+from . import metrics
+from .llm import get_gateway, estimate_tokens, LLMResult, LLMTimeoutError, LLMUnavailableError
+from .models import AnalysisJob, CategorySource, EisenhowerCategory, Task, DailyPlan # Importamos los modelos
+from .pagination import conditional_json_response, paginate_keyset
+from .plans import text_at_version
+from .prompts import compact_tasks
+from .ratelimit import rate_limited
+from .schemas import parse_category
+from .todos import sync as sync_todos
 
-# Carga las variables de entorno para la clave de API
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Asegúrate de que la clave de API está configurada
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY no está configurada en el archivo .env")
+def _sse(event, data):
+    """Formatea un evento de Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_analysis(endpoint, template, on_complete=None, **values):
+    """
+    Igual que `generate_analysis` (core/analysis.py), pero emite la respuesta
+    como eventos SSE ('chunk' por cada trozo, 'done' con el texto completo o
+    'error').
+    `on_complete(respuesta)` recibe el LLMResult y se espera al terminar el
+    stream, antes de 'done'. El stream no informa del uso, así que sus tokens
+    son estimados. Las peticiones idénticas en vuelo comparten el stream.
+    """
+    try:
+        gateway = get_gateway()
+        cache = get_response_cache()
+        key = make_key(endpoint, gateway.model_name, template, values)
+        cached = await cache.aget(key) if cache else None
+        if cached is not None:
+            response = cached
+            yield _sse('chunk', {'text': response.text})
+        else:
+            async def produce():
+                prompt = template.format(**values)
+                metrics.LLM_PROMPT_SIZE.observe(estimate_tokens(prompt), endpoint=endpoint)
+                parts = []
+                async for chunk in gateway.stream(prompt):
+                    parts.append(chunk)
+                    yield chunk
+                result_text = ''.join(parts)
+                result = LLMResult(
+                    text=result_text, model=gateway.model_name,
+                    prompt_tokens=estimate_tokens(prompt), response_tokens=estimate_tokens(result_text),
+                )
+                metrics.observe_endpoint_usage(endpoint, result)
+                yield result
+
+            coalescer = get_coalescer()
+            async for item in (coalescer.stream(key, produce) if coalescer else produce()):
+                if isinstance(item, LLMResult):
+                    response = item
+                else:
+                    yield _sse('chunk', {'text': item})
+            if cache and not response.cached:
+                await cache.aset(key, response)
+        if on_complete is not None:
+            await on_complete(response)
+        yield _sse('done', {'result': response.text})
+    except Exception as e:
+        yield _sse('error', {'error': str(e)})
+
+
+async def _single_event_stream(result_text):
+    """Eventos SSE para una respuesta que ya está completa."""
+    yield _sse('chunk', {'text': result_text})
+    yield _sse('done', {'result': result_text})
+
+
+def _event_stream_response(events):
+    """Respuesta HTTP para un generador de eventos SSE."""
+    return StreamingHttpResponse(
+        events,
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def _enqueue_response(user, kind, payload):
+    """Encola el análisis y responde 202 con el id del trabajo."""
+    job = await enqueue_job(user, kind, payload)
+    return JsonResponse({
+        "job_id": job.pk,
+        "status": job.status,
+        "status_url": reverse('job_status', args=[job.pk]),
+    }, status=202)
 
-# Configura la API de Google
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
 
 @login_required
 def index(request):
@@ -67,8 +159,13 @@ def logout_view(request):
 
 @login_required
 @csrf_exempt
-def analyze_eisenhower(request):
-    """Endpoint para la Matriz de Eisenhower. Ahora guarda la tarea."""
+@rate_limited
+async def analyze_eisenhower(request):
+    """
+    Endpoint para la Matriz de Eisenhower. Ahora guarda la tarea.
+    Con `"stream": true` responde con eventos SSE a medida que llega el texto;
+    con `"background": true` encola el análisis y devuelve el id del trabajo.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -76,45 +173,48 @@ def analyze_eisenhower(request):
             
             if not task_description:
                 return JsonResponse({"error": "La descripción de la tarea es obligatoria."}, status=400)
+
+            user = await request.auser()
+
+            if data.get('background'):
+                return await _enqueue_response(user, 'eisenhower', {'task': task_description})
+
+            if data.get('stream'):
+                # Las tareas evidentes se resuelven localmente, sin stream del modelo
+                local = await run_local_eisenhower(user, task_description)
+                if local is not None:
+                    return _event_stream_response(_single_event_stream(local.text))
+
+                # Creamos y guardamos la tarea cuando termina el stream
+                async def save_task(response):
+                    await save_eisenhower_task(user, task_description, extract_category(response.text), response)
+
+                return _event_stream_response(
+                    stream_analysis('eisenhower', EISENHOWER_PROMPT, on_complete=save_task, task=task_description)
+                )
+
+            response = await run_eisenhower(user, task_description)
             
-            prompt = f"""
-            Eres un experto en productividad que aplica la Matriz de Eisenhower.
-            Analiza la siguiente tarea y clasifícala en una de estas cuatro categorías:
-            1. Urgente e Importante
-            2. Urgente y No Importante
-            3. No Urgente e Importante
-            4. No Urgente y No Importante
-
-            Tarea: "{task_description}"
-
-            Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
-            - Tarea: [La tarea elegida]
-            - Categoría: [La categoría elegida]
-            - Justificación: [Una breve explicación]
-            """
-            response = model.generate_content(prompt)
-            result_text = response.text
-
-            # Extraemos la categoría del resultado de la IA
-            category_line = next((line for line in result_text.splitlines() if line.startswith('- Categoría:')), None)
-            category = category_line.split(':')[1].strip() if category_line else "No especificada"
-
-            # Creamos y guardamos la tarea en la base de datos
-            Task.objects.create(
-                user=request.user,
-                description=task_description,
-                eisenhower_category=category
-            )
-            
-            return JsonResponse({"result": result_text})
+            return JsonResponse({"result": response.text})
+        except ValidationError:
+            return JsonResponse({"error": "La respuesta del modelo no tiene el formato esperado."}, status=502)
+        except LLMTimeoutError as e:
+            return JsonResponse({"error": str(e)}, status=504)
+        except LLMUnavailableError as e:
+            return JsonResponse({"error": str(e)}, status=503)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Método no permitido."}, status=405)
 
 @login_required
 @csrf_exempt
-def analyze_laborit(request):
-    """Endpoint para la Ley de Laborit."""
+@rate_limited
+async def analyze_laborit(request):
+    """
+    Endpoint para la Ley de Laborit.
+    Con `"stream": true` responde con eventos SSE a medida que llega el texto;
+    con `"background": true` encola el análisis y devuelve el id del trabajo.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -122,30 +222,38 @@ def analyze_laborit(request):
             
             if not tasks_list:
                 return JsonResponse({"error": "La lista de tareas es obligatoria."}, status=400)
+
+            user = await request.auser()
+
+            if data.get('background'):
+                return await _enqueue_response(user, 'laborit', {'tasks': tasks_list})
+
+            if data.get('stream'):
+                return _event_stream_response(
+                    stream_analysis('laborit', LABORIT_PROMPT, tasks=compact_tasks(tasks_list))
+                )
                 
-            prompt = f"""
-            Eres un coach de productividad que aplica la Ley de Laborit (hacer lo más difícil primero) y la Ley de Pareto (80/20).
-            Analiza la siguiente lista de tareas, incluyendo su tiempo estimado, y determina cuál es la "tarea más difícil" o de mayor impacto.
-            Sugiere cuál debería ser la primera tarea del día para maximizar la productividad.
-            Justifica tu respuesta basándote en la Ley de Laborit.
-
-            Lista de tareas:
-            {tasks_list}
-
-            Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
-            - Tarea sugerida: [La tarea elegida]
-            - Justificación (Ley de Laborit y Pareto): [Una breve explicación]
-            """
-            response = model.generate_content(prompt)
+            response = await run_laborit(user, tasks_list)
             return JsonResponse({"result": response.text})
+        except LLMTimeoutError as e:
+            return JsonResponse({"error": str(e)}, status=504)
+        except LLMUnavailableError as e:
+            return JsonResponse({"error": str(e)}, status=503)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Método no permitido."}, status=405)
 
 @login_required
 @csrf_exempt
-def analyze_yerkes_dodson(request):
-    """Endpoint para la Ley de Yerkes-Dodson. Ahora guarda el plan."""
+@rate_limited
+async def analyze_yerkes_dodson(request):
+    """
+    Endpoint para la Ley de Yerkes-Dodson. Ahora guarda el plan como plan
+    de hoy, en versiones (core/plans.py): si no cambió responde con el
+    análisis guardado y si cambió poco lo analiza de forma incremental.
+    Con `"stream": true` responde con eventos SSE a medida que llega el texto;
+    con `"background": true` encola el análisis y devuelve el id del trabajo.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
@@ -153,42 +261,364 @@ def analyze_yerkes_dodson(request):
             
             if not daily_plan:
                 return JsonResponse({"error": "El plan diario es obligatorio."}, status=400)
+
+            user = await request.auser()
+
+            if data.get('background'):
+                return await _enqueue_response(user, 'yerkes-dodson', {'plan': daily_plan})
+
+            if data.get('stream'):
+                analysis = await plan_analysis(user, daily_plan)
+                if analysis.result is not None:
+                    # El plan de hoy no ha cambiado: su análisis ya está guardado
+                    return _event_stream_response(_single_event_stream(analysis.result.text))
+
+                # Guardamos el plan en la base de datos cuando termina el stream
+                async def save_plan(response):
+                    await save_daily_plan(user, daily_plan, response, analysis.incremental)
+
+                return _event_stream_response(
+                    stream_analysis(analysis.endpoint, analysis.template, on_complete=save_plan, **analysis.values)
+                )
                 
-            prompt = f"""
-            Eres un experto en el manejo de la energía y el rendimiento, basándote en la Ley de Yerkes-Dodson y la Ley de Illich.
-            Analiza el siguiente plan de trabajo diario e identifica si es óptimo o si podría llevar al agotamiento.
-            Sugiere un ajuste para el plan, justificándolo con ambas leyes.
-
-            Plan de trabajo:
-            {daily_plan}
-
-            Da tu respuesta en el siguiente formato, sin explicaciones adicionales:
-            - Análisis: [Una evaluación del plan]
-            - Justificación (Yerkes-Dodson e Illich: [Una breve explicación]
-            - Sugerencia (Yerkes-Dodson e Illich): [El plan ajustado con la lista de tareas]
-            """
-            response = model.generate_content(prompt)
-            result_text = response.text
-
-            # Guardamos el plan en la base de datos
-            DailyPlan.objects.create(
-                user=request.user,
-                plan_text=daily_plan
-            )
+            response = await run_yerkes_dodson(user, daily_plan)
             
-            return JsonResponse({"result": result_text})
+            return JsonResponse({"result": response.text})
+        except LLMTimeoutError as e:
+            return JsonResponse({"error": str(e)}, status=504)
+        except LLMUnavailableError as e:
+            return JsonResponse({"error": str(e)}, status=503)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse({"error": "Método no permitido."}, status=405)
+
+@login_required
+@csrf_exempt
+@rate_limited
+async def analyze_eisenhower_batch(request):
+    """
+    Endpoint para clasificar muchas tareas a la vez con la Matriz de Eisenhower.
+    Empaqueta las tareas en tan pocos prompts como permite el presupuesto de
+    tokens y guarda todas las tareas con un único `bulk_create`.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            tasks_list = data.get('tasks')
+
+            if not isinstance(tasks_list, list):
+                return JsonResponse({"error": "La lista de tareas es obligatoria."}, status=400)
+            # Aplanamos los espacios para que cada tarea ocupe una sola línea del prompt
+            tasks_list = [' '.join(str(task).split()) for task in tasks_list]
+            tasks_list = [task for task in tasks_list if task]
+            if not tasks_list:
+                return JsonResponse({"error": "La lista de tareas es obligatoria."}, status=400)
+            if len(tasks_list) > settings.EISENHOWER_BATCH_MAX_TASKS:
+                return JsonResponse({"error": f"Como máximo se pueden clasificar {settings.EISENHOWER_BATCH_MAX_TASKS} tareas por petición."}, status=400)
+
+            chunks = chunk_tasks(tasks_list, settings.LLM_BATCH_TOKEN_BUDGET, settings.LLM_BATCH_MAX_ITEMS)
+            # Si falla la llamada de un lote, sus tareas se guardan sin categoría y las demás se clasifican
+            results = await classify_chunks(chunks)
+            classified = [
+                (category, usage, result.error)
+                for result in results for category, usage in zip(result.categories, result.usages)
+            ]
+
+            # Guardamos todas las tareas con una sola inserción, cada una con su parte de los tokens del lote
+            user = await request.auser()
+            tasks = await Task.objects.abulk_create([
+                Task(
+                    user=user, description=task, eisenhower_category=category,
+                    category_source=CategorySource.UNKNOWN if error else CategorySource.LLM, **usage
+                )
+                for task, (category, usage, error) in zip(tasks_list, classified)
+            ])
+            await arecord_tasks(tasks)
+            await remember_tasks(tasks)
+
+            return JsonResponse({
+                "results": [
+                    {"task": task, "category": category.label, **({"error": str(error)} if error else {})}
+                    for task, (category, _, error) in zip(tasks_list, classified)
+                ],
+                "llm_calls": len(chunks),
+            })
+        except LLMTimeoutError as e:
+            return JsonResponse({"error": str(e)}, status=504)
+        except LLMUnavailableError as e:
+            return JsonResponse({"error": str(e)}, status=503)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "Método no permitido."}, status=405)
 
+@login_required
+@csrf_exempt
+@rate_limited
+async def plan_day(request):
+    """
+    Endpoint para planificar el día con la lista de tareas: categoría de
+    Eisenhower de cada tarea, primera tarea según Laborit y plan ajustado
+    según Yerkes-Dodson, en una sola llamada al modelo si la lista no es muy
+    larga (ver `run_plan_day`). Guarda las tareas y el plan diario.
+    Con `"background": true` encola el análisis y devuelve el id del trabajo.
+    """
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            tasks = data.get('tasks')
+            # Una lista o un texto con una tarea por línea
+            tasks = normalize_day_tasks(tasks) if isinstance(tasks, (list, str)) else []
+            if not tasks:
+                return JsonResponse({"error": "La lista de tareas es obligatoria."}, status=400)
+            if len(tasks) > settings.EISENHOWER_BATCH_MAX_TASKS:
+                return JsonResponse({"error": f"Como máximo se pueden planificar {settings.EISENHOWER_BATCH_MAX_TASKS} tareas por petición."}, status=400)
+
+            user = await request.auser()
+
+            if data.get('background'):
+                return await _enqueue_response(user, 'plan-day', {'tasks': tasks})
+
+            day_plan = await run_plan_day(user, tasks)
+            return JsonResponse({
+                "tasks": [
+                    {"id": task.pk, "description": task.description, "category": EisenhowerCategory(task.eisenhower_category).label}
+                    for task in day_plan.tasks
+                ],
+                "first_task": day_plan.first_task,
+                "laborit": day_plan.laborit,
+                "yerkes_dodson": day_plan.yerkes_dodson,
+                "daily_plan": {"id": day_plan.daily_plan.pk, "version": day_plan.daily_plan.version},
+                "mode": day_plan.mode,
+                "llm_calls": day_plan.llm_calls,
+                "result": day_plan.text,
+            })
+        except LLMTimeoutError as e:
+            return JsonResponse({"error": str(e)}, status=504)
+        except LLMUnavailableError as e:
+            return JsonResponse({"error": str(e)}, status=503)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse({"error": "Método no permitido."}, status=405)
+
+@login_required
+def job_status(request, job_id):
+    """Endpoint para consultar el estado y el resultado de un análisis encolado."""
+    job = get_object_or_404(AnalysisJob, pk=job_id, user=request.user)
+    return JsonResponse({
+        "job_id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result if job.status == AnalysisJob.DONE else None,
+        "error": job.error or None,
+        "attempts": job.attempts,
+        "prompt_tokens": job.prompt_tokens,
+        "response_tokens": job.response_tokens,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    })
+
+@staff_member_required
+def llm_cache_stats(request):
+    """Endpoint con los contadores de aciertos y fallos de la caché de respuestas."""
+    cache = get_response_cache()
+    if cache is None:
+        return JsonResponse({'enabled': False})
+    return JsonResponse({'enabled': True, **cache.stats()})
+
+@login_required
+@csrf_exempt
+def todo_sync(request):
+    """
+    Endpoint de sincronización de la lista de tareas (ver core/todos.py).
+    POST con `{"since": versión, "ops": [...]}` aplica las operaciones y
+    devuelve los cambios desde `since`; GET `?since=` solo consulta cambios.
+    """
+    if request.method == 'GET':
+        data, ops = request.GET, []
+    elif request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "El cuerpo debe ser JSON."}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "El cuerpo debe ser un objeto JSON."}, status=400)
+        ops = data.get('ops') or []
+    else:
+        return JsonResponse({"error": "Método no permitido."}, status=405)
+    try:
+        since = int(data.get('since') or 0)
+        if since < 0:
+            raise ValueError
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "El parámetro since debe ser un entero no negativo."}, status=400)
+    try:
+        return JsonResponse(sync_todos(request.user, since, ops))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+def metrics_view(request):
+    """
+    Endpoint con las métricas del proceso en el formato de texto de Prometheus.
+    Exige `Authorization: Bearer <token>` con `settings.METRICS_TOKEN`; sin
+    token configurado no responde a nadie.
+    """
+    if not settings.METRICS_ENABLED:
+        return JsonResponse({"error": "Las métricas están desactivadas."}, status=404)
+    if not settings.METRICS_TOKEN:
+        return JsonResponse({"error": "Define METRICS_TOKEN para consultar las métricas."}, status=403)
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+        return JsonResponse({"error": "No autorizado."}, status=401)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _history_params(request):
+    """
+    Lee los parámetros comunes de los historiales: `cursor`, `limit` y el
+    rango de fechas `since`/`until` (fecha o fecha y hora ISO 8601).
+    Lanza ValueError si alguno no es válido.
+    """
+    try:
+        limit = int(request.GET.get('limit', settings.HISTORY_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("El parámetro limit debe ser un número entero.")
+    if limit < 1:
+        raise ValueError("El parámetro limit debe ser mayor que cero.")
+    limit = min(limit, settings.HISTORY_MAX_PAGE_SIZE)
+
+    filters = {}
+    for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+        value = request.GET.get(param)
+        if not value:
+            continue
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"El parámetro {param} debe ser una fecha ISO 8601.")
+            if param == 'until':
+                # `until` con solo fecha incluye ese día completo
+                day += timedelta(days=1)
+            moment = datetime.combine(day, time.min)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        filters[lookup] = moment
+    return request.GET.get('cursor'), limit, filters
+
 @login_required
 def tasks_history(request):
-    """Endpoint para obtener el historial de tareas del usuario logueado."""
-    tasks = list(Task.objects.filter(user=request.user).order_by('-created_at').values('description', 'eisenhower_category', 'created_at'))
-    return JsonResponse({'tasks': tasks})
+    """
+    Endpoint para obtener el historial de tareas del usuario logueado.
+    Paginado por cursor: `limit`, `cursor` (el `next_cursor` de la página
+    anterior) y filtros opcionales `category`, `since` y `until`.
+    """
+    try:
+        cursor, limit, filters = _history_params(request)
+        queryset = Task.objects.filter(user=request.user, is_todo=False, **filters)
+        category = request.GET.get('category')
+        if category:
+            # Se acepta el nombre de la categoría o su número (0 = sin categoría)
+            parsed = EisenhowerCategory.UNSPECIFIED if category == '0' else parse_category(category)
+            if parsed is None:
+                raise ValueError("Categoría desconocida.")
+            queryset = queryset.filter(eisenhower_category=parsed)
+        tasks, next_cursor = paginate_keyset(
+            queryset.values('id', 'description', 'eisenhower_category', 'created_at'), cursor, limit
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    for task in tasks:
+        task['eisenhower_category'] = EisenhowerCategory(task['eisenhower_category']).label
+    last_modified = tasks[0]['created_at'] if tasks else None
+    return conditional_json_response(request, {'tasks': tasks, 'next_cursor': next_cursor}, last_modified)
 
 @login_required
 def daily_plans_history(request):
-    """Endpoint para obtener el historial de planes diarios del usuario logueado."""
-    daily_plans = list(DailyPlan.objects.filter(user=request.user).order_by('-created_at').values('plan_text', 'created_at'))
-    return JsonResponse({'daily_plans': daily_plans})
+    """
+    Endpoint para obtener el historial de planes diarios del usuario logueado.
+    Paginado por cursor igual que el historial de tareas (`limit`, `cursor`,
+    `since` y `until`).
+    """
+    try:
+        cursor, limit, filters = _history_params(request)
+        daily_plans, next_cursor = paginate_keyset(
+            DailyPlan.objects.filter(user=request.user, **filters).values(
+                'id', 'plan_text', 'created_at', 'day', 'version', 'updated_at',
+            ),
+            cursor, limit,
+        )
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    # Los planes se actualizan con cada versión: cuenta la última modificación de la página
+    last_modified = max((plan['updated_at'] for plan in daily_plans), default=None)
+    return conditional_json_response(request, {'daily_plans': daily_plans, 'next_cursor': next_cursor}, last_modified)
+
+@login_required
+def daily_plan_versions(request, plan_id):
+    """
+    Endpoint con las versiones de un plan diario: cada una con sus líneas
+    cambiadas respecto a la anterior (`diff`, ver core/plans.py). Con
+    `?version=n` devuelve además el texto completo de esa versión.
+    """
+    plan = get_object_or_404(DailyPlan, pk=plan_id, user=request.user)
+    payload = {
+        'id': plan.pk,
+        'day': plan.day,
+        'version': plan.version,
+        'versions': [{'version': 1, 'created_at': plan.created_at, 'diff': None}] + list(
+            plan.revisions.order_by('version').values(
+                'version', 'created_at', 'diff', 'incremental', 'prompt_tokens', 'response_tokens',
+            )
+        ),
+    }
+    version = request.GET.get('version')
+    if version:
+        if not version.isdigit():
+            return JsonResponse({"error": "El parámetro version debe ser un número de versión."}, status=400)
+        try:
+            payload['plan_text'] = text_at_version(plan, int(version))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+    return conditional_json_response(request, payload, plan.updated_at)
+
+@login_required
+def eisenhower_analytics(request):
+    """
+    Endpoint con las tareas analizadas por categoría, en total y por periodo,
+    calculadas a partir de las estadísticas diarias (core/analytics.py).
+    Parámetros opcionales: `period` ('day', 'week' o 'month') y el rango de
+    fechas `since`/`until` (ambas incluidas).
+    """
+    try:
+        dates = {}
+        for param in ('since', 'until'):
+            value = request.GET.get(param)
+            if value:
+                dates[param] = parse_date(value)
+                if dates[param] is None:
+                    raise ValueError(f"El parámetro {param} debe ser una fecha ISO 8601 (AAAA-MM-DD).")
+        payload = summarize_tasks(request.user, request.GET.get('period', 'day'), **dates)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return conditional_json_response(request, payload)
+
+@login_required
+def export_history(request, kind):
+    """
+    Endpoint que descarga el historial completo del usuario (`kind`: 'tasks'
+    o 'daily-plans') en NDJSON o CSV (`format`), generado en streaming por
+    bloques para que la memoria no dependa del tamaño del historial.
+    """
+    if kind not in EXPORTS:
+        return JsonResponse({"error": "Historial desconocido."}, status=404)
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"El parámetro format debe ser uno de: {', '.join(FORMATS)}."}, status=400)
+    # Django convierte en lista el iterador que no es del tipo del servidor (síncrono
+    # bajo WSGI, asíncrono bajo ASGI): elegimos el que puede servir en streaming
+    stream = aexport if isinstance(request, ASGIRequest) else export
+    extension = 'csv' if fmt == 'csv' else 'ndjson'
+    return StreamingHttpResponse(
+        stream(kind, fmt, request.user),
+        content_type=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{kind}.{extension}"'},
+    )
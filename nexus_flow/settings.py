@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.staticfiles.StaticFilesMiddleware',  # Los estáticos se sirven sin pasar por el resto
+    'core.metrics.MetricsMiddleware',  # Primero tras los estáticos, para medir la petición completa
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,12 +78,80 @@ WSGI_APPLICATION = 'nexus_flow.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil de base de datos según el entorno.
+# DB_ENGINE: 'sqlite' (por defecto) o 'postgresql' (requiere psycopg[binary,pool]).
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+# Segundos que se reutiliza cada conexión (0 la cierra al acabar cada petición)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgresql':
+    # Con DB_POOL=true cada proceso mantiene un pool de psycopg; en ese caso las
+    # conexiones no pueden ser persistentes (CONN_MAX_AGE=0), el pool las reutiliza
+    DB_POOL = os.getenv('DB_POOL', 'true').lower() == 'true'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'nexus_flow'),
+            'USER': os.getenv('DB_USER', 'nexus_flow'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
     }
+else:
+    # SQLite en modo WAL: las lecturas no bloquean a la escritura y viceversa.
+    # Las transacciones empiezan reservando la escritura (IMMEDIATE) y esperan
+    # hasta DB_BUSY_TIMEOUT segundos si otra conexión está escribiendo, en vez
+    # de fallar con "database is locked".
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': float(os.getenv('DB_BUSY_TIMEOUT', '20')),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
+    }
+
+
+# Cachés. 'default' vive en la memoria de cada proceso. Las sesiones, los
+# límites de uso y otros estados que deben valer en todos los procesos usan
+# la caché 'shared', que solo existe si se configura SHARED_CACHE:
+# 'db' (tabla SHARED_CACHE_TABLE, se crea con `python manage.py createcachetable`)
+# o una URL redis:// (requiere el paquete redis).
+SHARED_CACHE = os.getenv('SHARED_CACHE', '')
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
 }
+if SHARED_CACHE == 'db':
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': os.getenv('SHARED_CACHE_TABLE', 'nexus_flow_cache'),
+    }
+elif SHARED_CACHE:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE,
+    }
 
 
 # Password validation
@@ -101,6 +172,31 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Sesiones: con SHARED_CACHE, por defecto se leen de la caché 'shared' y se
+# escriben también en la base de datos (write-through), así que un fallo de la
+# caché no cierra sesiones. Sin ella se guardan solo en la base de datos: en
+# la caché de cada proceso, una sesión cerrada en uno seguiría valiendo en los
+# demás. Alternativas: 'django.contrib.sessions.backends.cache' (solo caché,
+# que debe estar compartida entre procesos) o
+# 'django.contrib.sessions.backends.signed_cookies' (firmadas en la cookie).
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if 'shared' in CACHES else 'django.contrib.sessions.backends.db',
+)
+SESSION_CACHE_ALIAS = os.getenv('SESSION_CACHE_ALIAS', 'shared' if 'shared' in CACHES else 'default')
+
+# El usuario de cada sesión se guarda en caché (ver core/auth.py).
+# ModelBackend sigue en la lista para las sesiones iniciadas antes con él.
+AUTHENTICATION_BACKENDS = [
+    'core.auth.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+# Segundos que un usuario se reutiliza sin consultar auth_user (0 lo desactiva)
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+# Caché compartida de los usuarios (invalidada en todos los procesos al guardarlos);
+# vacío: la memoria de cada proceso
+AUTH_USER_CACHE_ALIAS = os.getenv('AUTH_USER_CACHE_ALIAS', 'shared' if 'shared' in CACHES else '')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -124,6 +220,22 @@ STATICFILES_DIRS = [
     BASE_DIR / 'core' / 'static',
 ]
 
+# Destino de collectstatic: ficheros con hash del contenido y sus versiones
+# .gz/.br (ver core/storage.py), servidos por core.staticfiles.StaticFilesMiddleware
+STATIC_ROOT = Path(os.getenv('STATIC_ROOT', BASE_DIR / 'staticfiles'))
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# Segundos de caché de los estáticos sin hash en el nombre (los que lo tienen son inmutables)
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '60'))
+# Los ficheros estáticos de hasta este tamaño (bytes) se sirven desde memoria
+STATIC_MEMORY_MAX_SIZE = int(os.getenv('STATIC_MEMORY_MAX_SIZE', str(1024 * 1024)))
+# CLI de Tailwind CSS usada por `python manage.py build_css` (p. ej. 'npx tailwindcss@3')
+TAILWIND_CLI = os.getenv('TAILWIND_CLI', 'tailwindcss')
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -143,3 +255,140 @@ CSRF_TRUSTED_ORIGINS = [
 LOGIN_URL = '/login/'
 
 
+# Configuración del modelo de lenguaje (ver core/llm.py)
+# LLM_BACKEND: 'gemini' para la API real, 'fake' para el backend simulado, 'stub' para
+# respuestas deterministas sin red (pruebas y CI) o la ruta de una clase de backend propia.
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME', 'gemini-2.5-flash')
+# Endpoint y transporte ('grpc' o 'rest') de la API de Gemini; vacíos usan los de Google.
+# run_benchmark los apunta al servidor simulado (comando mock_gemini).
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT', '')
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT', '')
+# Máximo de llamadas simultáneas al modelo por proceso
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '100'))
+# Tiempo máximo (segundos) de cada llamada al modelo
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+# Latencia (segundos) del backend simulado
+LLM_FAKE_LATENCY = float(os.getenv('LLM_FAKE_LATENCY', '0.5'))
+LLM_FAKE_JITTER = float(os.getenv('LLM_FAKE_JITTER', '0'))
+# Fracción de llamadas del backend simulado que fallan con un error transitorio
+LLM_FAKE_ERROR_RATE = float(os.getenv('LLM_FAKE_ERROR_RATE', '0'))
+# Modelos alternativos (separados por comas) si el principal no responde
+LLM_FALLBACK_MODELS = [name for name in os.getenv('LLM_FALLBACK_MODELS', 'gemini-2.5-flash-lite').split(',') if name]
+# Reintentos de errores transitorios, con espera exponencial desde LLM_RETRY_BASE_DELAY segundos
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.2'))
+# Tiempo máximo (segundos) de cada intento individual
+LLM_ATTEMPT_TIMEOUT = float(os.getenv('LLM_ATTEMPT_TIMEOUT', '15'))
+# Circuito: fallos seguidos para abrirlo y segundos hasta la llamada de prueba
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+# Peticiones de cobertura (hedging): se duplica la llamada si supera el percentil indicado
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_QUANTILE = float(os.getenv('LLM_HEDGE_QUANTILE', '0.95'))
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '1'))
+# Pedir respuestas JSON validadas (salida estructurada) en la Matriz de Eisenhower
+LLM_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', 'true').lower() == 'true'
+
+# Métricas en formato Prometheus (ver core/metrics.py), en /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# /metrics exige la cabecera "Authorization: Bearer <token>"; sin token nadie puede consultarlo
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Límites de uso de los endpoints de análisis (ver core/ratelimit.py)
+# RATE_LIMIT_BACKEND: 'django' (caché RATE_LIMIT_CACHE_ALIAS, que debe estar compartida entre
+# procesos; por defecto si hay SHARED_CACHE) o 'memory' (cada proceso aplica sus propios límites).
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'django' if 'shared' in CACHES else 'memory')
+RATE_LIMIT_CACHE_ALIAS = os.getenv('RATE_LIMIT_CACHE_ALIAS', 'shared')
+# Peticiones por minuto y ráfaga máxima, por usuario y para todo el servicio
+RATE_LIMIT_USER_RATE = float(os.getenv('RATE_LIMIT_USER_RATE', '20'))
+RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', '10'))
+RATE_LIMIT_GLOBAL_RATE = float(os.getenv('RATE_LIMIT_GLOBAL_RATE', '600'))
+RATE_LIMIT_GLOBAL_BURST = int(os.getenv('RATE_LIMIT_GLOBAL_BURST', '100'))
+# Tokens del modelo por usuario y día (0 desactiva el presupuesto)
+DAILY_TOKEN_BUDGET = int(os.getenv('DAILY_TOKEN_BUDGET', '200000'))
+
+# Caché de respuestas del modelo (ver core/cache.py)
+# LLM_CACHE_BACKEND: 'memory', 'django' (usa CACHES), 'db' (tabla LLMCacheEntry) o 'none'.
+LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'memory')
+LLM_CACHE_ALIAS = os.getenv('LLM_CACHE_ALIAS', 'default')
+# Tiempo de vida (segundos) de cada respuesta guardada
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '86400'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
+
+# Agrupación de peticiones idénticas en vuelo (ver core/coalesce.py)
+# COALESCE_BACKEND: 'memory' (dentro del proceso), 'django' (también entre procesos, con
+# la caché COALESCE_CACHE_ALIAS, que debe estar compartida; por defecto si hay SHARED_CACHE) o 'none'.
+COALESCE_BACKEND = os.getenv('COALESCE_BACKEND', 'django' if 'shared' in CACHES else 'memory')
+COALESCE_CACHE_ALIAS = os.getenv('COALESCE_CACHE_ALIAS', 'shared')
+# Segundos que otro proceso espera el resultado y cada cuánto lo consulta
+COALESCE_WAIT_TIMEOUT = float(os.getenv('COALESCE_WAIT_TIMEOUT', '60'))
+COALESCE_POLL_INTERVAL = float(os.getenv('COALESCE_POLL_INTERVAL', '0.05'))
+
+# Clasificación por lotes de la Matriz de Eisenhower
+# Tokens (estimados) de tareas que caben en un solo prompt y tareas por prompt
+LLM_BATCH_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', '4000'))
+LLM_BATCH_MAX_ITEMS = int(os.getenv('LLM_BATCH_MAX_ITEMS', '100'))
+EISENHOWER_BATCH_MAX_TASKS = int(os.getenv('EISENHOWER_BATCH_MAX_TASKS', '1000'))
+
+# Plan del día (/api/plan-day/): hasta este número de tareas las tres leyes se
+# resuelven con una sola llamada estructurada; con más, con una llamada por ley a la vez
+DAY_PLAN_MAX_TASKS = int(os.getenv('DAY_PLAN_MAX_TASKS', '50'))
+
+# Compactación de las entradas de Laborit y Yerkes-Dodson (ver core/prompts.py)
+# Tareas como máximo y tokens (estimados) de la lista de tareas y del plan diario
+PROMPT_MAX_TASKS = int(os.getenv('PROMPT_MAX_TASKS', '50'))
+PROMPT_TASKS_TOKEN_BUDGET = int(os.getenv('PROMPT_TASKS_TOKEN_BUDGET', '1000'))
+PROMPT_PLAN_TOKEN_BUDGET = int(os.getenv('PROMPT_PLAN_TOKEN_BUDGET', '1500'))
+
+# Versiones de los planes diarios (ver core/plans.py). Un plan cambiado se
+# analiza de forma incremental (análisis anterior + cambios) si las líneas
+# cambiadas no superan esta fracción del plan
+PLAN_INCREMENTAL_ENABLED = os.getenv('PLAN_INCREMENTAL_ENABLED', 'true').lower() == 'true'
+PLAN_INCREMENTAL_MAX_CHANGE = float(os.getenv('PLAN_INCREMENTAL_MAX_CHANGE', '0.5'))
+# Tokens (estimados) del resumen de las líneas sin cambios en el análisis incremental
+PLAN_SUMMARY_TOKEN_BUDGET = int(os.getenv('PLAN_SUMMARY_TOKEN_BUDGET', '300'))
+
+# Reutilización de la categoría de tareas casi iguales (ver core/embeddings.py)
+# EMBEDDING_BACKEND: 'hashing' (local, sin red) o 'gemini' (API de embeddings de EMBEDDING_MODEL)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'hashing')
+SIMILAR_TASKS_ENABLED = os.getenv('SIMILAR_TASKS_ENABLED', 'true').lower() == 'true'
+# Similitud del coseno mínima con una tarea anterior para no llamar al modelo
+# (además, las señales de prioridad de las dos tareas deben coincidir)
+SIMILAR_TASKS_THRESHOLD = float(os.getenv('SIMILAR_TASKS_THRESHOLD', '0.85' if EMBEDDING_BACKEND == 'hashing' else '0.9'))
+# Tareas más recientes de cada usuario que entran en su índice en memoria
+SIMILAR_TASKS_MAX_INDEX = int(os.getenv('SIMILAR_TASKS_MAX_INDEX', '50000'))
+# Vectores como máximo en los índices en memoria de todos los usuarios (unos 100 MB con 128 dimensiones)
+SIMILAR_TASKS_CACHE_VECTORS = int(os.getenv('SIMILAR_TASKS_CACHE_VECTORS', '200000'))
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'models/text-embedding-004')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '128'))
+
+# Cola de trabajos de análisis (ver core/jobs.py y el comando run_analysis_jobs)
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '10'))
+# Segundos entre consultas a la cola cuando está vacía
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Segundos tras los que un trabajo en ejecución se considera abandonado
+JOB_STALE_AFTER = float(os.getenv('JOB_STALE_AFTER', '300'))
+
+# Historiales paginados: tamaño de página por defecto y máximo
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '200'))
+
+# Versiones durante las que se conservan las marcas de borrado de la lista de
+# tareas (ver core/todos.py); un cliente más antiguo recibe la lista completa
+TODO_TOMBSTONE_VERSIONS = int(os.getenv('TODO_TOMBSTONE_VERSIONS', '1000'))
+
+# Filas que se leen de la base de datos en cada bloque al exportar el historial (ver core/exports.py)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+
+# Estadísticas de la Matriz de Eisenhower (ver core/analytics.py): rango máximo en días
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '731'))
+
+# Clasificador local de la Matriz de Eisenhower (ver core/classifier.py)
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+# Confianza mínima para responder sin llamar al modelo
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.85'))
+# Tareas clasificadas que necesita un usuario para usar su modelo entrenado
+LOCAL_CLASSIFIER_MIN_SAMPLES = int(os.getenv('LOCAL_CLASSIFIER_MIN_SAMPLES', '20'))
@@ -0,0 +1,18 @@
+/**
+ * Configuración de Tailwind CSS para `python manage.py build_css`.
+ * Solo se generan las clases que aparecen en las plantillas y en el JavaScript
+ * (que construye parte del HTML en el navegador).
+ * El modo oscuro sigue a la clase `dark` de <html>, que pone el botón de tema
+ * (core/static/js/script.js), y no a la preferencia del sistema.
+ */
+module.exports = {
+  darkMode: 'class',
+  content: [
+    './core/templates/**/*.html',
+    './core/static/js/**/*.js',
+  ],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+}